@@ -0,0 +1,88 @@
+"""Throughput and latency of opening and saving sessions with each storage
+backend. Run with ``pytest benchmarks``, see CONTRIBUTING.rst."""
+
+import itertools
+
+import flask
+import msgspec
+import pytest
+
+SESSION_SIZES = {
+    "100B": 100,
+    "10KB": 10_000,
+    "100KB": 100_000,
+    "500KB": 500_000,
+}
+
+
+def make_session_data(size):
+    """Session data whose msgpack encoding is about ``size`` bytes, made of the
+    kind of values sessions usually hold."""
+    data = {"user_id": 1, "csrf_token": "5b7e9f0c2d", "items": []}
+    for i in itertools.count():
+        item = {"id": i, "name": f"item-{i}", "tags": ["a", "b"]}
+        size -= len(msgspec.msgpack.encode(item))
+        if size <= 0:
+            return data
+        data["items"].append(item)
+
+
+@pytest.fixture(params=list(SESSION_SIZES))
+def session_size(request):
+    return request.param
+
+
+# The largest item DynamoDB can store is 400 KB
+DYNAMODB_MAX_SIZE = 400_000
+
+
+@pytest.fixture
+def sid(app, backend, session_size):
+    """The id of a session of ``session_size`` stored with the backend."""
+    if backend == "dynamodb" and SESSION_SIZES[session_size] > DYNAMODB_MAX_SIZE:
+        pytest.skip("Larger than the maximum DynamoDB item size")
+    interface = app.session_interface
+    with app.test_request_context():
+        session = interface.open_session(app, flask.request)
+        session.update(make_session_data(SESSION_SIZES[session_size]))
+        interface.save_session(app, session, app.response_class())
+        return session.sid
+
+
+def run_request(app, sid, modify):
+    interface = app.session_interface
+    cookie_name = app.config["SESSION_COOKIE_NAME"]
+    with app.test_request_context(headers={"Cookie": f"{cookie_name}={sid}"}):
+        session = interface.open_session(app, flask.request)
+        assert session.sid == sid
+        if modify:
+            session["counter"] = session.get("counter", 0) + 1
+        interface.save_session(app, session, app.response_class())
+
+
+@pytest.fixture
+def describe(benchmark, backend, serialization_format, session_size):
+    """Group results by backend and record the parameters in the JSON report."""
+
+    def describe(operation):
+        benchmark.group = f"{operation}-{backend}"
+        benchmark.extra_info.update(
+            operation=operation,
+            backend=backend,
+            serialization_format=serialization_format,
+            session_size=SESSION_SIZES[session_size],
+        )
+
+    return describe
+
+
+def test_read_session(benchmark, describe, app, sid):
+    """Open a stored session and save it unchanged."""
+    describe("read")
+    benchmark(run_request, app, sid, modify=False)
+
+
+def test_write_session(benchmark, describe, app, sid):
+    """Open a stored session, modify it and save it."""
+    describe("write")
+    benchmark(run_request, app, sid, modify=True)
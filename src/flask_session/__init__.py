@@ -57,6 +57,53 @@ class Session:
         SESSION_SERIALIZATION_FORMAT = config.get(
             "SESSION_SERIALIZATION_FORMAT", Defaults.SESSION_SERIALIZATION_FORMAT
         )
+        SESSION_LOCAL_CACHE_SIZE = config.get(
+            "SESSION_LOCAL_CACHE_SIZE", Defaults.SESSION_LOCAL_CACHE_SIZE
+        )
+        SESSION_LOCAL_CACHE_TTL = config.get(
+            "SESSION_LOCAL_CACHE_TTL", Defaults.SESSION_LOCAL_CACHE_TTL
+        )
+        SESSION_NEGATIVE_CACHE_SIZE = config.get(
+            "SESSION_NEGATIVE_CACHE_SIZE", Defaults.SESSION_NEGATIVE_CACHE_SIZE
+        )
+        SESSION_NEGATIVE_CACHE_TTL = config.get(
+            "SESSION_NEGATIVE_CACHE_TTL", Defaults.SESSION_NEGATIVE_CACHE_TTL
+        )
+        SESSION_DETECT_NESTED_CHANGES = config.get(
+            "SESSION_DETECT_NESTED_CHANGES", Defaults.SESSION_DETECT_NESTED_CHANGES
+        )
+        SESSION_LAZY_LOADING = config.get(
+            "SESSION_LAZY_LOADING", Defaults.SESSION_LAZY_LOADING
+        )
+        SESSION_DELTA_WRITES = config.get(
+            "SESSION_DELTA_WRITES", Defaults.SESSION_DELTA_WRITES
+        )
+        SESSION_REFRESH_THRESHOLD = config.get(
+            "SESSION_REFRESH_THRESHOLD", Defaults.SESSION_REFRESH_THRESHOLD
+        )
+        SESSION_WRITE_BEHIND = config.get(
+            "SESSION_WRITE_BEHIND", Defaults.SESSION_WRITE_BEHIND
+        )
+        SESSION_WRITE_BEHIND_QUEUE_SIZE = config.get(
+            "SESSION_WRITE_BEHIND_QUEUE_SIZE", Defaults.SESSION_WRITE_BEHIND_QUEUE_SIZE
+        )
+        SESSION_WRITE_BEHIND_WORKERS = config.get(
+            "SESSION_WRITE_BEHIND_WORKERS", Defaults.SESSION_WRITE_BEHIND_WORKERS
+        )
+        SESSION_COMPRESSION = config.get(
+            "SESSION_COMPRESSION", Defaults.SESSION_COMPRESSION
+        )
+        SESSION_COMPRESSION_THRESHOLD = config.get(
+            "SESSION_COMPRESSION_THRESHOLD", Defaults.SESSION_COMPRESSION_THRESHOLD
+        )
+        SESSION_COMPRESSION_DICT = config.get(
+            "SESSION_COMPRESSION_DICT", Defaults.SESSION_COMPRESSION_DICT
+        )
+        SESSION_SCHEMA = config.get("SESSION_SCHEMA", Defaults.SESSION_SCHEMA)
+        SESSION_RETRY_POLICY = config.get(
+            "SESSION_RETRY_POLICY", Defaults.SESSION_RETRY_POLICY
+        )
+        SESSION_OWNER_KEY = config.get("SESSION_OWNER_KEY", Defaults.SESSION_OWNER_KEY)
 
         # Redis settings
         SESSION_REDIS = config.get("SESSION_REDIS", Defaults.SESSION_REDIS)
@@ -64,6 +111,11 @@ class Session:
         # Memcached settings
         SESSION_MEMCACHED = config.get("SESSION_MEMCACHED", Defaults.SESSION_MEMCACHED)
 
+        # Sharding settings (Redis and Memcached)
+        SESSION_SHARD_HINTS = config.get(
+            "SESSION_SHARD_HINTS", Defaults.SESSION_SHARD_HINTS
+        )
+
         # CacheLib settings
         SESSION_CACHELIB = config.get("SESSION_CACHELIB", Defaults.SESSION_CACHELIB)
 
@@ -121,10 +173,33 @@ class Session:
             "SESSION_POSTGRESQL_SCHEMA", Defaults.SESSION_POSTGRESQL_SCHEMA
         )
 
+        # Tiered settings
+        SESSION_TIERED_FAST_TYPE = config.get(
+            "SESSION_TIERED_FAST_TYPE", Defaults.SESSION_TIERED_FAST_TYPE
+        )
+        SESSION_TIERED_DURABLE_TYPE = config.get(
+            "SESSION_TIERED_DURABLE_TYPE", Defaults.SESSION_TIERED_DURABLE_TYPE
+        )
+        SESSION_TIERED_WRITE_MODE = config.get(
+            "SESSION_TIERED_WRITE_MODE", Defaults.SESSION_TIERED_WRITE_MODE
+        )
+
         # Shared settings
         SESSION_CLEANUP_N_REQUESTS = config.get(
             "SESSION_CLEANUP_N_REQUESTS", Defaults.SESSION_CLEANUP_N_REQUESTS
         )
+        SESSION_CLEANUP_BATCH_SIZE = config.get(
+            "SESSION_CLEANUP_BATCH_SIZE", Defaults.SESSION_CLEANUP_BATCH_SIZE
+        )
+        SESSION_CLEANUP_BATCH_PAUSE = config.get(
+            "SESSION_CLEANUP_BATCH_PAUSE", Defaults.SESSION_CLEANUP_BATCH_PAUSE
+        )
+        SESSION_CLEANUP_TIME_BUDGET = config.get(
+            "SESSION_CLEANUP_TIME_BUDGET", Defaults.SESSION_CLEANUP_TIME_BUDGET
+        )
+        SESSION_CLEANUP_INTERVAL = config.get(
+            "SESSION_CLEANUP_INTERVAL", Defaults.SESSION_CLEANUP_INTERVAL
+        )
 
         common_params = {
             "app": app,
@@ -133,82 +208,148 @@ class Session:
             "permanent": SESSION_PERMANENT,
             "sid_length": SESSION_ID_LENGTH,
             "serialization_format": SESSION_SERIALIZATION_FORMAT,
+            "local_cache_size": SESSION_LOCAL_CACHE_SIZE,
+            "local_cache_ttl": SESSION_LOCAL_CACHE_TTL,
+            "detect_nested_changes": SESSION_DETECT_NESTED_CHANGES,
+            "lazy_loading": SESSION_LAZY_LOADING,
+            "refresh_threshold": SESSION_REFRESH_THRESHOLD,
+            "write_behind": SESSION_WRITE_BEHIND,
+            "write_behind_queue_size": SESSION_WRITE_BEHIND_QUEUE_SIZE,
+            "write_behind_workers": SESSION_WRITE_BEHIND_WORKERS,
+            "compression": SESSION_COMPRESSION,
+            "compression_threshold": SESSION_COMPRESSION_THRESHOLD,
+            "compression_dict": SESSION_COMPRESSION_DICT,
+            "session_schema": SESSION_SCHEMA,
+            "retry_policy": SESSION_RETRY_POLICY,
+            "negative_cache_size": SESSION_NEGATIVE_CACHE_SIZE,
+            "negative_cache_ttl": SESSION_NEGATIVE_CACHE_TTL,
+            "owner_key": SESSION_OWNER_KEY,
         }
 
-        SESSION_TYPE = SESSION_TYPE.lower()
-
-        if SESSION_TYPE == "redis":
-            from .redis import RedisSessionInterface
-
-            session_interface = RedisSessionInterface(
-                **common_params,
-                client=SESSION_REDIS,
-            )
-        elif SESSION_TYPE == "memcached":
-            from .memcached import MemcachedSessionInterface
-
-            session_interface = MemcachedSessionInterface(
-                **common_params,
-                client=SESSION_MEMCACHED,
-            )
-        elif SESSION_TYPE == "filesystem":
-            from .filesystem import FileSystemSessionInterface
-
-            session_interface = FileSystemSessionInterface(
-                **common_params,
-                cache_dir=SESSION_FILE_DIR,
-                threshold=SESSION_FILE_THRESHOLD,
-                mode=SESSION_FILE_MODE,
-            )
-        elif SESSION_TYPE == "cachelib":
-            from .cachelib import CacheLibSessionInterface
-
-            session_interface = CacheLibSessionInterface(
-                **common_params, client=SESSION_CACHELIB
-            )
-        elif SESSION_TYPE == "mongodb":
-            from .mongodb import MongoDBSessionInterface
-
-            session_interface = MongoDBSessionInterface(
-                **common_params,
-                client=SESSION_MONGODB,
-                db=SESSION_MONGODB_DB,
-                collection=SESSION_MONGODB_COLLECT,
-            )
-        elif SESSION_TYPE == "sqlalchemy":
-            from .sqlalchemy import SqlAlchemySessionInterface
-
-            session_interface = SqlAlchemySessionInterface(
-                **common_params,
-                client=SESSION_SQLALCHEMY,
-                table=SESSION_SQLALCHEMY_TABLE,
-                sequence=SESSION_SQLALCHEMY_SEQUENCE,
-                schema=SESSION_SQLALCHEMY_SCHEMA,
-                bind_key=SESSION_SQLALCHEMY_BIND_KEY,
-                cleanup_n_requests=SESSION_CLEANUP_N_REQUESTS,
-            )
-        elif SESSION_TYPE == "dynamodb":
-            from .dynamodb import DynamoDBSessionInterface
-
-            session_interface = DynamoDBSessionInterface(
-                **common_params,
-                client=SESSION_DYNAMODB,
-                table_name=SESSION_DYNAMODB_TABLE,
-                table_exists=SESSION_DYNAMODB_TABLE_EXISTS,
-            )
-
-        elif SESSION_TYPE == "postgresql":
-            from .postgresql import PostgreSqlSessionInterface
-
-            session_interface = PostgreSqlSessionInterface(
-                **common_params,
-                pool=SESSION_POSTGRESQL,
-                table=SESSION_POSTGRESQL_TABLE,
-                schema=SESSION_POSTGRESQL_SCHEMA,
-                cleanup_n_requests=SESSION_CLEANUP_N_REQUESTS,
-            )
-
-        else:
-            raise ValueError(f"Unrecognized value for SESSION_TYPE: {SESSION_TYPE}")
-
-        return session_interface
+        def create(session_type, params):
+            session_type = session_type.lower()
+            if session_type == "redis":
+                from .redis import RedisSessionInterface
+
+                return RedisSessionInterface(
+                    **params,
+                    client=SESSION_REDIS,
+                    delta_writes=SESSION_DELTA_WRITES,
+                    shard_hints=SESSION_SHARD_HINTS,
+                )
+            elif session_type == "memcached":
+                from .memcached import MemcachedSessionInterface
+
+                return MemcachedSessionInterface(
+                    **params,
+                    client=SESSION_MEMCACHED,
+                    shard_hints=SESSION_SHARD_HINTS,
+                )
+            elif session_type == "filesystem":
+                from .filesystem import FileSystemSessionInterface
+
+                return FileSystemSessionInterface(
+                    **params,
+                    cache_dir=SESSION_FILE_DIR,
+                    threshold=SESSION_FILE_THRESHOLD,
+                    mode=SESSION_FILE_MODE,
+                )
+            elif session_type == "cachelib":
+                from .cachelib import CacheLibSessionInterface
+
+                return CacheLibSessionInterface(**params, client=SESSION_CACHELIB)
+            elif session_type == "mongodb":
+                from .mongodb import MongoDBSessionInterface
+
+                return MongoDBSessionInterface(
+                    **params,
+                    client=SESSION_MONGODB,
+                    db=SESSION_MONGODB_DB,
+                    collection=SESSION_MONGODB_COLLECT,
+                    delta_writes=SESSION_DELTA_WRITES,
+                )
+            elif session_type == "sqlalchemy":
+                from .sqlalchemy import SqlAlchemySessionInterface
+
+                return SqlAlchemySessionInterface(
+                    **params,
+                    client=SESSION_SQLALCHEMY,
+                    table=SESSION_SQLALCHEMY_TABLE,
+                    sequence=SESSION_SQLALCHEMY_SEQUENCE,
+                    schema=SESSION_SQLALCHEMY_SCHEMA,
+                    bind_key=SESSION_SQLALCHEMY_BIND_KEY,
+                    cleanup_n_requests=SESSION_CLEANUP_N_REQUESTS,
+                    cleanup_batch_size=SESSION_CLEANUP_BATCH_SIZE,
+                    cleanup_batch_pause=SESSION_CLEANUP_BATCH_PAUSE,
+                    cleanup_time_budget=SESSION_CLEANUP_TIME_BUDGET,
+                    cleanup_interval=SESSION_CLEANUP_INTERVAL,
+                )
+            elif session_type == "dynamodb":
+                from .dynamodb import DynamoDBSessionInterface
+
+                return DynamoDBSessionInterface(
+                    **params,
+                    client=SESSION_DYNAMODB,
+                    table_name=SESSION_DYNAMODB_TABLE,
+                    table_exists=SESSION_DYNAMODB_TABLE_EXISTS,
+                    delta_writes=SESSION_DELTA_WRITES,
+                )
+            elif session_type == "postgresql":
+                from .postgresql import PostgreSqlSessionInterface
+
+                return PostgreSqlSessionInterface(
+                    **params,
+                    pool=SESSION_POSTGRESQL,
+                    table=SESSION_POSTGRESQL_TABLE,
+                    schema=SESSION_POSTGRESQL_SCHEMA,
+                    cleanup_n_requests=SESSION_CLEANUP_N_REQUESTS,
+                    cleanup_batch_size=SESSION_CLEANUP_BATCH_SIZE,
+                    cleanup_batch_pause=SESSION_CLEANUP_BATCH_PAUSE,
+                    cleanup_time_budget=SESSION_CLEANUP_TIME_BUDGET,
+                    cleanup_interval=SESSION_CLEANUP_INTERVAL,
+                )
+            elif session_type == "psycopg":
+                from .psycopg import PsycopgSessionInterface
+
+                return PsycopgSessionInterface(
+                    **params,
+                    pool=SESSION_POSTGRESQL,
+                    table=SESSION_POSTGRESQL_TABLE,
+                    schema=SESSION_POSTGRESQL_SCHEMA,
+                    cleanup_n_requests=SESSION_CLEANUP_N_REQUESTS,
+                    cleanup_batch_size=SESSION_CLEANUP_BATCH_SIZE,
+                    cleanup_batch_pause=SESSION_CLEANUP_BATCH_PAUSE,
+                    cleanup_time_budget=SESSION_CLEANUP_TIME_BUDGET,
+                    cleanup_interval=SESSION_CLEANUP_INTERVAL,
+                )
+            elif session_type == "tiered":
+                from .tiered import TieredSessionInterface
+
+                tier_types = (SESSION_TIERED_FAST_TYPE, SESSION_TIERED_DURABLE_TYPE)
+                if not all(tier_types) or "tiered" in map(str.lower, tier_types):
+                    raise ValueError(
+                        "SESSION_TIERED_FAST_TYPE and SESSION_TIERED_DURABLE_TYPE "
+                        "must be set to the session types of the tiers"
+                    )
+                # The tiers only store sessions, the request level features run once
+                tier_params = {
+                    **params,
+                    "local_cache_size": 0,
+                    "negative_cache_size": 0,
+                    "detect_nested_changes": False,
+                    "lazy_loading": False,
+                    "refresh_threshold": None,
+                    "write_behind": False,
+                }
+                return TieredSessionInterface(
+                    **params,
+                    # Sessions are looked up by owner in the durable tier only
+                    fast=create(
+                        SESSION_TIERED_FAST_TYPE, {**tier_params, "owner_key": None}
+                    ),
+                    durable=create(SESSION_TIERED_DURABLE_TYPE, tier_params),
+                    write_mode=SESSION_TIERED_WRITE_MODE,
+                )
+            raise ValueError(f"Unrecognized value for SESSION_TYPE: {session_type}")
+
+        return create(SESSION_TYPE, common_params)
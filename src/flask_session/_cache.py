@@ -0,0 +1,66 @@
+import time
+from copy import deepcopy
+from threading import Lock
+from typing import Any, Optional, OrderedDict
+
+
+class LocalCache:
+    """A thread-safe, size bounded LRU mapping whose entries expire after a
+    fixed time-to-live. Used to keep recently used session data in-process.
+
+    Values are deep copied on the way in and on the way out so that mutations
+    made to a session during a request never leak into the cache.
+
+    :param maxsize: The maximum number of entries to hold before evicting the
+        least recently used one.
+    :param ttl: The number of seconds an entry is considered fresh.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict[str, tuple] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a copy of the value stored for ``key``, or ``None`` on a miss."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return deepcopy(value)
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a copy of ``value`` for ``key``, evicting the least recently used
+        entries if the cache is full."""
+        entry = (time.monotonic() + self.ttl, deepcopy(value))
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        """Remove ``key`` from the cache if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries from the cache."""
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,83 @@
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from .signals import session_operation
+
+# The operation being measured in the current thread or task, if any
+current_measure: ContextVar[Optional["Measure"]] = ContextVar(
+    "flask_session_measure", default=None
+)
+
+# Returned instead of a measure when no receiver is connected
+_not_measured = nullcontext()
+
+
+class Measure:
+    """Times an operation of a session interface on its storage, and sends
+    :data:`~flask_session.signals.session_operation` when it ends. The size of
+    serialized data and retries are added by the serializer and
+    :func:`~flask_session._utils.retry_query` while it is current.
+    """
+
+    def __init__(self, interface: Any, operation: str) -> None:
+        self.interface = interface
+        self.operation = operation
+        self.size = 0
+        self.attempts = 1
+        self.outcome = "ok"
+
+    def __enter__(self) -> "Measure":
+        self._token = current_measure.set(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        duration = time.perf_counter() - self._start
+        current_measure.reset(self._token)
+        if exc_type is not None:
+            self.outcome = "error"
+        session_operation.send(
+            self.interface,
+            operation=self.operation,
+            backend=backend_name(self.interface),
+            duration=duration,
+            size=self.size,
+            outcome=self.outcome,
+            attempts=self.attempts,
+        )
+
+
+def measure(interface: Any, operation: str) -> Any:
+    """Return a context manager measuring ``operation``, which is ``None`` when
+    entered if no receiver is connected to the signal."""
+    if not session_operation.receivers:
+        return _not_measured
+    return Measure(interface, operation)
+
+
+def record_size(size: int) -> None:
+    """Add ``size`` serialized bytes to the operation being measured."""
+    current = current_measure.get()
+    if current is not None:
+        current.size += size
+
+
+def record_retry() -> None:
+    """Count a retry of the operation being measured."""
+    current = current_measure.get()
+    if current is not None:
+        current.attempts += 1
+
+
+def backend_name(interface: Any) -> str:
+    """The name of the backend of a session interface, such as ``"redis"`` for
+    both :class:`~flask_session.redis.RedisSessionInterface` and its asyncio
+    counterpart."""
+    name = type(interface).__name__
+    name = name[len("Async") :] if name.startswith("Async") else name
+    name = (
+        name[: -len("SessionInterface")] if name.endswith("SessionInterface") else name
+    )
+    return name.lower()
@@ -0,0 +1,269 @@
+from functools import cached_property
+from types import ModuleType
+from typing import Any
+
+
+class Queries:
+    def __init__(
+        self, schema: str, table: str, sql: ModuleType, owner: bool = False
+    ) -> None:
+        """Class to hold all the queries used by the PostgreSQL session interfaces.
+
+        Args:
+            schema (str): The name of the schema to use for the session data.
+            table (str): The name of the table to use for the session data.
+            sql (ModuleType): The ``sql`` module of the driver, ``psycopg2.sql``
+                or ``psycopg.sql``, used to compose the queries.
+            owner (bool): Whether sessions are written with their owner.
+        """
+        self.schema = schema
+        self.table = table
+        self.sql = sql
+        self.owner = owner
+
+    def compile(self, conn: Any) -> None:
+        """Render every query to a string once, so that executing a query does
+        not compose and quote it again.
+
+        Args:
+            conn (Any): A connection of the driver, used to quote identifiers.
+        """
+        for name, attribute in vars(type(self)).items():
+            if isinstance(attribute, cached_property):
+                query = getattr(self, name)
+                if isinstance(query, self.sql.Composable):
+                    self.__dict__[name] = query.as_string(conn)
+
+    def _if_owner(self, fragment: str) -> Any:
+        # Only write the owner column when sessions are indexed by owner, so
+        # that tables created before it was added keep working
+        return self.sql.SQL(fragment if self.owner else "")
+
+    @cached_property
+    def create_schema(self) -> str:
+        return self.sql.SQL("CREATE SCHEMA IF NOT EXISTS {schema};").format(
+            schema=self.sql.Identifier(self.schema)
+        )
+
+    @cached_property
+    def create_table(self) -> str:
+        uq_idx = self.sql.Identifier(f"uq_{self.table}_session_id")
+        expiry_idx = self.sql.Identifier(f"{self.table}_expiry_idx")
+        return self.sql.SQL(
+            """CREATE TABLE IF NOT EXISTS {schema}.{table} (
+            session_id VARCHAR(255) NOT NULL PRIMARY KEY,
+            created TIMESTAMP WITHOUT TIME ZONE DEFAULT (NOW() AT TIME ZONE 'utc'),
+            data BYTEA,
+            expiry TIMESTAMP WITHOUT TIME ZONE
+        );
+
+        --- Unique session_id
+        CREATE UNIQUE INDEX IF NOT EXISTS
+            {uq_idx} ON {schema}.{table} (session_id);
+
+        --- Index for expiry timestamp
+        CREATE INDEX IF NOT EXISTS
+            {expiry_idx} ON {schema}.{table} (expiry);"""
+        ).format(
+            schema=self.sql.Identifier(self.schema),
+            table=self.sql.Identifier(self.table),
+            uq_idx=uq_idx,
+            expiry_idx=expiry_idx,
+        )
+
+    @cached_property
+    def add_owner_column(self) -> str:
+        owner_idx = self.sql.Identifier(f"{self.table}_owner_idx")
+        return self.sql.SQL(
+            """ALTER TABLE {schema}.{table} ADD COLUMN IF NOT EXISTS owner VARCHAR(255);
+
+        --- Index to find the sessions of an owner
+        CREATE INDEX IF NOT EXISTS
+            {owner_idx} ON {schema}.{table} (owner);"""
+        ).format(
+            schema=self.sql.Identifier(self.schema),
+            table=self.sql.Identifier(self.table),
+            owner_idx=owner_idx,
+        )
+
+    @cached_property
+    def create_lease_table(self) -> str:
+        return self.sql.SQL(
+            """CREATE TABLE IF NOT EXISTS {schema}.{lease_table} (
+            name VARCHAR(64) NOT NULL PRIMARY KEY,
+            owner VARCHAR(255),
+            expiry TIMESTAMP WITHOUT TIME ZONE
+        );"""
+        ).format(
+            schema=self.sql.Identifier(self.schema),
+            lease_table=self.sql.Identifier(f"{self.table}_lease"),
+        )
+
+    @cached_property
+    def acquire_cleanup_lease(self) -> str:
+        return self.sql.SQL(
+            """--- Take the lease, renew it or take it over once it expired
+            INSERT INTO {schema}.{lease_table} AS lease (name, owner, expiry)
+            VALUES ('cleanup', %(owner)s, NOW() + %(duration)s)
+            ON CONFLICT (name)
+            DO UPDATE SET owner = %(owner)s, expiry = NOW() + %(duration)s
+            WHERE lease.owner = %(owner)s OR lease.expiry < NOW()
+            RETURNING owner;
+        """
+        ).format(
+            schema=self.sql.Identifier(self.schema),
+            lease_table=self.sql.Identifier(f"{self.table}_lease"),
+        )
+
+    @cached_property
+    def retrieve_session_data(self) -> str:
+        return self.sql.SQL(
+            """--- Expired sessions are left to the cleanup, so reads do not write
+            SELECT data FROM {schema}.{table}
+            WHERE session_id = %(session_id)s AND expiry > NOW();
+        """
+        ).format(
+            schema=self.sql.Identifier(self.schema),
+            table=self.sql.Identifier(self.table),
+        )
+
+    @cached_property
+    def retrieve_session_lifetime(self) -> str:
+        return self.sql.SQL(
+            """SELECT expiry - NOW() FROM {schema}.{table}
+            WHERE session_id = %(session_id)s AND expiry > NOW();
+        """
+        ).format(
+            schema=self.sql.Identifier(self.schema),
+            table=self.sql.Identifier(self.table),
+        )
+
+    @cached_property
+    def upsert_session(self) -> str:
+        return self.sql.SQL(
+            """INSERT INTO {schema}.{table} (session_id, data, expiry{owner_column})
+            VALUES (%(session_id)s, %(data)s, NOW() + %(ttl)s{owner_value})
+            ON CONFLICT (session_id)
+            DO UPDATE SET data = %(data)s, expiry = NOW() + %(ttl)s{owner_update};
+        """
+        ).format(
+            schema=self.sql.Identifier(self.schema),
+            table=self.sql.Identifier(self.table),
+            owner_column=self._if_owner(", owner"),
+            owner_value=self._if_owner(", %(owner)s"),
+            owner_update=self._if_owner(", owner = %(owner)s"),
+        )
+
+    @cached_property
+    def rename_session(self) -> str:
+        return self.sql.SQL(
+            """WITH old AS (
+                DELETE FROM {schema}.{table} WHERE session_id = %(old_session_id)s
+            )
+            INSERT INTO {schema}.{table} (session_id, data, expiry{owner_column})
+            VALUES (%(session_id)s, %(data)s, NOW() + %(ttl)s{owner_value})
+            ON CONFLICT (session_id)
+            DO UPDATE SET data = %(data)s, expiry = NOW() + %(ttl)s{owner_update};
+        """
+        ).format(
+            schema=self.sql.Identifier(self.schema),
+            table=self.sql.Identifier(self.table),
+            owner_column=self._if_owner(", owner"),
+            owner_value=self._if_owner(", %(owner)s"),
+            owner_update=self._if_owner(", owner = %(owner)s"),
+        )
+
+    @cached_property
+    def touch_session(self) -> str:
+        return self.sql.SQL(
+            """UPDATE {schema}.{table} SET expiry = NOW() + %(ttl)s
+            WHERE session_id = %(session_id)s AND expiry > NOW();
+        """
+        ).format(
+            schema=self.sql.Identifier(self.schema),
+            table=self.sql.Identifier(self.table),
+        )
+
+    @cached_property
+    def list_sessions(self) -> str:
+        return self.sql.SQL(
+            """SELECT session_id, data FROM {schema}.{table}
+            WHERE session_id > %(after)s
+            AND LEFT(session_id, LENGTH(%(prefix)s)) = %(prefix)s
+            AND expiry > NOW()
+            ORDER BY session_id
+            LIMIT %(limit)s;
+        """
+        ).format(
+            schema=self.sql.Identifier(self.schema),
+            table=self.sql.Identifier(self.table),
+        )
+
+    @cached_property
+    def count_sessions(self) -> str:
+        return self.sql.SQL(
+            """SELECT COUNT(*) FROM {schema}.{table}
+            WHERE LEFT(session_id, LENGTH(%(prefix)s)) = %(prefix)s
+            AND expiry > NOW();
+        """
+        ).format(
+            schema=self.sql.Identifier(self.schema),
+            table=self.sql.Identifier(self.table),
+        )
+
+    @cached_property
+    def owner_sessions(self) -> str:
+        return self.sql.SQL(
+            """SELECT session_id, data FROM {schema}.{table}
+            WHERE owner = %(owner)s
+            AND LEFT(session_id, LENGTH(%(prefix)s)) = %(prefix)s
+            AND expiry > NOW();
+        """
+        ).format(
+            schema=self.sql.Identifier(self.schema),
+            table=self.sql.Identifier(self.table),
+        )
+
+    @cached_property
+    def replace_session_data(self) -> str:
+        return self.sql.SQL(
+            """UPDATE {schema}.{table} SET data = %(data)s
+            WHERE session_id = %(session_id)s AND data = %(old_data)s;
+        """
+        ).format(
+            schema=self.sql.Identifier(self.schema),
+            table=self.sql.Identifier(self.table),
+        )
+
+    @cached_property
+    def delete_expired_sessions(self) -> str:
+        return self.sql.SQL(
+            """DELETE FROM {schema}.{table}
+            WHERE session_id IN (
+                --- Rows locked by a concurrent cleanup or write are left for later
+                SELECT session_id FROM {schema}.{table}
+                WHERE expiry <= NOW()
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            );
+        """
+        ).format(
+            schema=self.sql.Identifier(self.schema),
+            table=self.sql.Identifier(self.table),
+        )
+
+    @cached_property
+    def delete_session(self) -> str:
+        return self.sql.SQL(
+            "DELETE FROM {schema}.{table} WHERE session_id = %(session_id)s;"
+        ).format(
+            schema=self.sql.Identifier(self.schema),
+            table=self.sql.Identifier(self.table),
+        )
+
+    @cached_property
+    def drop_sessions_table(self) -> str:
+        return self.sql.SQL("DROP TABLE IF EXISTS {schema}.{table};").format(
+            schema=self.sql.Identifier(self.schema),
+            table=self.sql.Identifier(self.table),
+        )
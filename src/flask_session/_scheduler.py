@@ -0,0 +1,69 @@
+import atexit
+import os
+import random
+from threading import Event, Lock, Thread
+from typing import Callable, Optional
+
+
+class CleanupScheduler:
+    """Runs ``job`` every ``interval`` seconds from a daemon thread, so that
+    expired sessions are deleted outside of requests.
+
+    The thread is started on first use, and again after a fork. The first run
+    is delayed by a random part of the interval, so that workers started
+    together do not all run at once.
+
+    :param interval: The number of seconds between runs.
+    :param job: The function to run. Exceptions it raises are counted, not
+        propagated.
+    """
+
+    def __init__(self, interval: float, job: Callable[[], None]) -> None:
+        self.interval = interval
+        self.job = job
+        self.runs = 0
+        self.failures = 0
+        self._stopped = Event()
+        self._lock = Lock()
+        self._thread: Optional[Thread] = None
+        atexit.register(self.stop)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        # The thread does not survive a fork, start it again on first use
+        self._lock = Lock()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the scheduler thread is running."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start the scheduler thread unless it is already running."""
+        if self._thread is not None or self._stopped.is_set():
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(
+                    target=self._run, name="flask-session-cleanup", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        """Stop the scheduler, waiting for a running job to finish."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        delay = random.uniform(0, self.interval)
+        while not self._stopped.wait(delay):
+            try:
+                self.job()
+            except Exception:
+                self.failures += 1
+            else:
+                self.runs += 1
+            delay = self.interval
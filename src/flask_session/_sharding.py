@@ -0,0 +1,141 @@
+import secrets
+from bisect import bisect
+from hashlib import blake2b
+from typing import Any, Iterator, List, Sequence, Tuple
+
+import click
+
+# Separates the shard hint from the random part of a session id. It is never
+# produced by secrets.token_urlsafe.
+SHARD_HINT_SEPARATOR = "."
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """A consistent-hash ring mapping keys to the indexes of ``nodes`` nodes.
+
+    Each node is placed on the ring ``replicas`` times, under names derived from
+    its index. Appending a node only moves the keys that now fall on its
+    points, about ``1 / nodes`` of them, so nodes must be added at the end and
+    never reordered.
+
+    :param nodes: The number of nodes.
+    :param replicas: The number of points of each node on the ring.
+    """
+
+    def __init__(self, nodes: int, replicas: int = 160) -> None:
+        if nodes < 1:
+            raise ValueError("A hash ring needs at least one node")
+        self.nodes = nodes
+        points = sorted(
+            (_hash(f"shard-{node}-{replica}"), node)
+            for node in range(nodes)
+            for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def get_node(self, key: str) -> int:
+        """Return the index of the node ``key`` belongs to."""
+        position = bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[position]
+
+
+class ShardedClientsMixin:
+    """Spreads sessions over several storage clients for session interfaces
+    that are given a list of clients.
+
+    Each store id is routed by a :class:`HashRing`. With shard hints, new
+    session ids start with the index of the client they are stored on, so they
+    are routed without hashing and stay where they are when clients are added.
+    """
+
+    app: Any
+    key_prefix: str
+    clients: List[Any]
+    ring: HashRing
+    shard_hints = False
+
+    def _init_shards(self, clients: Sequence[Any], shard_hints: bool) -> Any:
+        """Set up the routing over ``clients`` and return the first one."""
+        self.clients = list(clients)
+        if not self.clients:
+            raise ValueError("At least one session storage client is required")
+        self.ring = HashRing(len(self.clients))
+        self.shard_hints = shard_hints
+        return self.clients[0]
+
+    def _shard_index(self, store_id: str) -> int:
+        """Return the index of the client ``store_id`` is stored on."""
+        if len(self.clients) == 1:
+            return 0
+        sid = store_id[len(self.key_prefix) :]
+        hint, separator, _ = sid.partition(SHARD_HINT_SEPARATOR)
+        if separator and hint.isdigit() and int(hint) < len(self.clients):
+            return int(hint)
+        return self.ring.get_node(store_id)
+
+    def _client_for(self, store_id: str) -> Any:
+        """Return the client ``store_id`` is stored on."""
+        return self.clients[self._shard_index(store_id)]
+
+    def _generate_sid(self, session_id_length: int) -> str:
+        sid = secrets.token_urlsafe(session_id_length)
+        if not self.shard_hints:
+            return sid
+        shard = self.ring.get_node(self.key_prefix + sid)
+        return f"{shard}{SHARD_HINT_SEPARATOR}{sid}"
+
+    # REBALANCING
+
+    def _register_rebalance_app_command(self):
+        """
+        Register a custom Flask CLI command for moving sessions to the client
+        they are routed to, after clients were added.
+
+        Run the command with `flask session_rebalance` once every process uses
+        the new list of clients.
+        """
+
+        @self.app.cli.command("session_rebalance")
+        @click.option(
+            "--batch-size",
+            default=100,
+            show_default=True,
+            help="Number of sessions read from the storage at once.",
+        )
+        def session_rebalance(batch_size):
+            with self.app.app_context():
+                scanned, moved = self._rebalance(batch_size)
+            click.echo(f"Scanned {scanned} sessions, moved {moved}.")
+
+    def _rebalance(self, batch_size: int = 100) -> Tuple[int, int]:
+        """Move the sessions that are not stored on the client they are routed
+        to. Returns the number of sessions scanned and moved."""
+        scanned = 0
+        # Sessions moved to a client that is scanned later are not counted again
+        moved = set()
+        for shard in range(len(self.clients)):
+            for store_id in self._iter_shard_store_ids(shard, batch_size):
+                if store_id in moved:
+                    continue
+                scanned += 1
+                target = self._shard_index(store_id)
+                if target != shard and self._move_session(store_id, shard, target):
+                    moved.add(store_id)
+        return scanned, len(moved)
+
+    def _iter_shard_store_ids(self, shard: int, batch_size: int) -> Iterator[str]:
+        """Yield the store id of every session stored on the client at index
+        ``shard``. Only required for rebalancing."""
+        raise NotImplementedError()
+
+    def _move_session(self, store_id: str, source: int, target: int) -> bool:
+        """Move a session, with its expiry, from the client at index ``source``
+        to the one at index ``target``, unless the session was already written
+        there. Returns whether the session still existed. Only required for
+        rebalancing."""
+        raise NotImplementedError()
@@ -22,11 +22,10 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import time
 from functools import wraps
 from typing import Any, Callable
 
-from flask import current_app
+from .retry import RetryPolicy
 
 
 def total_seconds(timedelta):
@@ -36,31 +35,33 @@ def total_seconds(timedelta):
 def retry_query(
     *, max_attempts: int = 3, delay: float = 0.3, backoff: int = 2
 ) -> Callable[..., Any]:
-    """Decorator to retry a query when an OperationalError is raised.
+    """Decorator to retry a query of a session interface when it raises one of
+    the ``retry_exceptions`` of the interface.
+
+    The ``retry_policy`` of the interface is used if it has one, otherwise the
+    query is retried with the arguments of the decorator.
 
     Args:
         max_attempts: Maximum number of attempts. Defaults to 3.
         delay: Delay between attempts in seconds. Defaults to 0.3.
         backoff: Backoff factor. Defaults to 2.
     """
+    default_policy = RetryPolicy(
+        max_attempts=max_attempts,
+        delay=delay,
+        backoff=backoff,
+        max_delay=delay * backoff ** (max_attempts - 1),
+        jitter=False,
+        failure_threshold=None,
+    )
 
     def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
-            for attempt in range(max_attempts):
-                try:
-                    return func(*args, **kwargs)
-                # TODO: use proper exception type
-                except Exception as e:
-                    if attempt == max_attempts - 1:
-                        raise e
-
-                    sleep_time = delay * backoff**attempt
-                    current_app.logger.exception(
-                        f"Exception when querying database ({e})."
-                        f"Retrying ({attempt + 1}/{max_attempts}) in {sleep_time:.2f}s."
-                    )
-                    time.sleep(sleep_time)
+            interface = args[0] if args else None
+            policy = getattr(interface, "retry_policy", None) or default_policy
+            retry_exceptions = getattr(interface, "retry_exceptions", (Exception,))
+            return policy.call(func, args, kwargs, retry_exceptions)
 
         return wrapper
 
@@ -0,0 +1,133 @@
+import atexit
+import os
+import time
+from collections import deque
+from threading import Condition, Thread
+from typing import Callable, Deque, Dict, List, Optional
+
+
+class WriteBehindQueue:
+    """A bounded queue of session writes run by background worker threads, so
+    that responses do not wait for the session storage.
+
+    Writes for the same key are run one at a time, in the order they were
+    submitted. Writes for different keys run concurrently. The worker threads
+    are started on first use, and again after a fork. Pending writes are
+    flushed when the interpreter exits.
+
+    :param maxsize: The maximum number of pending writes. When it is reached,
+        :meth:`submit` refuses new writes.
+    :param workers: The number of worker threads.
+    """
+
+    def __init__(self, maxsize: int, workers: int) -> None:
+        self.maxsize = maxsize
+        self.workers = workers
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self._closed = False
+        self._reset()
+        atexit.register(self.close)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        # Writes queued before a fork are run by the parent process, and the
+        # worker threads do not survive it
+        self._depth = 0
+        # Pending writes per key, and the keys that have writes but no running one
+        self._jobs: Dict[str, Deque[Callable[[], None]]] = {}
+        self._ready: Deque[str] = deque()
+        self._condition = Condition()
+        self._threads: List[Thread] = []
+
+    @property
+    def depth(self) -> int:
+        """The number of writes that are pending or running."""
+        return self._depth
+
+    def submit(self, key: str, job: Callable[[], None]) -> bool:
+        """Queue ``job`` to run after the writes already queued for ``key``.
+        Returns ``False`` without queuing it if the queue is full or closed."""
+        with self._condition:
+            if self._closed or self._depth >= self.maxsize:
+                self.rejected += 1
+                return False
+            self._start_workers()
+            jobs = self._jobs.get(key)
+            if jobs is None:
+                self._jobs[key] = deque([job])
+                self._ready.append(key)
+            else:
+                jobs.append(job)
+            self._depth += 1
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self._depth)
+            self._condition.notify_all()
+        return True
+
+    def wait(self, key: str, timeout: Optional[float] = None) -> bool:
+        """Block until there are no pending writes for ``key``. Returns ``False``
+        if the timeout expired first."""
+        with self._condition:
+            return self._condition.wait_for(lambda: key not in self._jobs, timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until all pending writes are done. Returns ``False`` if the
+        timeout expired first."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._depth == 0, timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Stop accepting writes, flush the pending ones and stop the workers."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self.flush(timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(
+                None if deadline is None else max(0.0, deadline - time.monotonic())
+            )
+
+    def _start_workers(self) -> None:
+        if self._threads:
+            return
+        self._threads = [
+            Thread(target=self._work, name=f"flask-session-writer-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._ready or self._closed)
+                if not self._ready:
+                    # Closed and nothing left to run
+                    return
+                key = self._ready.popleft()
+                job = self._jobs[key].popleft()
+
+            try:
+                job()
+            except Exception:
+                failed = True
+            else:
+                failed = False
+
+            with self._condition:
+                if failed:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+                self._depth -= 1
+                if self._jobs[key]:
+                    self._ready.append(key)
+                else:
+                    del self._jobs[key]
+                self._condition.notify_all()
@@ -2,25 +2,43 @@ import secrets
 import warnings
 from abc import ABC, abstractmethod
 from contextlib import suppress
+from copy import deepcopy
 
 try:
     import cPickle as pickle
 except ImportError:
     import pickle
 
+import os
 import random
+import socket
+import time
+import zlib
 from datetime import timedelta as TimeDelta
-from typing import Any, Dict, Optional
+from threading import local
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Type
 
+import click
 import msgspec
+import msgspec.inspect
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 from flask import Flask, Request, Response
 from flask.sessions import SessionInterface as FlaskSessionInterface
 from flask.sessions import SessionMixin
 from itsdangerous import BadSignature, Signer, want_bytes
 from werkzeug.datastructures import CallbackDict
 
-from ._utils import retry_query
+from ._cache import LocalCache
+from ._metrics import measure, record_size
+from ._scheduler import CleanupScheduler
+from ._utils import retry_query, total_seconds
+from ._write_behind import WriteBehindQueue
 from .defaults import Defaults
+from .retry import RetryPolicy
 
 
 class ServerSideSession(CallbackDict, SessionMixin):
@@ -35,8 +53,9 @@ class ServerSideSession(CallbackDict, SessionMixin):
 
     When data is changed, this is set to ``True``. Only the session dictionary
     itself is tracked; if the session contains mutable data (for example a nested
-    dict) then this must be set to ``True`` manually when modifying that data. The
-    session cookie will only be written to the response if this is ``True``.
+    dict) then this must be set to ``True`` manually when modifying that data,
+    unless ``SESSION_DETECT_NESTED_CHANGES`` is enabled. The session cookie will
+    only be written to the response if this is ``True``.
 
     .. attribute:: accessed
 
@@ -53,10 +72,18 @@ class ServerSideSession(CallbackDict, SessionMixin):
 
     Default is ``False``.
 
+    .. attribute:: loaded
+
+    Whether the session data has been loaded from storage. This is only
+    ``False`` for a session opened with ``SESSION_LAZY_LOADING`` that has not
+    been used yet.
+
     """
 
+    loaded = True
+
     def __bool__(self) -> bool:
-        return bool(dict(self)) and self.keys() != {"_permanent"}
+        return bool(self.keys() - {"_permanent"})
 
     def __init__(
         self,
@@ -69,11 +96,24 @@ class ServerSideSession(CallbackDict, SessionMixin):
             self.accessed = True
 
         CallbackDict.__init__(self, initial, on_update)
+        # When the expiry was last extended, stored with the data but not part
+        # of it
+        self._refreshed = dict.pop(self, "_refreshed", None)
         self.sid = sid
         if permanent:
             self.permanent = permanent
         self.modified = False
         self.accessed = False
+        # Fingerprint of the data as it was loaded from storage, if any
+        self._stored_fingerprint: Optional[bytes] = None
+        # Uncompressed serialized data as it was loaded from storage, if any,
+        # compared instead of a fingerprint
+        self._stored_serialized: Optional[bytes] = None
+        # Fingerprints of each top-level value as loaded, used for delta writes
+        self._stored_fields: Optional[Dict[str, Optional[bytes]]] = None
+        # Session id the session is stored under until it is saved, after the
+        # session id was regenerated
+        self._previous_sid: Optional[str] = None
 
     def __getitem__(self, key: str) -> Any:
         self.accessed = True
@@ -94,6 +134,110 @@ class ServerSideSession(CallbackDict, SessionMixin):
         self["_permanent"] = permanent
 
 
+class LazySessionMixin:
+    """Mixin for :class:`ServerSideSession` classes that defers loading the
+    session data from storage until the session is first used.
+
+    :param loader: Called with the session to load its data the first time the
+        session is read from or written to.
+
+    .. versionadded:: 0.9
+    """
+
+    _loader: Optional[Callable[["ServerSideSession"], None]] = None
+
+    def __init__(
+        self,
+        *args: Any,
+        loader: Optional[Callable[["ServerSideSession"], None]] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(*args, **kwargs)
+        self._loader = loader
+
+    @property
+    def loaded(self) -> bool:
+        return self._loader is None
+
+    def _load(self) -> None:
+        loader = self._loader
+        if loader is not None:
+            self._loader = None
+            loader(self)
+
+    def __bool__(self) -> bool:
+        self._load()
+        return super().__bool__()
+
+    def __repr__(self) -> str:
+        self._load()
+        return super().__repr__()
+
+    def __len__(self) -> int:
+        self._load()
+        return super().__len__()
+
+    def __iter__(self):
+        self._load()
+        return super().__iter__()
+
+    def __contains__(self, key: object) -> bool:
+        self._load()
+        return super().__contains__(key)
+
+    def __getitem__(self, key: str) -> Any:
+        self._load()
+        return super().__getitem__(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._load()
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key: str) -> None:
+        self._load()
+        super().__delitem__(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        self._load()
+        return super().get(key, default)
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        self._load()
+        return super().setdefault(key, default)
+
+    def pop(self, *args: Any) -> Any:
+        self._load()
+        return super().pop(*args)
+
+    def popitem(self) -> Any:
+        self._load()
+        return super().popitem()
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        self._load()
+        super().update(*args, **kwargs)
+
+    def clear(self) -> None:
+        self._load()
+        super().clear()
+
+    def keys(self):
+        self._load()
+        return super().keys()
+
+    def values(self):
+        self._load()
+        return super().values()
+
+    def items(self):
+        self._load()
+        return super().items()
+
+    def copy(self) -> Dict[str, Any]:
+        self._load()
+        return super().copy()
+
+
 class Serializer(ABC):
     """Baseclass for session serialization."""
 
@@ -108,8 +252,46 @@ class Serializer(ABC):
         raise NotImplementedError()
 
 
+# Compressed data starts with this byte, which is never used by msgpack and
+# cannot start JSON or a pickle, followed by a byte identifying the codec
+COMPRESSED_MARKER = 0xC1
+CODEC_ZLIB = 0x01
+CODEC_ZSTD = 0x02
+CODEC_ZSTD_DICT = 0x03
+
+
 class MsgSpecSerializer(Serializer):
-    def __init__(self, app: Flask, format: str):
+    """Serializes session data with msgspec, optionally compressing it.
+
+    :param app: The Flask app, used for logging.
+    :param format: ``"msgpack"`` or ``"json"``.
+    :param compression: ``"zlib"``, ``"zstd"`` (`zstandard` required) or
+        ``None`` to not compress.
+    :param compression_threshold: Only data of at least this many bytes is
+        compressed.
+    :param compression_dict: A zstd dictionary trained on typical session data,
+        to compress small payloads better.
+    :param schema: A ``msgspec.Struct`` or ``TypedDict`` describing the session
+        data. Its keys are validated and decoded with a typed decoder, other
+        keys are stored alongside.
+
+    Compressed and uncompressed data can be mixed, :meth:`loads` reads both
+    regardless of the compression settings.
+
+    .. versionadded:: 0.9
+        The `compression`, `compression_threshold`, `compression_dict` and
+        `schema` parameters were added.
+    """
+
+    def __init__(
+        self,
+        app: Flask,
+        format: str,
+        compression: Optional[str] = Defaults.SESSION_COMPRESSION,
+        compression_threshold: int = Defaults.SESSION_COMPRESSION_THRESHOLD,
+        compression_dict: Optional[bytes] = Defaults.SESSION_COMPRESSION_DICT,
+        schema: Optional[type] = Defaults.SESSION_SCHEMA,
+    ):
         self.app: Flask = app
         self.encoder: msgspec.msgpack.Encoder or msgspec.json.Encoder
         self.decoder: msgspec.msgpack.Decoder or msgspec.json.Decoder
@@ -125,27 +307,270 @@ class MsgSpecSerializer(Serializer):
             self.alternate_decoder = msgspec.msgpack.Decoder()
         else:
             raise ValueError(f"Unsupported serialization format: {format}")
+        self.format = format
+        # Data is decoded in the format it was written in, which may differ
+        # from the configured one
+        alternate_format = "json" if format == "msgpack" else "msgpack"
+        self.decoders = {format: self.decoder, alternate_format: self.alternate_decoder}
+
+        if compression not in (None, "zlib", "zstd"):
+            raise ValueError(f"Unsupported compression: {compression}")
+        if (compression == "zstd" or compression_dict) and zstandard is None:
+            raise ImportError("zstd compression requires the zstandard package")
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        self.compression_dict = (
+            zstandard.ZstdCompressionDict(compression_dict)
+            if compression_dict
+            else None
+        )
+        # zstd (de)compressors must not be shared between threads
+        self._zstd = local()
+
+        self.schema = schema
+        self.schema_fields: Optional[frozenset] = None
+        self.typed_decoders: Optional[dict] = None
+        if schema is not None:
+            type_info = msgspec.inspect.type_info(schema)
+            if not isinstance(
+                type_info, (msgspec.inspect.StructType, msgspec.inspect.TypedDictType)
+            ):
+                raise TypeError("SESSION_SCHEMA must be a msgspec.Struct or TypedDict")
+            if any(field.name != field.encode_name for field in type_info.fields):
+                raise ValueError("Renamed fields are not supported in SESSION_SCHEMA")
+            self.schema_fields = frozenset(field.name for field in type_info.fields)
+            typed = Tuple[schema, Dict[str, Any]]
+            self.typed_decoders = {
+                "msgpack": msgspec.msgpack.Decoder(typed),
+                "json": msgspec.json.Decoder(typed),
+            }
 
     def dumps(self, data: dict) -> bytes:
         """Serialize the session data."""
+        return self._maybe_compress(self.encode(data))
+
+    def encode(self, data: dict) -> bytes:
+        """Serialize the session data without compressing it, as kept by the
+        data returned by :meth:`loads`."""
         try:
-            return self.encoder.encode(data)
+            if self.schema_fields is not None:
+                # Encode the keys of the schema apart from the others
+                known = {}
+                overflow = {}
+                for key, value in data.items():
+                    if key in self.schema_fields:
+                        known[key] = value
+                    else:
+                        overflow[key] = value
+                serialized_data = self.encoder.encode((known, overflow))
+            else:
+                serialized_data = self.encoder.encode(data)
         except Exception as e:
             self.app.logger.error(f"Failed to serialize session data: {e}")
             raise
+        return serialized_data
+
+    def dumps_value(self, value: Any) -> bytes:
+        """Serialize a single value of the session, for backends that store
+        each key of the session separately. The schema is not used."""
+        try:
+            serialized_data = self.encoder.encode(value)
+        except Exception as e:
+            self.app.logger.error(f"Failed to serialize session data: {e}")
+            raise
+        return self._maybe_compress(serialized_data)
+
+    def _maybe_compress(self, serialized_data: bytes) -> bytes:
+        if self.compression and len(serialized_data) >= self.compression_threshold:
+            compressed_data = self._compress(serialized_data)
+            # Keep the data as it is if compressing does not make it smaller
+            if len(compressed_data) < len(serialized_data):
+                serialized_data = compressed_data
+        record_size(len(serialized_data))
+        return serialized_data
+
+    def _compress(self, serialized_data: bytes) -> bytes:
+        if self.compression == "zlib":
+            header = bytes((COMPRESSED_MARKER, CODEC_ZLIB))
+            return header + zlib.compress(serialized_data)
+        codec = CODEC_ZSTD if self.compression_dict is None else CODEC_ZSTD_DICT
+        return bytes((COMPRESSED_MARKER, codec)) + self._zstd_compressor().compress(
+            serialized_data
+        )
+
+    def _decompress(self, compressed_data: bytes) -> bytes:
+        codec = compressed_data[1]
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(compressed_data[2:])
+        if codec in (CODEC_ZSTD, CODEC_ZSTD_DICT):
+            if zstandard is None:
+                raise ImportError("zstd compression requires the zstandard package")
+            if codec == CODEC_ZSTD_DICT and self.compression_dict is None:
+                raise ValueError(
+                    "SESSION_COMPRESSION_DICT is required to read this session"
+                )
+            return self._zstd_decompressor(codec).decompress(compressed_data[2:])
+        raise ValueError(f"Unsupported compression codec: {codec}")
+
+    def _zstd_compressor(self) -> "zstandard.ZstdCompressor":
+        compressor = getattr(self._zstd, "compressor", None)
+        if compressor is None:
+            compressor = zstandard.ZstdCompressor(dict_data=self.compression_dict)
+            self._zstd.compressor = compressor
+        return compressor
+
+    def _zstd_decompressor(self, codec: int) -> "zstandard.ZstdDecompressor":
+        name = f"decompressor_{codec}"
+        decompressor = getattr(self._zstd, name, None)
+        if decompressor is None:
+            dict_data = self.compression_dict if codec == CODEC_ZSTD_DICT else None
+            decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+            setattr(self._zstd, name, decompressor)
+        return decompressor
 
     def loads(self, serialized_data: bytes) -> dict:
         """Deserialize the session data."""
+        serialized_data = self._maybe_decompress(serialized_data)
+        format = sniff_format(serialized_data)
+
         # TODO: Remove the pickle fallback in 1.0.0
+        if format == "pickle":
+            try:
+                return pickle.loads(serialized_data)
+            except Exception as e:
+                self.app.logger.error(
+                    "Failed to deserialize session data", exc_info=True
+                )
+                raise pickle.UnpicklingError(
+                    "Failed to deserialize session data"
+                ) from e
+
+        return LoadedSessionData(self._decode(serialized_data, format), serialized_data)
+
+    def _decode(self, serialized_data: bytes, format: str) -> dict:
+        # Sessions encoded with a schema are a pair of the keys of the schema
+        # and the other keys, others are a map
+        is_pair = serialized_data[:1] in (b"\x92", b"[")
+        if is_pair and self.typed_decoders is not None:
+            return self._loads_typed(serialized_data, format)
+
+        try:
+            data = self.decoders[format].decode(serialized_data)
+        except msgspec.DecodeError:
+            self.app.logger.error("Failed to deserialize session data", exc_info=True)
+            raise
+        if is_pair:
+            # Encoded with a schema that is no longer configured
+            known, overflow = data
+            return {**known, **overflow}
+        return data
+
+    def loads_value(self, serialized_data: bytes) -> Any:
+        """Deserialize a single value of the session, serialized by
+        :meth:`dumps_value`."""
+        serialized_data = self._maybe_decompress(serialized_data)
         with suppress(msgspec.DecodeError):
             return self.decoder.decode(serialized_data)
-        with suppress(msgspec.DecodeError):
-            return self.alternate_decoder.decode(serialized_data)
-        with suppress(pickle.UnpicklingError):
-            return pickle.loads(serialized_data)
-        # If all decoders fail, raise the final exception
-        self.app.logger.error("Failed to deserialize session data", exc_info=True)
-        raise pickle.UnpicklingError("Failed to deserialize session data")
+        # Serialized before the serialization format was changed
+        return self.alternate_decoder.decode(serialized_data)
+
+    def format_of(self, serialized_data: bytes) -> str:
+        """Return the format of serialized session data, ``"msgpack"``,
+        ``"json"`` or ``"pickle"``."""
+        return sniff_format(self._maybe_decompress(serialized_data))
+
+    def _maybe_decompress(self, serialized_data: bytes) -> bytes:
+        # Some drivers return binary columns as a memoryview, psycopg2 for one
+        if isinstance(serialized_data, memoryview):
+            serialized_data = serialized_data.tobytes()
+        record_size(len(serialized_data))
+        if serialized_data[:1] != bytes((COMPRESSED_MARKER,)):
+            return serialized_data
+        try:
+            return self._decompress(serialized_data)
+        except Exception:
+            self.app.logger.error("Failed to decompress session data", exc_info=True)
+            raise
+
+    def _loads_typed(self, serialized_data: bytes, format: str) -> dict:
+        try:
+            known, overflow = self.typed_decoders[format].decode(serialized_data)
+        except msgspec.DecodeError:
+            self.app.logger.error(
+                "Session data does not match SESSION_SCHEMA", exc_info=True
+            )
+            raise
+        if isinstance(known, msgspec.Struct):
+            known = {
+                field: getattr(known, field)
+                for field in known.__struct_fields__
+                if getattr(known, field) is not msgspec.UNSET
+            }
+        known.update(overflow)
+        return known
+
+
+def sniff_format(serialized_data: bytes) -> str:
+    """Tell the format of uncompressed session data from its first byte,
+    ``"msgpack"``, ``"json"`` or ``"pickle"``.
+
+    Session data is always a map, or a pair of maps when encoded with a schema,
+    so the first byte of msgpack and JSON data can not be mistaken for one
+    another. Pickle data starts with a protocol header or an ASCII opcode.
+    """
+    first = serialized_data[:1]
+    if first in (b"{", b"["):
+        return "json"
+    if first == b"\x80":
+        # An empty msgpack map, or the header of pickle protocol 2 and above
+        return "msgpack" if len(serialized_data) == 1 else "pickle"
+    if b"\x81" <= first <= b"\x8f" or first in (b"\x92", b"\xde", b"\xdf"):
+        return "msgpack"
+    return "pickle"
+
+
+# Used to tell whether session data changed between loading and saving. It is
+# independent of the configured serializer so that it can also be used for
+# backends that do not serialize the data themselves.
+_fingerprint_encoder = msgspec.msgpack.Encoder()
+
+
+def _fingerprint(session_data: dict) -> Optional[bytes]:
+    """Return a byte representation of the session data to compare against, or
+    ``None`` if the data contains types that can not be encoded."""
+    try:
+        return _fingerprint_encoder.encode(session_data)
+    except Exception:
+        return None
+
+
+class LoadedSessionData(dict):
+    """Session data returned by :meth:`MsgSpecSerializer.loads`, keeping the
+    uncompressed data it was decoded from. Comparing it to the session encoded
+    again when it is saved tells whether the session changed, without encoding
+    the session when it is loaded."""
+
+    def __init__(self, data: dict, serialized: bytes) -> None:
+        super().__init__(data)
+        self.serialized = serialized
+
+
+def _stored_data(session: ServerSideSession) -> dict:
+    """Return the session data as it is stored, with the time the expiry of the
+    session was last extended."""
+    session_data = dict(session)
+    if session._refreshed is not None:
+        session_data["_refreshed"] = session._refreshed
+    return session_data
+
+
+def _owner_of(session_data: dict, owner_key: Optional[str]) -> Optional[str]:
+    """Return the owner of a session as stored in the owner index, or ``None``
+    if it has none."""
+    if owner_key is None:
+        return None
+    owner = session_data.get(owner_key)
+    return None if owner is None else str(owner)
 
 
 class ServerSideSessionInterface(FlaskSessionInterface, ABC):
@@ -154,6 +579,10 @@ class ServerSideSessionInterface(FlaskSessionInterface, ABC):
     session_class = ServerSideSession
     serializer = None
     ttl = True
+    delta_writes = False
+    cleanup_scheduler = None
+    # The exceptions of the storage client that retry_query retries
+    retry_exceptions: Tuple[Type[BaseException], ...] = (Exception,)
 
     def __init__(
         self,
@@ -164,6 +593,26 @@ class ServerSideSessionInterface(FlaskSessionInterface, ABC):
         sid_length: int = Defaults.SESSION_ID_LENGTH,
         serialization_format: str = Defaults.SESSION_SERIALIZATION_FORMAT,
         cleanup_n_requests: Optional[int] = Defaults.SESSION_CLEANUP_N_REQUESTS,
+        local_cache_size: int = Defaults.SESSION_LOCAL_CACHE_SIZE,
+        local_cache_ttl: float = Defaults.SESSION_LOCAL_CACHE_TTL,
+        detect_nested_changes: bool = Defaults.SESSION_DETECT_NESTED_CHANGES,
+        lazy_loading: bool = Defaults.SESSION_LAZY_LOADING,
+        refresh_threshold: Optional[float] = Defaults.SESSION_REFRESH_THRESHOLD,
+        write_behind: bool = Defaults.SESSION_WRITE_BEHIND,
+        write_behind_queue_size: int = Defaults.SESSION_WRITE_BEHIND_QUEUE_SIZE,
+        write_behind_workers: int = Defaults.SESSION_WRITE_BEHIND_WORKERS,
+        compression: Optional[str] = Defaults.SESSION_COMPRESSION,
+        compression_threshold: int = Defaults.SESSION_COMPRESSION_THRESHOLD,
+        compression_dict: Optional[bytes] = Defaults.SESSION_COMPRESSION_DICT,
+        session_schema: Optional[type] = Defaults.SESSION_SCHEMA,
+        retry_policy: Optional[RetryPolicy] = Defaults.SESSION_RETRY_POLICY,
+        negative_cache_size: int = Defaults.SESSION_NEGATIVE_CACHE_SIZE,
+        negative_cache_ttl: float = Defaults.SESSION_NEGATIVE_CACHE_TTL,
+        owner_key: Optional[str] = Defaults.SESSION_OWNER_KEY,
+        cleanup_batch_size: int = Defaults.SESSION_CLEANUP_BATCH_SIZE,
+        cleanup_batch_pause: float = Defaults.SESSION_CLEANUP_BATCH_PAUSE,
+        cleanup_time_budget: Optional[float] = Defaults.SESSION_CLEANUP_TIME_BUDGET,
+        cleanup_interval: Optional[float] = Defaults.SESSION_CLEANUP_INTERVAL,
     ):
         self.app = app
         self.key_prefix = key_prefix
@@ -179,6 +628,33 @@ class ServerSideSessionInterface(FlaskSessionInterface, ABC):
         self.sid_length = sid_length
         self.has_same_site_capability = hasattr(self, "get_cookie_samesite")
         self.cleanup_n_requests = cleanup_n_requests
+        if cleanup_batch_size < 1:
+            raise ValueError("SESSION_CLEANUP_BATCH_SIZE must be at least 1")
+        self.cleanup_batch_size = cleanup_batch_size
+        self.cleanup_batch_pause = cleanup_batch_pause
+        self.cleanup_time_budget = cleanup_time_budget
+        self.cleanup_interval = cleanup_interval
+        self.retry_policy = retry_policy
+        self.detect_nested_changes = detect_nested_changes
+        self.lazy_loading = lazy_loading
+        if refresh_threshold is not None and not 0 <= refresh_threshold <= 1:
+            raise ValueError("SESSION_REFRESH_THRESHOLD must be between 0 and 1")
+        self.refresh_threshold = refresh_threshold
+        self.owner_key = owner_key
+        if lazy_loading:
+            self.session_class = type(
+                self.session_class.__name__,
+                (LazySessionMixin, self.session_class),
+                {},
+            )
+
+        # Format migration, for backends that can list their sessions
+        if (
+            app is not None
+            and type(self)._iter_serialized_sessions
+            is not ServerSideSessionInterface._iter_serialized_sessions
+        ):
+            self._register_migrate_format_app_command()
 
         # Cleanup settings for non-TTL databases only
         if getattr(self, "ttl", None) is False:
@@ -186,9 +662,46 @@ class ServerSideSessionInterface(FlaskSessionInterface, ABC):
                 self.app.before_request(self._cleanup_n_requests)
             else:
                 self._register_cleanup_app_command()
+            if self.cleanup_interval:
+                # Started by the first request, so that CLI commands and the
+                # parent of pre-forking servers do not run it
+                self.cleanup_scheduler = CleanupScheduler(
+                    self.cleanup_interval, self._run_scheduled_cleanup
+                )
+                self.app.before_request(self.cleanup_scheduler.start)
 
         # Set the serialization format
-        self.serializer = MsgSpecSerializer(format=serialization_format, app=app)
+        self.serializer = MsgSpecSerializer(
+            format=serialization_format,
+            app=app,
+            compression=compression,
+            compression_threshold=compression_threshold,
+            compression_dict=compression_dict,
+            schema=session_schema,
+        )
+
+        # In-process cache of recently used session data, disabled by default
+        self.local_cache = (
+            LocalCache(maxsize=local_cache_size, ttl=local_cache_ttl)
+            if local_cache_size
+            else None
+        )
+
+        # In-process set of recently missed store ids, disabled by default
+        self.negative_cache = (
+            LocalCache(maxsize=negative_cache_size, ttl=negative_cache_ttl)
+            if negative_cache_size
+            else None
+        )
+
+        # Background writes of sessions after the response, disabled by default
+        self.write_behind = (
+            WriteBehindQueue(
+                maxsize=write_behind_queue_size, workers=write_behind_workers
+            )
+            if write_behind
+            else None
+        )
 
     # INTERNAL METHODS
 
@@ -218,6 +731,162 @@ class ServerSideSessionInterface(FlaskSessionInterface, ABC):
     def _get_store_id(self, sid: str) -> str:
         return self.key_prefix + sid
 
+    def _load_session_data(self, store_id: str) -> Optional[dict]:
+        """Get the saved session, from the local cache if enabled and fresh,
+        otherwise from the session storage unless it was recently missing."""
+        if self.write_behind is not None:
+            # Read the writes of earlier requests made by this process
+            self.write_behind.wait(store_id)
+
+        if self.local_cache is not None:
+            with measure(self, "local_cache") as measured:
+                session_data = self.local_cache.get(store_id)
+                if measured:
+                    measured.outcome = "miss" if session_data is None else "hit"
+            if session_data is not None:
+                return session_data
+
+        if self.negative_cache is not None:
+            with measure(self, "negative_cache") as measured:
+                missing = self.negative_cache.get(store_id)
+                if measured:
+                    measured.outcome = "miss" if missing is None else "hit"
+            if missing:
+                return None
+
+        with measure(self, "retrieve") as measured:
+            session_data = self._retrieve_session_data(store_id)
+            if measured:
+                measured.outcome = "miss" if session_data is None else "hit"
+
+        if session_data is None:
+            if self.negative_cache is not None:
+                self.negative_cache.set(store_id, True)
+        elif self.local_cache is not None:
+            self.local_cache.set(store_id, session_data)
+        return session_data
+
+    def _take_snapshot(
+        self, session: ServerSideSession, saved_session_data: dict
+    ) -> None:
+        """Remember what the session data looked like when it was loaded, to
+        tell later what changed."""
+        if isinstance(saved_session_data, LoadedSessionData):
+            session._stored_serialized = saved_session_data.serialized
+        else:
+            session._stored_fingerprint = _fingerprint(saved_session_data)
+        if self.delta_writes:
+            session._stored_fields = {
+                key: _fingerprint(value) for key, value in saved_session_data.items()
+            }
+
+    def _diff_session_fields(self, session: ServerSideSession) -> tuple:
+        """Return the top-level keys whose values changed or were added, and the
+        keys that were deleted, since the session was loaded."""
+        stored_fields = session._stored_fields
+        changed = []
+        current_keys = set()
+        for key, value in _stored_data(session).items():
+            current_keys.add(key)
+            fingerprint = _fingerprint(value)
+            if fingerprint is None or stored_fields.get(key) != fingerprint:
+                changed.append(key)
+        deleted = [key for key in stored_fields if key not in current_keys]
+        return changed, deleted
+
+    def _load_lazy_session(self, session: ServerSideSession) -> None:
+        """Load the data of a lazily opened session from storage."""
+        saved_session_data = self._load_session_data(self._get_store_id(session.sid))
+
+        if saved_session_data is not None:
+            # Bypass the update callback, loading is not a modification
+            dict.update(session, saved_session_data)
+            session._refreshed = dict.pop(session, "_refreshed", None)
+            self._take_snapshot(session, saved_session_data)
+            return
+
+        # If the saved session does not exist, continue with a new session
+        session.sid = self._generate_sid(self.sid_length)
+        if self.permanent:
+            dict.__setitem__(session, "_permanent", True)
+
+    def _save_session_data(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        """Update existing or create new session in the session storage and
+        keep the local caches in step with it."""
+        if self.local_cache is not None:
+            self.local_cache.delete(store_id)
+        if self.negative_cache is not None:
+            self.negative_cache.delete(store_id)
+
+        if self.delta_writes and session._stored_fields is not None:
+            # Only write the top-level keys that changed
+            changed, deleted = self._diff_session_fields(session)
+            with measure(self, "update_fields"):
+                self._update_session_fields(
+                    session_lifetime, session, store_id, changed, deleted
+                )
+        else:
+            with measure(self, "upsert"):
+                self._upsert_session(session_lifetime, session, store_id)
+
+        if self.local_cache is not None:
+            self.local_cache.set(store_id, _stored_data(session))
+
+    def _touch_session_data(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        """Extend the expiry of a session whose data did not change. When
+        ``SESSION_REFRESH_THRESHOLD`` is set, the time the expiry was extended at
+        is stored with the session data as well, as the only changed field with
+        ``SESSION_DELTA_WRITES`` or else by writing the session again."""
+        if self.refresh_threshold is None or not session.permanent:
+            with measure(self, "touch"):
+                self._touch_session(session_lifetime, session, store_id)
+            return
+
+        if self.local_cache is not None:
+            self.local_cache.delete(store_id)
+        with measure(self, "touch"):
+            if self.delta_writes and session._stored_fields is not None:
+                self._update_session_fields(
+                    session_lifetime, session, store_id, ["_refreshed"], []
+                )
+            else:
+                self._upsert_session(session_lifetime, session, store_id)
+        if self.local_cache is not None:
+            self.local_cache.set(store_id, _stored_data(session))
+
+    def _remove_session_data(self, store_id: str) -> None:
+        """Delete session from the session storage and the local cache."""
+        if self.local_cache is not None:
+            self.local_cache.delete(store_id)
+        with measure(self, "delete"):
+            self._delete_session(store_id)
+        if self.negative_cache is not None:
+            self.negative_cache.set(store_id, True)
+
+    def _rename_session_data(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        previous_store_id: str,
+        store_id: str,
+    ) -> None:
+        """Move the session to its regenerated store id, writing its data, and
+        keep the local caches in step with it."""
+        if self.local_cache is not None:
+            self.local_cache.delete(previous_store_id)
+        if self.negative_cache is not None:
+            self.negative_cache.delete(store_id)
+        with measure(self, "rename"):
+            self._rename_session(session_lifetime, session, previous_store_id, store_id)
+        if self.local_cache is not None:
+            self.local_cache.set(store_id, _stored_data(session))
+        if self.negative_cache is not None:
+            self.negative_cache.set(previous_store_id, True)
+
     def should_set_storage(self, app: Flask, session: ServerSideSession) -> bool:
         """Used by session backends to determine if session in storage
         should be set for this session cookie for this response. If the session
@@ -226,11 +895,51 @@ class ServerSideSessionInterface(FlaskSessionInterface, ABC):
         always set to storage. In the second case, this means refreshing the
         storage expiry even if the session has not been modified.
 
+        If ``SESSION_REFRESH_THRESHOLD`` is set, a permanent session is only set
+        to storage when it was modified or its expiry was due to be extended.
+
         .. versionadded:: 0.7.0
         """
-
+        if self.refresh_threshold is not None and session.permanent:
+            return session.modified
         return session.modified or app.config["SESSION_REFRESH_EACH_REQUEST"]
 
+    def _session_data_changed(self, session: ServerSideSession) -> bool:
+        """Whether the session data differs from what was loaded from storage.
+        Reassigning a key to an equal value marks the session as modified, but
+        does not change the data.
+
+        If ``detect_nested_changes`` is enabled, an unmodified session is compared
+        as well and marked as modified if mutable values nested in it were changed.
+        """
+        if not session.modified and not self.detect_nested_changes:
+            return False
+        if session._stored_serialized is not None:
+            try:
+                encoded = self.serializer.encode(_stored_data(session))
+            except Exception:
+                encoded = None
+            changed = encoded != session._stored_serialized
+        elif session._stored_fingerprint is None:
+            return session.modified
+        else:
+            changed = _fingerprint(_stored_data(session)) != session._stored_fingerprint
+        if changed:
+            session.modified = True
+        return changed
+
+    def _refresh_due(self, app: Flask, session: ServerSideSession) -> bool:
+        """Whether the remaining lifetime of the session, since its expiry was
+        last extended, has fallen below the threshold to extend it again."""
+        if not app.config["SESSION_REFRESH_EACH_REQUEST"]:
+            return False
+        refreshed = session._refreshed
+        if not isinstance(refreshed, (int, float)):
+            return True
+        lifetime = total_seconds(app.permanent_session_lifetime)
+        remaining = lifetime - (time.time() - refreshed)
+        return remaining < self.refresh_threshold * lifetime
+
     # CLEANUP METHODS FOR NON TTL DATABASES
 
     def _register_cleanup_app_command(self):
@@ -242,46 +951,268 @@ class ServerSideSessionInterface(FlaskSessionInterface, ABC):
         """
 
         @self.app.cli.command("session_cleanup")
-        def session_cleanup():
+        @click.option(
+            "--batch-size",
+            type=click.IntRange(min=1),
+            default=None,
+            help="Number of expired sessions deleted at once. Defaults to SESSION_CLEANUP_BATCH_SIZE.",
+        )
+        @click.option(
+            "--time-budget",
+            type=float,
+            default=None,
+            help="Stop after this many seconds. Defaults to SESSION_CLEANUP_TIME_BUDGET.",
+        )
+        def session_cleanup(batch_size, time_budget):
+            def report(deleted):
+                click.echo(f"Deleted {deleted} expired sessions so far.")
+
+            deleted, finished = self._run_cleanup_command(
+                batch_size=batch_size, time_budget=time_budget, progress=report
+            )
+            if finished:
+                click.echo(f"Deleted {deleted} expired sessions.")
+            else:
+                click.echo(
+                    f"Deleted {deleted} expired sessions before running out of time, "
+                    "run the command again to continue."
+                )
+
+    def _run_cleanup_command(
+        self,
+        batch_size: Optional[int] = None,
+        time_budget: Optional[float] = None,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> Tuple[int, bool]:
+        """Delete expired sessions for the ``session_cleanup`` command, see
+        :meth:`_delete_expired_sessions`."""
+        with self.app.app_context():
+            return self._delete_expired_sessions(
+                batch_size=batch_size, time_budget=time_budget, progress=progress
+            )
+
+    def _delete_expired_sessions(
+        self,
+        batch_size: Optional[int] = None,
+        time_budget: Optional[float] = None,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> Tuple[int, bool]:
+        """Delete expired sessions ``batch_size`` at a time, pausing between
+        batches, until none are left or ``time_budget`` seconds have passed.
+        Each batch is committed on its own, so a cleanup that ran out of time
+        is continued by the next one. ``progress`` is called with the number of
+        sessions deleted so far after each full batch.
+
+        Returns the number of sessions deleted and whether none are left.
+        """
+        batch_size = batch_size or self.cleanup_batch_size
+        if time_budget is None:
+            time_budget = self.cleanup_time_budget
+        deadline = None if time_budget is None else time.monotonic() + time_budget
+        deleted = 0
+        while True:
+            with measure(self, "delete_expired"):
+                batch_deleted = self._delete_expired_batch(batch_size)
+            deleted += batch_deleted
+            if batch_deleted < batch_size:
+                return deleted, True
+            if progress is not None:
+                progress(deleted)
+            if deadline is not None and time.monotonic() >= deadline:
+                return deleted, False
+            if self.cleanup_batch_pause:
+                # Let other transactions and replication catch up
+                time.sleep(self.cleanup_batch_pause)
+
+    # FORMAT MIGRATION
+
+    def _register_migrate_format_app_command(self):
+        """
+        Register a custom Flask CLI command for rewriting sessions stored in
+        another serialization format, including legacy pickle data, in the
+        configured one.
+
+        Run the command with `flask session_migrate_format`.
+        """
+
+        @self.app.cli.command("session_migrate_format")
+        @click.option(
+            "--batch-size",
+            default=100,
+            show_default=True,
+            help="Number of sessions read from the storage at once.",
+        )
+        def session_migrate_format(batch_size):
             with self.app.app_context():
-                self._delete_expired_sessions()
+                scanned, migrated, failed = self._migrate_format(batch_size)
+            click.echo(
+                f"Scanned {scanned} sessions, migrated {migrated}, failed {failed}."
+            )
+
+    def _migrate_format(self, batch_size: int = 100) -> Tuple[int, int, int]:
+        """Rewrite the sessions that are not stored in the configured
+        serialization format. A session is only replaced if it was not written
+        in the meantime, and keeps its expiry. Returns the number of sessions
+        scanned, migrated and that could not be deserialized."""
+        scanned = migrated = failed = 0
+        for store_id, serialized_data in self._iter_serialized_sessions(batch_size):
+            scanned += 1
+            try:
+                if self.serializer.format_of(serialized_data) == self.serializer.format:
+                    continue
+                session_data = self.serializer.loads(serialized_data)
+            except Exception:
+                failed += 1
+                continue
+            if self._replace_serialized_session(
+                store_id, serialized_data, self.serializer.dumps(session_data)
+            ):
+                migrated += 1
+        return scanned, migrated, failed
+
+    # BULK OPERATIONS
+
+    def iter_sessions(self, batch_size: int = 100) -> Iterator[Tuple[str, dict]]:
+        """Yield the session id and data of every stored session that has not
+        expired, for example to audit them. Sessions are read from the storage
+        ``batch_size`` at a time and decoded one by one as they are consumed,
+        so memory use does not grow with the number of sessions.
+
+        Raises :exc:`NotImplementedError` if the storage can not list its
+        sessions.
+
+        .. versionadded:: 0.9
+        """
+        for store_id, session_data in self._iter_session_data(batch_size):
+            session_data.pop("_refreshed", None)
+            yield store_id[len(self.key_prefix) :], session_data
+
+    def count_sessions(self, batch_size: int = 1000) -> int:
+        """Return the number of stored sessions that have not expired.
+
+        .. versionadded:: 0.9
+        """
+        return self._count_sessions(batch_size)
+
+    def delete_sessions(
+        self, predicate: Callable[[str, dict], bool], batch_size: int = 100
+    ) -> int:
+        """Delete every stored session for which ``predicate(sid, data)`` is
+        true, for example to log a user out everywhere. Returns the number of
+        sessions deleted.
+
+        .. versionadded:: 0.9
+        """
+        deleted = 0
+        for sid, session_data in self.iter_sessions(batch_size):
+            if predicate(sid, session_data):
+                self._remove_session_data(self._get_store_id(sid))
+                deleted += 1
+        return deleted
+
+    def sessions_for(self, owner: Any) -> List[Tuple[str, dict]]:
+        """Return the session id and data of every stored session whose
+        ``SESSION_OWNER_KEY`` holds ``owner``, for example to list the devices a
+        user is logged in on. Backends that index sessions by owner read only
+        these sessions, the others scan every stored session.
+
+        .. versionadded:: 0.9
+        """
+        if self.owner_key is None:
+            raise ValueError("SESSION_OWNER_KEY must be set to look up sessions")
+        owner = str(owner)
+        sessions = []
+        for store_id, session_data in self._owner_sessions(owner):
+            # The index may lag behind sessions whose owner changed
+            if _owner_of(session_data, self.owner_key) == owner:
+                session_data.pop("_refreshed", None)
+                sessions.append((store_id[len(self.key_prefix) :], session_data))
+        return sessions
+
+    def revoke_all(self, owner: Any) -> int:
+        """Delete every stored session whose ``SESSION_OWNER_KEY`` holds
+        ``owner``, for example to log a user out everywhere. Returns the number
+        of sessions deleted.
+
+        .. versionadded:: 0.9
+        """
+        sessions = self.sessions_for(owner)
+        store_ids = [self._get_store_id(sid) for sid, _ in sessions]
+        if self.local_cache is not None:
+            for store_id in store_ids:
+                self.local_cache.delete(store_id)
+        with measure(self, "delete"):
+            self._delete_owner_sessions(str(owner), store_ids)
+        if self.negative_cache is not None:
+            for store_id in store_ids:
+                self.negative_cache.set(store_id, True)
+        return len(sessions)
+
+    def _run_scheduled_cleanup(self) -> None:
+        """Delete expired sessions from the cleanup scheduler, if this process
+        holds the cleanup lease. The lease outlasts two intervals, so the
+        process holding it renews it before any other can take it over."""
+        owner = f"{socket.gethostname()}:{os.getpid()}"
+        try:
+            with self.app.app_context():
+                if self._acquire_cleanup_lease(
+                    owner, TimeDelta(seconds=2 * self.cleanup_interval)
+                ):
+                    self._delete_expired_sessions()
+        except Exception:
+            self.app.logger.exception("Scheduled session cleanup failed")
+            raise
 
     def _cleanup_n_requests(self) -> None:
         """
         Delete expired sessions on average every N requests.
 
         This is less desirable than using the scheduled app command cleanup as it may
-        slow down some requests but may be useful for rapid development.
+        slow down some requests but may be useful for rapid development. Only one
+        batch is deleted, so that the request is not held up for long.
         """
         if self.cleanup_n_requests and random.randint(0, self.cleanup_n_requests) == 0:
-            self._delete_expired_sessions()
+            with measure(self, "delete_expired"):
+                self._delete_expired_batch(self.cleanup_batch_size)
 
     # SECURITY API METHODS
 
     def regenerate(self, session: ServerSideSession) -> None:
-        """Regenerate the session id for the given session. Can be used by calling ``flask.session_interface.regenerate()``."""
+        """Regenerate the session id for the given session. Can be used by calling ``flask.session_interface.regenerate()``.
+
+        The session is moved from the old session id to the new one when it is
+        saved at the end of the request, in one operation for backends that
+        support it.
+        """
         if session:
-            # Remove the old session from storage
-            self._delete_session(self._get_store_id(session.sid))
+            if self.write_behind is not None:
+                # Do not let a pending write bring the old session back
+                self.write_behind.wait(self._get_store_id(session.sid))
+            # Remember where the session is stored, if regenerated more than
+            # once in a request the first session id is the stored one
+            if session._previous_sid is None:
+                session._previous_sid = session.sid
             # Generate a new session ID
-            new_sid = self._generate_sid(self.sid_length)
-            session.sid = new_sid
-            # Mark the session as modified to ensure it gets saved
+            session.sid = self._generate_sid(self.sid_length)
+            # Mark the session as modified to ensure it gets saved in full, as
+            # nothing is stored under the new session ID yet
             session.modified = True
+            session._stored_fingerprint = None
+            session._stored_serialized = None
+            session._stored_fields = None
 
     # METHODS OVERRIDE FLASK SESSION INTERFACE
 
-    def save_session(
+    def _plan_save_session(
         self, app: Flask, session: ServerSideSession, response: Response
-    ) -> None:
+    ) -> Optional[str]:
+        """Decide how the session has to be saved at the end of the request.
+        Returns ``"remove"``, ``"save"``, ``"touch"`` or ``None`` if the storage
+        is left as it is. Shared by the synchronous and asynchronous interfaces."""
 
-        # Get the domain and path for the cookie from the app
-        domain = self.get_cookie_domain(app)
-        path = self.get_cookie_path(app)
-        name = self.get_cookie_name(app)
-
-        # Generate a prefixed session id
-        store_id = self._get_store_id(session.sid)
+        # A lazily opened session that was never used is left as it is
+        if not session.loaded:
+            return None
 
         # Add a "Vary: Cookie" header if the session was accessed at all.
         # This assumes the app is checking the session values in a request that
@@ -291,20 +1222,52 @@ class ServerSideSessionInterface(FlaskSessionInterface, ABC):
 
         # If the session is empty, do not save it to the database or set a cookie
         if not session:
-            # If the session was deleted (empty and modified), delete the saved session  from the database and tell the client to delete the cookie
-            if session.modified:
-                self._delete_session(store_id)
-                response.delete_cookie(key=name, domain=domain, path=path)
-                response.vary.add("Cookie")
-            return
+            # If the session was deleted (empty and modified), delete the saved session from the database
+            return "remove" if session.modified else None
+
+        # Compare against the stored data before deciding whether to set storage,
+        # as this may find changes to nested values that were not tracked
+        data_changed = self._session_data_changed(session)
+
+        if self.refresh_threshold is not None and session.permanent:
+            if data_changed or self._refresh_due(app, session):
+                # Record when the expiry was extended, to know when it is due again.
+                # Unchanged data is only touched
+                session._refreshed = int(time.time())
+                session.modified = True
+            else:
+                # Neither the data nor the expiry need to be written
+                session.modified = False
 
         if not self.should_set_storage(app, session):
-            return
+            return None
+
+        # Update existing or create new session in the database, or only extend
+        # the expiry if the data did not change
+        return "save" if data_changed else "touch"
+
+    def _update_session_cookie(
+        self,
+        app: Flask,
+        session: ServerSideSession,
+        response: Response,
+        action: Optional[str],
+    ) -> None:
+        """Set or delete the session cookie once the session was saved as
+        decided by :meth:`_plan_save_session`."""
 
-        # Update existing or create new session in the database
-        self._upsert_session(app.permanent_session_lifetime, session, store_id)
+        # Get the domain and path for the cookie from the app
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        name = self.get_cookie_name(app)
 
-        if not self.should_set_cookie(app, session):
+        # Tell the client to delete the cookie of a deleted session
+        if action == "remove":
+            response.delete_cookie(key=name, domain=domain, path=path)
+            response.vary.add("Cookie")
+            return
+
+        if action is None or not self.should_set_cookie(app, session):
             return
 
         # Get the additional required cookie settings
@@ -329,34 +1292,137 @@ class ServerSideSessionInterface(FlaskSessionInterface, ABC):
         )
         response.vary.add("Cookie")
 
-    def open_session(self, app: Flask, request: Request) -> ServerSideSession:
-        # Get the session ID from the cookie
+    def _get_request_sid(self, app: Flask, request: Request) -> Optional[str]:
+        """Get the session ID from the request cookie, or ``None`` if there is no
+        valid one."""
         sid = request.cookies.get(app.config["SESSION_COOKIE_NAME"])
-
-        # If there's no session ID, generate a new one
         if not sid:
-            sid = self._generate_sid(self.sid_length)
-            return self.session_class(sid=sid, permanent=self.permanent)
+            return None
         # If the session ID is signed, unsign it
         if self.use_signer:
             try:
                 sid = self._unsign(app, sid)
             except BadSignature:
-                sid = self._generate_sid(self.sid_length)
-                return self.session_class(sid=sid, permanent=self.permanent)
+                return None
+        return sid
 
-        # Retrieve the session data from the database
-        store_id = self._get_store_id(sid)
-        saved_session_data = self._retrieve_session_data(store_id)
+    def _make_session(
+        self, sid: Optional[str], saved_session_data: Optional[dict]
+    ) -> ServerSideSession:
+        """Create the session for the data loaded from storage, or a new session
+        with a new session ID if there is none."""
 
         # If the saved session exists, load the session data from the document
         if saved_session_data is not None:
-            return self.session_class(saved_session_data, sid=sid)
+            session = self.session_class(saved_session_data, sid=sid)
+            self._take_snapshot(session, saved_session_data)
+            return session
 
         # If the saved session does not exist, create a new session
         sid = self._generate_sid(self.sid_length)
         return self.session_class(sid=sid, permanent=self.permanent)
 
+    def _write_session(
+        self,
+        action: str,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        store_id: str,
+    ) -> None:
+        """Write the session to storage as decided by :meth:`_plan_save_session`."""
+        if session._previous_sid is not None:
+            previous_store_id = self._get_store_id(session._previous_sid)
+            if action == "save":
+                self._rename_session_data(
+                    session_lifetime, session, previous_store_id, store_id
+                )
+            else:
+                # Nothing is stored under the regenerated session id
+                self._remove_session_data(previous_store_id)
+        elif action == "remove":
+            self._remove_session_data(store_id)
+        elif action == "save":
+            self._save_session_data(session_lifetime, session, store_id)
+        elif action == "touch":
+            self._touch_session_data(session_lifetime, session, store_id)
+
+    def _write_session_behind(
+        self,
+        app: Flask,
+        action: str,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        store_id: str,
+    ) -> None:
+        """Hand the write to the background workers, or write synchronously if
+        their queue is full."""
+        # Copy the session, the request may go on to change it
+        snapshot = self.session_class(deepcopy(_stored_data(session)), sid=session.sid)
+        snapshot.modified = session.modified
+        snapshot._stored_fingerprint = session._stored_fingerprint
+        snapshot._stored_serialized = session._stored_serialized
+        snapshot._stored_fields = session._stored_fields
+        snapshot._previous_sid = session._previous_sid
+
+        def write() -> None:
+            with app.app_context():
+                try:
+                    self._write_session(action, session_lifetime, snapshot, store_id)
+                except Exception:
+                    app.logger.exception("Failed to write session in the background")
+                    raise
+
+        if not self.write_behind.submit(store_id, write):
+            # Keep the writes for this session in order
+            self.write_behind.wait(store_id)
+            self._write_session(action, session_lifetime, session, store_id)
+
+    def save_session(
+        self, app: Flask, session: ServerSideSession, response: Response
+    ) -> None:
+        action = self._plan_save_session(app, session, response)
+
+        if action is not None or session._previous_sid is not None:
+            # Generate a prefixed session id
+            store_id = self._get_store_id(session.sid)
+            session_lifetime = app.permanent_session_lifetime
+
+            if self.write_behind is not None:
+                self._write_session_behind(
+                    app, action, session_lifetime, session, store_id
+                )
+            else:
+                self._write_session(action, session_lifetime, session, store_id)
+
+        self._update_session_cookie(app, session, response, action)
+
+    def should_set_cookie(self, app: Flask, session: ServerSideSession) -> bool:
+        """Used by session backends to determine if a ``Set-Cookie`` header
+        should be set for this session cookie for this response.
+
+        If ``SESSION_REFRESH_THRESHOLD`` is set, the cookie of a permanent session
+        is only set when the session was modified or its expiry was extended.
+        """
+        if self.refresh_threshold is not None and session.permanent:
+            return session.modified
+        return super().should_set_cookie(app, session)
+
+    def open_session(self, app: Flask, request: Request) -> ServerSideSession:
+        # Get the session ID from the cookie
+        sid = self._get_request_sid(app, request)
+
+        # If there's no session ID, generate a new one
+        if sid is None:
+            return self._make_session(None, None)
+
+        # Defer retrieving the session data until the session is first used
+        if self.lazy_loading:
+            return self.session_class(sid=sid, loader=self._load_lazy_session)
+
+        # Retrieve the session data from the database
+        saved_session_data = self._load_session_data(self._get_store_id(sid))
+        return self._make_session(sid, saved_session_data)
+
     # METHODS TO BE IMPLEMENTED BY SUBCLASSES
 
     @abstractmethod
@@ -379,7 +1445,390 @@ class ServerSideSessionInterface(FlaskSessionInterface, ABC):
         """Update existing or create new session in the session storage."""
         raise NotImplementedError()
 
+    def _touch_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        """Extend the expiry of a session whose data has not changed. Backends that
+        can update the expiry on its own should override this, by default the whole
+        session is written again."""
+        self._upsert_session(session_lifetime, session, store_id)
+
+    def _update_session_fields(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        store_id: str,
+        changed: List[str],
+        deleted: List[str],
+    ) -> None:
+        """Write only the top-level keys of the session that were changed or
+        deleted, and extend its expiry. Only used by backends that support delta
+        writes, by default the whole session is written again."""
+        self._upsert_session(session_lifetime, session, store_id)
+
+    def _rename_session(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        old_store_id: str,
+        new_store_id: str,
+    ) -> None:
+        """Store the session under ``new_store_id`` and delete it under
+        ``old_store_id``, after its session id was regenerated. Backends that
+        can do both in one atomic operation should override this, by default the
+        session is written under the new id before it is deleted under the old
+        one, so that it is stored at all times."""
+        self._upsert_session(session_lifetime, session, new_store_id)
+        self._delete_session(old_store_id)
+
+    def _retrieve_session_lifetime(self, store_id: str) -> Optional[TimeDelta]:
+        """Get the time left until the saved session expires, or ``None`` if it
+        is not stored or the session storage can not tell. Only used by the
+        tiered interface, to keep the expiry of the sessions it copies from
+        the durable tier."""
+        return None
+
     @retry_query()  # use only when retry not supported directly by the client
-    def _delete_expired_sessions(self) -> None:
-        """Delete expired sessions from the session storage. Only required for non-TTL databases."""
-        pass
+    def _delete_expired_batch(self, batch_size: int) -> int:
+        """Delete at most ``batch_size`` expired sessions from the session
+        storage in one transaction and return how many were deleted. Only
+        required for non-TTL databases."""
+        return 0
+
+    def _acquire_cleanup_lease(self, owner: str, duration: TimeDelta) -> bool:
+        """Take or renew the lease that makes ``owner`` the only process running
+        the scheduled cleanup for ``duration``, and return whether it holds
+        it. Only required for non-TTL databases, by default every process
+        cleans up."""
+        return True
+
+    def _iter_serialized_sessions(self, batch_size: int) -> Iterator[Tuple[str, bytes]]:
+        """Yield the store id and serialized data of every stored session,
+        reading ``batch_size`` sessions from the storage at once. Only required
+        for format migration."""
+        raise NotImplementedError()
+
+    def _replace_serialized_session(
+        self, store_id: str, old_data: bytes, new_data: bytes
+    ) -> bool:
+        """Replace the serialized data of a session, keeping its expiry, if it
+        is still ``old_data``. Returns whether it was replaced. Only required
+        for format migration."""
+        raise NotImplementedError()
+
+    def _iter_session_data(self, batch_size: int) -> Iterator[Tuple[str, dict]]:
+        """Yield the store id and data of every stored session that has not
+        expired, reading ``batch_size`` sessions from the storage at once. By
+        default the sessions yielded by :meth:`_iter_serialized_sessions` are
+        decoded, backends that store sessions in other layouts override this.
+        Sessions that can not be decoded are skipped."""
+        for store_id, serialized_data in self._iter_serialized_sessions(batch_size):
+            try:
+                session_data = self.serializer.loads(serialized_data)
+            except Exception:
+                self.app.logger.warning("Skipped undecodable session %s", store_id)
+                continue
+            yield store_id, session_data
+
+    def _count_sessions(self, batch_size: int) -> int:
+        """Count the stored sessions that have not expired. By default every
+        session is read, backends that can count them in the storage override
+        this."""
+        return sum(1 for _ in self._iter_session_data(batch_size))
+
+    def _delete_owner_sessions(self, owner: str, store_ids: List[str]) -> None:
+        """Delete the stored sessions of ``owner``. Backends that index sessions
+        by owner override this to drop them from the index as well."""
+        for store_id in store_ids:
+            self._delete_session(store_id)
+
+    def _owner_sessions(self, owner: str) -> List[Tuple[str, dict]]:
+        """Return the store id and data of the stored sessions of ``owner``.
+        Backends that index sessions by owner override this, by default every
+        stored session is scanned. Sessions that are no longer owned by
+        ``owner`` may be included, they are filtered out by the caller."""
+        return [
+            (store_id, session_data)
+            for store_id, session_data in self._iter_session_data(100)
+            if _owner_of(session_data, self.owner_key) == owner
+        ]
+
+
+class AsyncServerSideSessionInterface(ServerSideSessionInterface):
+    """Asynchronous counterpart of :class:`ServerSideSessionInterface`, for
+    frameworks that await ``open_session`` and ``save_session``, such as Quart.
+
+    Subclasses implement the storage methods as coroutines, so session I/O runs
+    on the event loop. Deciding what to save, the serializer and the session
+    cookie are shared with the synchronous interface. ``SESSION_LAZY_LOADING``
+    is not supported, as the session data cannot be awaited when it is first
+    used, and neither is ``SESSION_WRITE_BEHIND``, as its background threads
+    cannot await the storage.
+
+    The bulk operations :meth:`iter_sessions`, :meth:`count_sessions`,
+    :meth:`delete_sessions`, :meth:`sessions_for` and :meth:`revoke_all` are
+    synchronous and raise :exc:`NotImplementedError`. Use them through the
+    synchronous interface of the same storage instead.
+
+    .. versionadded:: 0.9
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        if self.lazy_loading:
+            raise ValueError(
+                "SESSION_LAZY_LOADING is not supported by asynchronous session interfaces"
+            )
+        if self.write_behind is not None:
+            raise ValueError(
+                "SESSION_WRITE_BEHIND is not supported by asynchronous session interfaces"
+            )
+
+    def _bulk_operation_not_supported(self, name: str) -> NotImplementedError:
+        return NotImplementedError(
+            f"{name}() is not supported by asynchronous session interfaces, "
+            "use the synchronous interface of the same storage instead"
+        )
+
+    def iter_sessions(self, batch_size: int = 100) -> Iterator[Tuple[str, dict]]:
+        """Not supported, raises :exc:`NotImplementedError`."""
+        raise self._bulk_operation_not_supported("iter_sessions")
+
+    def count_sessions(self, batch_size: int = 1000) -> int:
+        """Not supported, raises :exc:`NotImplementedError`."""
+        raise self._bulk_operation_not_supported("count_sessions")
+
+    def delete_sessions(
+        self, predicate: Callable[[str, dict], bool], batch_size: int = 100
+    ) -> int:
+        """Not supported, raises :exc:`NotImplementedError`."""
+        raise self._bulk_operation_not_supported("delete_sessions")
+
+    def sessions_for(self, owner: Any) -> List[Tuple[str, dict]]:
+        """Not supported, raises :exc:`NotImplementedError`."""
+        raise self._bulk_operation_not_supported("sessions_for")
+
+    def revoke_all(self, owner: Any) -> int:
+        """Not supported, raises :exc:`NotImplementedError`."""
+        raise self._bulk_operation_not_supported("revoke_all")
+
+    async def _load_session_data(self, store_id: str) -> Optional[dict]:
+        """Get the saved session, from the local cache if enabled and fresh,
+        otherwise from the session storage unless it was recently missing."""
+        if self.local_cache is not None:
+            with measure(self, "local_cache") as measured:
+                session_data = self.local_cache.get(store_id)
+                if measured:
+                    measured.outcome = "miss" if session_data is None else "hit"
+            if session_data is not None:
+                return session_data
+
+        if self.negative_cache is not None:
+            with measure(self, "negative_cache") as measured:
+                missing = self.negative_cache.get(store_id)
+                if measured:
+                    measured.outcome = "miss" if missing is None else "hit"
+            if missing:
+                return None
+
+        with measure(self, "retrieve") as measured:
+            session_data = await self._retrieve_session_data(store_id)
+            if measured:
+                measured.outcome = "miss" if session_data is None else "hit"
+
+        if session_data is None:
+            if self.negative_cache is not None:
+                self.negative_cache.set(store_id, True)
+        elif self.local_cache is not None:
+            self.local_cache.set(store_id, session_data)
+        return session_data
+
+    async def _save_session_data(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        """Update existing or create new session in the session storage and
+        keep the local caches in step with it."""
+        if self.local_cache is not None:
+            self.local_cache.delete(store_id)
+        if self.negative_cache is not None:
+            self.negative_cache.delete(store_id)
+
+        if self.delta_writes and session._stored_fields is not None:
+            # Only write the top-level keys that changed
+            changed, deleted = self._diff_session_fields(session)
+            with measure(self, "update_fields"):
+                await self._update_session_fields(
+                    session_lifetime, session, store_id, changed, deleted
+                )
+        else:
+            with measure(self, "upsert"):
+                await self._upsert_session(session_lifetime, session, store_id)
+
+        if self.local_cache is not None:
+            self.local_cache.set(store_id, _stored_data(session))
+
+    async def _touch_session_data(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        """Extend the expiry of a session whose data did not change. When
+        ``SESSION_REFRESH_THRESHOLD`` is set, the time the expiry was extended at
+        is stored with the session data as well, as the only changed field with
+        ``SESSION_DELTA_WRITES`` or else by writing the session again."""
+        if self.refresh_threshold is None or not session.permanent:
+            with measure(self, "touch"):
+                await self._touch_session(session_lifetime, session, store_id)
+            return
+
+        if self.local_cache is not None:
+            self.local_cache.delete(store_id)
+        with measure(self, "touch"):
+            if self.delta_writes and session._stored_fields is not None:
+                await self._update_session_fields(
+                    session_lifetime, session, store_id, ["_refreshed"], []
+                )
+            else:
+                await self._upsert_session(session_lifetime, session, store_id)
+        if self.local_cache is not None:
+            self.local_cache.set(store_id, _stored_data(session))
+
+    async def _remove_session_data(self, store_id: str) -> None:
+        """Delete session from the session storage and the local cache."""
+        if self.local_cache is not None:
+            self.local_cache.delete(store_id)
+        with measure(self, "delete"):
+            await self._delete_session(store_id)
+        if self.negative_cache is not None:
+            self.negative_cache.set(store_id, True)
+
+    async def _rename_session_data(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        previous_store_id: str,
+        store_id: str,
+    ) -> None:
+        """Move the session to its regenerated store id, writing its data, and
+        keep the local caches in step with it."""
+        if self.local_cache is not None:
+            self.local_cache.delete(previous_store_id)
+        if self.negative_cache is not None:
+            self.negative_cache.delete(store_id)
+        with measure(self, "rename"):
+            await self._rename_session(
+                session_lifetime, session, previous_store_id, store_id
+            )
+        if self.local_cache is not None:
+            self.local_cache.set(store_id, _stored_data(session))
+        if self.negative_cache is not None:
+            self.negative_cache.set(previous_store_id, True)
+
+    async def regenerate(self, session: ServerSideSession) -> None:
+        """Regenerate the session id for the given session. Can be used by calling ``await quart.session_interface.regenerate()``.
+
+        The session is moved from the old session id to the new one when it is
+        saved at the end of the request.
+        """
+        if session:
+            # Remember where the session is stored, if regenerated more than
+            # once in a request the first session id is the stored one
+            if session._previous_sid is None:
+                session._previous_sid = session.sid
+            # Generate a new session ID
+            session.sid = self._generate_sid(self.sid_length)
+            # Mark the session as modified to ensure it gets saved in full, as
+            # nothing is stored under the new session ID yet
+            session.modified = True
+            session._stored_fingerprint = None
+            session._stored_serialized = None
+            session._stored_fields = None
+
+    async def save_session(
+        self, app: Flask, session: ServerSideSession, response: Response
+    ) -> None:
+        action = self._plan_save_session(app, session, response)
+
+        # Generate a prefixed session id
+        store_id = self._get_store_id(session.sid)
+        session_lifetime = app.permanent_session_lifetime
+
+        if session._previous_sid is not None:
+            previous_store_id = self._get_store_id(session._previous_sid)
+            if action == "save":
+                await self._rename_session_data(
+                    session_lifetime, session, previous_store_id, store_id
+                )
+            else:
+                # Nothing is stored under the regenerated session id
+                await self._remove_session_data(previous_store_id)
+        elif action == "remove":
+            await self._remove_session_data(store_id)
+        elif action == "save":
+            await self._save_session_data(session_lifetime, session, store_id)
+        elif action == "touch":
+            await self._touch_session_data(session_lifetime, session, store_id)
+
+        self._update_session_cookie(app, session, response, action)
+
+    async def open_session(self, app: Flask, request: Request) -> ServerSideSession:
+        # Get the session ID from the cookie
+        sid = self._get_request_sid(app, request)
+
+        # If there's no session ID, generate a new one
+        if sid is None:
+            return self._make_session(None, None)
+
+        # Retrieve the session data from the database
+        saved_session_data = await self._load_session_data(self._get_store_id(sid))
+        return self._make_session(sid, saved_session_data)
+
+    # METHODS TO BE IMPLEMENTED BY SUBCLASSES
+
+    @abstractmethod
+    async def _retrieve_session_data(self, store_id: str) -> Optional[dict]:
+        """Get the saved session from the session storage."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def _delete_session(self, store_id: str) -> None:
+        """Delete session from the session storage."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def _upsert_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        """Update existing or create new session in the session storage."""
+        raise NotImplementedError()
+
+    async def _touch_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        """Extend the expiry of a session whose data has not changed. Backends that
+        can update the expiry on its own should override this, by default the whole
+        session is written again."""
+        await self._upsert_session(session_lifetime, session, store_id)
+
+    async def _update_session_fields(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        store_id: str,
+        changed: List[str],
+        deleted: List[str],
+    ) -> None:
+        """Write only the top-level keys of the session that were changed or
+        deleted, and extend its expiry. Only used by backends that support delta
+        writes, by default the whole session is written again."""
+        await self._upsert_session(session_lifetime, session, store_id)
+
+    async def _rename_session(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        old_store_id: str,
+        new_store_id: str,
+    ) -> None:
+        """Store the session under ``new_store_id`` and delete it under
+        ``old_store_id``, after its session id was regenerated."""
+        await self._upsert_session(session_lifetime, session, new_store_id)
+        await self._delete_session(old_store_id)
@@ -10,8 +10,49 @@ class Defaults:
     SESSION_ID_LENGTH = 32
     SESSION_SERIALIZATION_FORMAT = "msgpack"
 
+    # In-process session data cache settings
+    SESSION_LOCAL_CACHE_SIZE = 0
+    SESSION_LOCAL_CACHE_TTL = 1.0
+    SESSION_NEGATIVE_CACHE_SIZE = 0
+    SESSION_NEGATIVE_CACHE_TTL = 5.0
+
+    # Detect changes to mutable values nested in the session
+    SESSION_DETECT_NESTED_CHANGES = False
+
+    # Defer loading the session from storage until it is first used
+    SESSION_LAZY_LOADING = False
+
+    # Only write the session keys that changed (Redis, MongoDB and DynamoDB)
+    SESSION_DELTA_WRITES = False
+
+    # Fraction of the lifetime after which the expiry is extended, None to extend on every request
+    SESSION_REFRESH_THRESHOLD = None
+
+    # Write sessions from background threads after the response
+    SESSION_WRITE_BEHIND = False
+    SESSION_WRITE_BEHIND_QUEUE_SIZE = 1000
+    SESSION_WRITE_BEHIND_WORKERS = 2
+
+    # Compression of serialized session data: None, "zlib" or "zstd"
+    SESSION_COMPRESSION = None
+    SESSION_COMPRESSION_THRESHOLD = 1024
+    SESSION_COMPRESSION_DICT = None
+
+    # A msgspec.Struct or TypedDict describing the session data
+    SESSION_SCHEMA = None
+
+    # A flask_session.retry.RetryPolicy for the SQL backends
+    SESSION_RETRY_POLICY = None
+
+    # Session key holding the owner of a session, to find the sessions of an owner
+    SESSION_OWNER_KEY = None
+
     # Clean up settings for non TTL backends (SQL, PostgreSQL, etc.)
     SESSION_CLEANUP_N_REQUESTS = None
+    SESSION_CLEANUP_BATCH_SIZE = 1000
+    SESSION_CLEANUP_BATCH_PAUSE = 0.0
+    SESSION_CLEANUP_TIME_BUDGET = None
+    SESSION_CLEANUP_INTERVAL = None
 
     # Redis settings
     SESSION_REDIS = None
@@ -19,6 +60,9 @@ class Defaults:
     # Memcached settings
     SESSION_MEMCACHED = None
 
+    # Sharding settings (Redis and Memcached)
+    SESSION_SHARD_HINTS = False
+
     # CacheLib settings
     SESSION_CACHELIB = None
 
@@ -48,4 +92,9 @@ class Defaults:
     # PostgreSQL settings
     SESSION_POSTGRESQL = None
     SESSION_POSTGRESQL_TABLE = "flask_sessions"
-    SESSION_POSTGRESQL_SCHEMA = "public"
\ No newline at end of file
+    SESSION_POSTGRESQL_SCHEMA = "public"
+
+    # Tiered settings
+    SESSION_TIERED_FAST_TYPE = None
+    SESSION_TIERED_DURABLE_TYPE = None
+    SESSION_TIERED_WRITE_MODE = "write_through"
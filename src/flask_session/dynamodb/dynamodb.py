@@ -1,18 +1,21 @@
 """Provides a Session Interface to DynamoDB"""
 
 import warnings
+from contextlib import suppress
 from datetime import datetime
 from datetime import timedelta as TimeDelta
 from decimal import Decimal
-from typing import Optional
+from typing import Any, Iterator, List, Optional, Tuple
 
 import boto3
+from boto3.dynamodb.types import TypeSerializer
 from flask import Flask
 from itsdangerous import want_bytes
 from mypy_boto3_dynamodb.service_resource import DynamoDBServiceResource
 
-from ..base import ServerSideSession, ServerSideSessionInterface
+from ..base import ServerSideSession, ServerSideSessionInterface, _stored_data
 from ..defaults import Defaults
+from ..retry import RetryPolicy
 
 
 class DynamoDBSession(ServerSideSession):
@@ -52,8 +55,27 @@ class DynamoDBSessionInterface(ServerSideSessionInterface):
     :param use_signer: Whether to sign the session id cookie or not.
     :param permanent: Whether to use permanent session or not.
     :param sid_length: The length of the generated session id in bytes.
+    :param serialization_format: The serialization format to use for the session data.
     :param table_name: DynamoDB table name to store the session.
     :param table_exists: The table already exists, don't try to create it (default=False).
+    :param local_cache_size: The maximum number of sessions kept in the in-process cache, 0 disables it.
+    :param local_cache_ttl: The number of seconds a session is served from the in-process cache.
+    :param detect_nested_changes: Whether to detect changes to mutable values nested in the session.
+    :param lazy_loading: Whether to defer loading the session from storage until it is first used.
+    :param delta_writes: Whether to store each top-level session key in its own
+        entry of a map attribute and only write the keys that changed.
+    :param refresh_threshold: The fraction of the session lifetime below which its remaining lifetime has to fall before its expiry is extended again.
+    :param write_behind: Whether to write sessions from background threads after the response is sent.
+    :param write_behind_queue_size: The maximum number of pending background writes, further writes are made synchronously.
+    :param write_behind_workers: The number of background threads writing sessions.
+    :param compression: The codec used to compress serialized session data, ``"zlib"``, ``"zstd"`` or ``None``.
+    :param compression_threshold: The size in bytes from which serialized session data is compressed.
+    :param compression_dict: A zstd dictionary trained on typical session data.
+    :param session_schema: A ``msgspec.Struct`` or ``TypedDict`` describing the session data.
+    :param retry_policy: How failed queries are retried, see :class:`~flask_session.retry.RetryPolicy`.
+    :param negative_cache_size: The maximum number of unknown session ids remembered in-process, 0 disables it.
+    :param negative_cache_ttl: The number of seconds an unknown session id is remembered.
+    :param owner_key: The session key holding the owner of a session, to look up the sessions of an owner.
 
     .. versionadded:: 0.9
         The `table_exists` parameter was added.
@@ -78,6 +100,23 @@ class DynamoDBSessionInterface(ServerSideSessionInterface):
         serialization_format: str = Defaults.SESSION_SERIALIZATION_FORMAT,
         table_name: str = Defaults.SESSION_DYNAMODB_TABLE,
         table_exists: Optional[bool] = Defaults.SESSION_DYNAMODB_TABLE_EXISTS,
+        local_cache_size: int = Defaults.SESSION_LOCAL_CACHE_SIZE,
+        local_cache_ttl: float = Defaults.SESSION_LOCAL_CACHE_TTL,
+        detect_nested_changes: bool = Defaults.SESSION_DETECT_NESTED_CHANGES,
+        lazy_loading: bool = Defaults.SESSION_LAZY_LOADING,
+        delta_writes: bool = Defaults.SESSION_DELTA_WRITES,
+        refresh_threshold: Optional[float] = Defaults.SESSION_REFRESH_THRESHOLD,
+        write_behind: bool = Defaults.SESSION_WRITE_BEHIND,
+        write_behind_queue_size: int = Defaults.SESSION_WRITE_BEHIND_QUEUE_SIZE,
+        write_behind_workers: int = Defaults.SESSION_WRITE_BEHIND_WORKERS,
+        compression: Optional[str] = Defaults.SESSION_COMPRESSION,
+        compression_threshold: int = Defaults.SESSION_COMPRESSION_THRESHOLD,
+        compression_dict: Optional[bytes] = Defaults.SESSION_COMPRESSION_DICT,
+        session_schema: Optional[type] = Defaults.SESSION_SCHEMA,
+        retry_policy: Optional[RetryPolicy] = Defaults.SESSION_RETRY_POLICY,
+        negative_cache_size: int = Defaults.SESSION_NEGATIVE_CACHE_SIZE,
+        negative_cache_ttl: float = Defaults.SESSION_NEGATIVE_CACHE_TTL,
+        owner_key: Optional[str] = Defaults.SESSION_OWNER_KEY,
     ):
 
         # NOTE: The name client is a bit misleading as we're using the resource API of boto3 as opposed to the service API
@@ -98,18 +137,35 @@ class DynamoDBSessionInterface(ServerSideSessionInterface):
 
         self.client = client
         self.table_name = table_name
+        self.delta_writes = delta_writes
 
         if not table_exists:
             self._create_table()
 
         self.store = client.Table(table_name)
         super().__init__(
-            app,
-            key_prefix,
-            use_signer,
-            permanent,
-            sid_length,
-            serialization_format,
+            app=app,
+            key_prefix=key_prefix,
+            use_signer=use_signer,
+            permanent=permanent,
+            sid_length=sid_length,
+            serialization_format=serialization_format,
+            local_cache_size=local_cache_size,
+            local_cache_ttl=local_cache_ttl,
+            detect_nested_changes=detect_nested_changes,
+            lazy_loading=lazy_loading,
+            refresh_threshold=refresh_threshold,
+            write_behind=write_behind,
+            write_behind_queue_size=write_behind_queue_size,
+            write_behind_workers=write_behind_workers,
+            compression=compression,
+            compression_threshold=compression_threshold,
+            compression_dict=compression_dict,
+            session_schema=session_schema,
+            retry_policy=retry_policy,
+            negative_cache_size=negative_cache_size,
+            negative_cache_ttl=negative_cache_ttl,
+            owner_key=owner_key,
         )
 
     def _create_table(self):
@@ -144,13 +200,33 @@ class DynamoDBSessionInterface(ServerSideSessionInterface):
     def _retrieve_session_data(self, store_id: str) -> Optional[dict]:
         # Get the saved session (document) from the database
         document = self.store.get_item(Key={"id": store_id}).get("Item")
+        if not document:
+            return None
         session_is_not_expired = Decimal(datetime.utcnow().timestamp()) <= document.get(
             "expiration"
         )
-        if document and session_is_not_expired:
-            serialized_session_data = want_bytes(document.get("val").value)
-            return self.serializer.loads(serialized_session_data)
-        return None
+        if not session_is_not_expired:
+            return None
+        return self._load_item(document)
+
+    def _retrieve_session_lifetime(self, store_id: str) -> Optional[TimeDelta]:
+        document = self.store.get_item(
+            Key={"id": store_id}, ProjectionExpression="expiration"
+        ).get("Item")
+        if not document or document.get("expiration") is None:
+            return None
+        lifetime = float(document["expiration"]) - datetime.utcnow().timestamp()
+        return TimeDelta(seconds=lifetime) if lifetime > 0 else None
+
+    def _load_item(self, document: dict) -> dict:
+        """Deserialize the session data of a stored item."""
+        if "fields" in document:
+            return {
+                key: self.serializer.loads_value(want_bytes(value.value))
+                for key, value in document["fields"].items()
+            }
+        serialized_session_data = want_bytes(document.get("val").value)
+        return self.serializer.loads(serialized_session_data)
 
     def _delete_session(self, store_id: str) -> None:
         self.store.delete_item(Key={"id": store_id})
@@ -159,16 +235,214 @@ class DynamoDBSessionInterface(ServerSideSessionInterface):
         self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
     ) -> None:
         storage_expiration_datetime = datetime.utcnow() + session_lifetime
+
+        if self.delta_writes:
+            # Store each top-level key in its own map entry, so it can be updated alone
+            fields = {
+                key: self.serializer.dumps_value(value)
+                for key, value in _stored_data(session).items()
+            }
+            self.store.update_item(
+                Key={
+                    "id": store_id,
+                },
+                UpdateExpression="SET #fields = :fields, expiration = :exp REMOVE val",
+                ExpressionAttributeNames={"#fields": "fields"},
+                ExpressionAttributeValues={
+                    ":fields": fields,
+                    ":exp": Decimal(storage_expiration_datetime.timestamp()),
+                },
+            )
+            return
+
         # Serialize the session data
-        serialized_session_data = self.serializer.dumps(dict(session))
+        serialized_session_data = self.serializer.dumps(_stored_data(session))
 
         self.store.update_item(
             Key={
                 "id": store_id,
             },
-            UpdateExpression="SET val = :value, expiration = :exp",
+            UpdateExpression="SET val = :value, expiration = :exp REMOVE #fields",
+            ExpressionAttributeNames={"#fields": "fields"},
             ExpressionAttributeValues={
                 ":value": serialized_session_data,
                 ":exp": Decimal(storage_expiration_datetime.timestamp()),
             },
         )
+
+    def _touch_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        now = datetime.utcnow()
+        storage_expiration_datetime = now + session_lifetime
+
+        # Only extend the expiry, the session data is unchanged. An expired or
+        # deleted session is not brought back
+        with suppress(
+            self.client.meta.client.exceptions.ConditionalCheckFailedException
+        ):
+            self.store.update_item(
+                Key={
+                    "id": store_id,
+                },
+                UpdateExpression="SET expiration = :exp",
+                ConditionExpression="attribute_exists(id) AND expiration >= :now",
+                ExpressionAttributeValues={
+                    ":exp": Decimal(storage_expiration_datetime.timestamp()),
+                    ":now": Decimal(now.timestamp()),
+                },
+            )
+
+    def _rename_session(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        old_store_id: str,
+        new_store_id: str,
+    ) -> None:
+        storage_expiration_datetime = datetime.utcnow() + session_lifetime
+
+        item = {
+            "id": new_store_id,
+            "expiration": Decimal(storage_expiration_datetime.timestamp()),
+        }
+        if self.delta_writes:
+            item["fields"] = {
+                key: self.serializer.dumps_value(value)
+                for key, value in _stored_data(session).items()
+            }
+        else:
+            item["val"] = self.serializer.dumps(_stored_data(session))
+
+        # Write the new item and delete the old one in one transaction
+        serializer = TypeSerializer()
+        self.client.meta.client.transact_write_items(
+            TransactItems=[
+                {
+                    "Delete": {
+                        "TableName": self.store.name,
+                        "Key": {"id": serializer.serialize(old_store_id)},
+                    }
+                },
+                {
+                    "Put": {
+                        "TableName": self.store.name,
+                        "Item": {
+                            key: serializer.serialize(value)
+                            for key, value in item.items()
+                        },
+                    }
+                },
+            ]
+        )
+
+    def _update_session_fields(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        store_id: str,
+        changed: List[str],
+        deleted: List[str],
+    ) -> None:
+        storage_expiration_datetime = datetime.utcnow() + session_lifetime
+        # "fields" is a reserved word, it has to be referred to by a placeholder
+        names = {"#fields": "fields"}
+        values = {":exp": Decimal(storage_expiration_datetime.timestamp())}
+        set_actions = ["expiration = :exp"]
+        remove_actions = []
+        session_data = _stored_data(session)
+        for i, key in enumerate(changed):
+            names[f"#f{i}"] = key
+            values[f":f{i}"] = self.serializer.dumps_value(session_data[key])
+            set_actions.append(f"#fields.#f{i} = :f{i}")
+        for i, key in enumerate(deleted, start=len(changed)):
+            names[f"#f{i}"] = key
+            remove_actions.append(f"#fields.#f{i}")
+
+        update_expression = "SET " + ", ".join(set_actions)
+        if remove_actions:
+            update_expression += " REMOVE " + ", ".join(remove_actions)
+
+        try:
+            # Only update items that already store their fields separately
+            self.store.update_item(
+                Key={
+                    "id": store_id,
+                },
+                UpdateExpression=update_expression,
+                ConditionExpression="attribute_exists(#fields)",
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+            )
+        except self.client.meta.client.exceptions.ConditionalCheckFailedException:
+            # The session is missing or stored as a single value
+            self._upsert_session(session_lifetime, session, store_id)
+
+    def _iter_serialized_sessions(self, batch_size: int) -> Iterator[Tuple[str, bytes]]:
+        # Sessions stored field by field by delta writes hold values serialized
+        # on their own, and are left out
+        scan_kwargs = {
+            "FilterExpression": "begins_with(id, :prefix) AND attribute_exists(val)",
+            "ExpressionAttributeValues": {":prefix": self.key_prefix},
+            "ProjectionExpression": "id, val",
+            "Limit": batch_size,
+        }
+        while True:
+            response = self.store.scan(**scan_kwargs)
+            for item in response.get("Items", []):
+                yield item["id"], want_bytes(item["val"].value)
+            if "LastEvaluatedKey" not in response:
+                break
+            scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def _iter_session_data(self, batch_size: int) -> Iterator[Tuple[str, dict]]:
+        for page in self._scan_unexpired_sessions(Limit=batch_size):
+            for item in page.get("Items", []):
+                try:
+                    session_data = self._load_item(item)
+                except Exception:
+                    self.app.logger.warning(
+                        "Skipped undecodable session %s", item["id"]
+                    )
+                    continue
+                yield item["id"], session_data
+
+    def _count_sessions(self, batch_size: int) -> int:
+        return sum(
+            page["Count"] for page in self._scan_unexpired_sessions(Select="COUNT")
+        )
+
+    def _scan_unexpired_sessions(self, **kwargs: Any) -> Iterator[dict]:
+        # Yield the pages of a scan of the sessions that have not expired, the
+        # TTL only removes items some time after they expire
+        scan_kwargs = {
+            "FilterExpression": "begins_with(id, :prefix) AND expiration > :now",
+            "ExpressionAttributeValues": {
+                ":prefix": self.key_prefix,
+                ":now": Decimal(datetime.utcnow().timestamp()),
+            },
+            **kwargs,
+        }
+        while True:
+            response = self.store.scan(**scan_kwargs)
+            yield response
+            if "LastEvaluatedKey" not in response:
+                break
+            scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def _replace_serialized_session(
+        self, store_id: str, old_data: bytes, new_data: bytes
+    ) -> bool:
+        try:
+            self.store.update_item(
+                Key={
+                    "id": store_id,
+                },
+                UpdateExpression="SET val = :value",
+                ConditionExpression="val = :old",
+                ExpressionAttributeValues={":value": new_data, ":old": old_data},
+            )
+        except self.client.meta.client.exceptions.ConditionalCheckFailedException:
+            # The session was written or deleted since it was read
+            return False
+        return True
@@ -6,8 +6,9 @@ from cachelib.file import FileSystemCache
 from flask import Flask
 
 from .._utils import total_seconds
-from ..base import ServerSideSession, ServerSideSessionInterface
+from ..base import ServerSideSession, ServerSideSessionInterface, _stored_data
 from ..defaults import Defaults
+from ..retry import RetryPolicy
 
 
 class FileSystemSession(ServerSideSession):
@@ -25,6 +26,22 @@ class FileSystemSessionInterface(ServerSideSessionInterface):
     :param cache_dir: the directory where session files are stored.
     :param threshold: the maximum number of items the session stores before it
     :param mode: the file mode wanted for the session files, default 0600
+    :param local_cache_size: The maximum number of sessions kept in the in-process cache, 0 disables it.
+    :param local_cache_ttl: The number of seconds a session is served from the in-process cache.
+    :param detect_nested_changes: Whether to detect changes to mutable values nested in the session.
+    :param lazy_loading: Whether to defer loading the session from storage until it is first used.
+    :param refresh_threshold: The fraction of the session lifetime below which its remaining lifetime has to fall before its expiry is extended again.
+    :param write_behind: Whether to write sessions from background threads after the response is sent.
+    :param write_behind_queue_size: The maximum number of pending background writes, further writes are made synchronously.
+    :param write_behind_workers: The number of background threads writing sessions.
+    :param compression: The codec used to compress serialized session data, ``"zlib"``, ``"zstd"`` or ``None``.
+    :param compression_threshold: The size in bytes from which serialized session data is compressed.
+    :param compression_dict: A zstd dictionary trained on typical session data.
+    :param session_schema: A ``msgspec.Struct`` or ``TypedDict`` describing the session data.
+    :param retry_policy: How failed queries are retried, see :class:`~flask_session.retry.RetryPolicy`.
+    :param negative_cache_size: The maximum number of unknown session ids remembered in-process, 0 disables it.
+    :param negative_cache_ttl: The number of seconds an unknown session id is remembered.
+    :param owner_key: The session key holding the owner of a session, to look up the sessions of an owner.
 
     .. versionadded:: 0.7
         The `serialization_format` and `app` parameters were added.
@@ -50,6 +67,22 @@ class FileSystemSessionInterface(ServerSideSessionInterface):
         cache_dir: str = Defaults.SESSION_FILE_DIR,
         threshold: int = Defaults.SESSION_FILE_THRESHOLD,
         mode: int = Defaults.SESSION_FILE_MODE,
+        local_cache_size: int = Defaults.SESSION_LOCAL_CACHE_SIZE,
+        local_cache_ttl: float = Defaults.SESSION_LOCAL_CACHE_TTL,
+        detect_nested_changes: bool = Defaults.SESSION_DETECT_NESTED_CHANGES,
+        lazy_loading: bool = Defaults.SESSION_LAZY_LOADING,
+        refresh_threshold: Optional[float] = Defaults.SESSION_REFRESH_THRESHOLD,
+        write_behind: bool = Defaults.SESSION_WRITE_BEHIND,
+        write_behind_queue_size: int = Defaults.SESSION_WRITE_BEHIND_QUEUE_SIZE,
+        write_behind_workers: int = Defaults.SESSION_WRITE_BEHIND_WORKERS,
+        compression: Optional[str] = Defaults.SESSION_COMPRESSION,
+        compression_threshold: int = Defaults.SESSION_COMPRESSION_THRESHOLD,
+        compression_dict: Optional[bytes] = Defaults.SESSION_COMPRESSION_DICT,
+        session_schema: Optional[type] = Defaults.SESSION_SCHEMA,
+        retry_policy: Optional[RetryPolicy] = Defaults.SESSION_RETRY_POLICY,
+        negative_cache_size: int = Defaults.SESSION_NEGATIVE_CACHE_SIZE,
+        negative_cache_ttl: float = Defaults.SESSION_NEGATIVE_CACHE_TTL,
+        owner_key: Optional[str] = Defaults.SESSION_OWNER_KEY,
     ):
 
         # Deprecation warnings
@@ -83,7 +116,28 @@ class FileSystemSessionInterface(ServerSideSessionInterface):
         )
 
         super().__init__(
-            app, key_prefix, use_signer, permanent, sid_length, serialization_format
+            app=app,
+            key_prefix=key_prefix,
+            use_signer=use_signer,
+            permanent=permanent,
+            sid_length=sid_length,
+            serialization_format=serialization_format,
+            local_cache_size=local_cache_size,
+            local_cache_ttl=local_cache_ttl,
+            detect_nested_changes=detect_nested_changes,
+            lazy_loading=lazy_loading,
+            refresh_threshold=refresh_threshold,
+            write_behind=write_behind,
+            write_behind_queue_size=write_behind_queue_size,
+            write_behind_workers=write_behind_workers,
+            compression=compression,
+            compression_threshold=compression_threshold,
+            compression_dict=compression_dict,
+            session_schema=session_schema,
+            retry_policy=retry_policy,
+            negative_cache_size=negative_cache_size,
+            negative_cache_ttl=negative_cache_ttl,
+            owner_key=owner_key,
         )
 
     def _retrieve_session_data(self, store_id: str) -> Optional[dict]:
@@ -99,7 +153,7 @@ class FileSystemSessionInterface(ServerSideSessionInterface):
         storage_time_to_live = total_seconds(session_lifetime)
 
         # Serialize the session data (or just cast into dictionary in this case)
-        session_data = dict(session)
+        session_data = _stored_data(session)
 
         # Update existing or create new session in the database
         self.cache.set(
@@ -1,13 +1,15 @@
 import time
 import warnings
 from datetime import timedelta as TimeDelta
-from typing import Any, Optional, Protocol
+from typing import Any, Optional, Protocol, Sequence, Union
 
 from flask import Flask
 
+from .._sharding import ShardedClientsMixin
 from .._utils import total_seconds
-from ..base import ServerSideSession, ServerSideSessionInterface
+from ..base import ServerSideSession, ServerSideSessionInterface, _stored_data
 from ..defaults import Defaults
+from ..retry import RetryPolicy
 
 
 class MemcacheClientProtocol(Protocol):
@@ -20,15 +22,34 @@ class MemcachedSession(ServerSideSession):
     pass
 
 
-class MemcachedSessionInterface(ServerSideSessionInterface):
+class MemcachedSessionInterface(ShardedClientsMixin, ServerSideSessionInterface):
     """A Session interface that uses memcached as session storage. (`pylibmc`, `libmc`, `python-memcached` or `pymemcache` required)
 
-    :param client: A ``memcache.Client`` instance.
+    :param client: A ``memcache.Client`` instance, or a list of them to spread
+        sessions over several clients.
     :param key_prefix: A prefix that is added to all storage keys.
     :param use_signer: Whether to sign the session id cookie or not.
     :param permanent: Whether to use permanent session or not.
     :param sid_length: The length of the generated session id in bytes.
     :param serialization_format: The serialization format to use for the session data.
+    :param local_cache_size: The maximum number of sessions kept in the in-process cache, 0 disables it.
+    :param local_cache_ttl: The number of seconds a session is served from the in-process cache.
+    :param detect_nested_changes: Whether to detect changes to mutable values nested in the session.
+    :param lazy_loading: Whether to defer loading the session from storage until it is first used.
+    :param refresh_threshold: The fraction of the session lifetime below which its remaining lifetime has to fall before its expiry is extended again.
+    :param write_behind: Whether to write sessions from background threads after the response is sent.
+    :param write_behind_queue_size: The maximum number of pending background writes, further writes are made synchronously.
+    :param write_behind_workers: The number of background threads writing sessions.
+    :param compression: The codec used to compress serialized session data, ``"zlib"``, ``"zstd"`` or ``None``.
+    :param compression_threshold: The size in bytes from which serialized session data is compressed.
+    :param compression_dict: A zstd dictionary trained on typical session data.
+    :param session_schema: A ``msgspec.Struct`` or ``TypedDict`` describing the session data.
+    :param retry_policy: How failed queries are retried, see :class:`~flask_session.retry.RetryPolicy`.
+    :param shard_hints: Whether to start new session ids with the index of the
+        client they are stored on, so that adding clients does not move them.
+    :param negative_cache_size: The maximum number of unknown session ids remembered in-process, 0 disables it.
+    :param negative_cache_ttl: The number of seconds an unknown session id is remembered.
+    :param owner_key: The session key holding the owner of a session, to look up the sessions of an owner.
 
     .. versionadded:: 0.7
         The `serialization_format` and `app` parameters were added.
@@ -47,25 +68,67 @@ class MemcachedSessionInterface(ServerSideSessionInterface):
     def __init__(
         self,
         app: Flask,
-        client: Optional[MemcacheClientProtocol] = Defaults.SESSION_MEMCACHED,
+        client: Union[
+            MemcacheClientProtocol, Sequence[MemcacheClientProtocol], None
+        ] = Defaults.SESSION_MEMCACHED,
         key_prefix: str = Defaults.SESSION_KEY_PREFIX,
         use_signer: bool = Defaults.SESSION_USE_SIGNER,
         permanent: bool = Defaults.SESSION_PERMANENT,
         sid_length: int = Defaults.SESSION_ID_LENGTH,
         serialization_format: str = Defaults.SESSION_SERIALIZATION_FORMAT,
+        local_cache_size: int = Defaults.SESSION_LOCAL_CACHE_SIZE,
+        local_cache_ttl: float = Defaults.SESSION_LOCAL_CACHE_TTL,
+        detect_nested_changes: bool = Defaults.SESSION_DETECT_NESTED_CHANGES,
+        lazy_loading: bool = Defaults.SESSION_LAZY_LOADING,
+        refresh_threshold: Optional[float] = Defaults.SESSION_REFRESH_THRESHOLD,
+        write_behind: bool = Defaults.SESSION_WRITE_BEHIND,
+        write_behind_queue_size: int = Defaults.SESSION_WRITE_BEHIND_QUEUE_SIZE,
+        write_behind_workers: int = Defaults.SESSION_WRITE_BEHIND_WORKERS,
+        compression: Optional[str] = Defaults.SESSION_COMPRESSION,
+        compression_threshold: int = Defaults.SESSION_COMPRESSION_THRESHOLD,
+        compression_dict: Optional[bytes] = Defaults.SESSION_COMPRESSION_DICT,
+        session_schema: Optional[type] = Defaults.SESSION_SCHEMA,
+        retry_policy: Optional[RetryPolicy] = Defaults.SESSION_RETRY_POLICY,
+        shard_hints: bool = Defaults.SESSION_SHARD_HINTS,
+        negative_cache_size: int = Defaults.SESSION_NEGATIVE_CACHE_SIZE,
+        negative_cache_ttl: float = Defaults.SESSION_NEGATIVE_CACHE_TTL,
+        owner_key: Optional[str] = Defaults.SESSION_OWNER_KEY,
     ):
-        if client is None or not all(
-            hasattr(client, method) for method in ["get", "set", "delete"]
+        clients = client if isinstance(client, (list, tuple)) else [client]
+        if not clients or not all(
+            hasattr(c, method) for c in clients for method in ["get", "set", "delete"]
         ):
             warnings.warn(
                 "No valid memcache.Client instance provided, attempting to create a new instance on localhost with default settings.",
                 RuntimeWarning,
                 stacklevel=1,
             )
-            client = self._get_preferred_memcache_client()
+            clients = [self._get_preferred_memcache_client()]
+        client = self._init_shards(clients, shard_hints)
         self.client = client
         super().__init__(
-            app, key_prefix, use_signer, permanent, sid_length, serialization_format
+            app=app,
+            key_prefix=key_prefix,
+            use_signer=use_signer,
+            permanent=permanent,
+            sid_length=sid_length,
+            serialization_format=serialization_format,
+            local_cache_size=local_cache_size,
+            local_cache_ttl=local_cache_ttl,
+            detect_nested_changes=detect_nested_changes,
+            lazy_loading=lazy_loading,
+            refresh_threshold=refresh_threshold,
+            write_behind=write_behind,
+            write_behind_queue_size=write_behind_queue_size,
+            write_behind_workers=write_behind_workers,
+            compression=compression,
+            compression_threshold=compression_threshold,
+            compression_dict=compression_dict,
+            session_schema=session_schema,
+            retry_policy=retry_policy,
+            negative_cache_size=negative_cache_size,
+            negative_cache_ttl=negative_cache_ttl,
+            owner_key=owner_key,
         )
 
     def _get_preferred_memcache_client(self):
@@ -98,13 +161,13 @@ class MemcachedSessionInterface(ServerSideSessionInterface):
 
     def _retrieve_session_data(self, store_id: str) -> Optional[dict]:
         # Get the saved session (item) from the database
-        serialized_session_data = self.client.get(store_id)
+        serialized_session_data = self._client_for(store_id).get(store_id)
         if serialized_session_data:
             return self.serializer.loads(serialized_session_data)
         return None
 
     def _delete_session(self, store_id: str) -> None:
-        self.client.delete(store_id)
+        self._client_for(store_id).delete(store_id)
 
     def _upsert_session(
         self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
@@ -112,11 +175,25 @@ class MemcachedSessionInterface(ServerSideSessionInterface):
         storage_time_to_live = total_seconds(session_lifetime)
 
         # Serialize the session data
-        serialized_session_data = self.serializer.dumps(dict(session))
+        serialized_session_data = self.serializer.dumps(_stored_data(session))
 
         # Update existing or create new session in the database
-        self.client.set(
+        self._client_for(store_id).set(
             store_id,
             serialized_session_data,
             self._get_memcache_timeout(storage_time_to_live),
         )
+
+    def _touch_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        client = self._client_for(store_id)
+        if not hasattr(client, "touch"):
+            super()._touch_session(session_lifetime, session, store_id)
+            return
+
+        timeout = self._get_memcache_timeout(total_seconds(session_lifetime))
+
+        # Only extend the expiry, the session data is unchanged. An expired or
+        # deleted session is not brought back
+        client.touch(store_id, timeout)
@@ -0,0 +1,3 @@
+"""Adapters recording the :data:`~flask_session.signals.session_operation`
+signal with metrics libraries. Each one is imported from its own module, as it
+requires its library to be installed."""
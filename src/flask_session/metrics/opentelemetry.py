@@ -0,0 +1,79 @@
+from typing import Any, Optional
+
+from opentelemetry import metrics
+from opentelemetry.metrics import MeterProvider
+
+from ..signals import session_operation
+
+
+class OpenTelemetryMetrics:
+    """Records session storage operations with the OpenTelemetry metrics API.
+    (`opentelemetry-api` required)
+
+    :param meter_provider: The meter provider to get the meter from, the global
+        one by default.
+
+    Call :meth:`connect` to start recording::
+
+        OpenTelemetryMetrics().connect()
+
+    The following instruments record the ``backend``, ``operation`` and
+    ``outcome`` of the operations as attributes:
+
+    - ``flask_session.operation.duration``: A histogram of the time operations
+      took, in seconds.
+    - ``flask_session.payload.size``: A histogram of the size of the session
+      data read or written, in bytes.
+    - ``flask_session.retries``: A counter of the retries of operations.
+
+    .. versionadded:: 0.9
+    """
+
+    def __init__(self, meter_provider: Optional[MeterProvider] = None) -> None:
+        meter = metrics.get_meter("flask_session", meter_provider=meter_provider)
+        self.duration = meter.create_histogram(
+            "flask_session.operation.duration",
+            unit="s",
+            description="Time spent on session storage operations.",
+        )
+        self.size = meter.create_histogram(
+            "flask_session.payload.size",
+            unit="By",
+            description="Size of the serialized session data read or written.",
+        )
+        self.retries = meter.create_counter(
+            "flask_session.retries",
+            description="Retries of session storage operations.",
+        )
+
+    def connect(self, sender: Any = None) -> None:
+        """Start recording the operations of ``sender``, a session interface,
+        or of all session interfaces if it is ``None``."""
+        if sender is None:
+            session_operation.connect(self.record, weak=False)
+        else:
+            session_operation.connect(self.record, sender=sender, weak=False)
+
+    def disconnect(self) -> None:
+        """Stop recording operations."""
+        session_operation.disconnect(self.record)
+
+    def record(
+        self,
+        sender: Any,
+        *,
+        operation: str,
+        backend: str,
+        duration: float,
+        size: int,
+        outcome: str,
+        attempts: int,
+        **kwargs: Any,
+    ) -> None:
+        """Record an operation, receiver of the signal."""
+        attributes = {"backend": backend, "operation": operation, "outcome": outcome}
+        self.duration.record(duration, attributes)
+        if size:
+            self.size.record(size, attributes)
+        if attempts > 1:
+            self.retries.add(attempts - 1, attributes)
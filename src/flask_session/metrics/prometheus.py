@@ -0,0 +1,90 @@
+from typing import Any, Optional
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram
+
+from ..signals import session_operation
+
+# Serialized session sizes, from a few keys up to the largest sessions
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class PrometheusMetrics:
+    """Records session storage operations with `prometheus_client`.
+    (`prometheus-client` required)
+
+    :param registry: The registry to register the metrics with.
+    :param prefix: The prefix of the metric names.
+
+    Call :meth:`connect` to start recording::
+
+        PrometheusMetrics().connect()
+
+    The following metrics are labelled with the ``backend``, ``operation`` and
+    ``outcome`` of the operations:
+
+    - ``flask_session_operation_duration_seconds``: A histogram of the time
+      operations took.
+    - ``flask_session_payload_bytes``: A histogram of the size of the session
+      data read or written.
+    - ``flask_session_retries_total``: A counter of the retries of operations.
+
+    .. versionadded:: 0.9
+    """
+
+    def __init__(
+        self,
+        registry: Optional[CollectorRegistry] = REGISTRY,
+        prefix: str = "flask_session",
+    ) -> None:
+        labels = ["backend", "operation", "outcome"]
+        self.duration = Histogram(
+            f"{prefix}_operation_duration_seconds",
+            "Time spent on session storage operations.",
+            labels,
+            registry=registry,
+        )
+        self.size = Histogram(
+            f"{prefix}_payload_bytes",
+            "Size of the serialized session data read or written.",
+            labels,
+            buckets=SIZE_BUCKETS,
+            registry=registry,
+        )
+        self.retries = Counter(
+            f"{prefix}_retries",
+            "Retries of session storage operations.",
+            labels,
+            registry=registry,
+        )
+
+    def connect(self, sender: Any = None) -> None:
+        """Start recording the operations of ``sender``, a session interface,
+        or of all session interfaces if it is ``None``."""
+        if sender is None:
+            session_operation.connect(self.record, weak=False)
+        else:
+            session_operation.connect(self.record, sender=sender, weak=False)
+
+    def disconnect(self) -> None:
+        """Stop recording operations."""
+        session_operation.disconnect(self.record)
+
+    def record(
+        self,
+        sender: Any,
+        *,
+        operation: str,
+        backend: str,
+        duration: float,
+        size: int,
+        outcome: str,
+        attempts: int,
+        **kwargs: Any,
+    ) -> None:
+        """Record an operation, receiver of the signal."""
+        labels = (backend, operation, outcome)
+        self.duration.labels(*labels).observe(duration)
+        if size:
+            self.size.labels(*labels).observe(size)
+        if attempts > 1:
+            self.retries.labels(*labels).inc(attempts - 1)
@@ -1 +1,5 @@
-from .mongodb import MongoDBSession, MongoDBSessionInterface  # noqa: F401
+from .mongodb import (  # noqa: F401
+    AsyncMongoDBSessionInterface,
+    MongoDBSession,
+    MongoDBSessionInterface,
+)
@@ -1,14 +1,27 @@
+import re
 import warnings
 from datetime import datetime
 from datetime import timedelta as TimeDelta
-from typing import Optional
+from typing import Any, Iterator, List, Optional, Tuple
 
 from flask import Flask
 from itsdangerous import want_bytes
 from pymongo import MongoClient, version
 
-from ..base import ServerSideSession, ServerSideSessionInterface
+try:
+    from pymongo import AsyncMongoClient
+except ImportError:  # pymongo < 4.9
+    AsyncMongoClient = None
+
+from ..base import (
+    AsyncServerSideSessionInterface,
+    ServerSideSession,
+    ServerSideSessionInterface,
+    _owner_of,
+    _stored_data,
+)
 from ..defaults import Defaults
+from ..retry import RetryPolicy
 
 
 class MongoDBSession(ServerSideSession):
@@ -26,6 +39,24 @@ class MongoDBSessionInterface(ServerSideSessionInterface):
     :param serialization_format: The serialization format to use for the session data.
     :param db: The database to use.
     :param collection: The collection to use.
+    :param local_cache_size: The maximum number of sessions kept in the in-process cache, 0 disables it.
+    :param local_cache_ttl: The number of seconds a session is served from the in-process cache.
+    :param detect_nested_changes: Whether to detect changes to mutable values nested in the session.
+    :param lazy_loading: Whether to defer loading the session from storage until it is first used.
+    :param delta_writes: Whether to store each top-level session key in its own
+        field of the document and only write the keys that changed.
+    :param refresh_threshold: The fraction of the session lifetime below which its remaining lifetime has to fall before its expiry is extended again.
+    :param write_behind: Whether to write sessions from background threads after the response is sent.
+    :param write_behind_queue_size: The maximum number of pending background writes, further writes are made synchronously.
+    :param write_behind_workers: The number of background threads writing sessions.
+    :param compression: The codec used to compress serialized session data, ``"zlib"``, ``"zstd"`` or ``None``.
+    :param compression_threshold: The size in bytes from which serialized session data is compressed.
+    :param compression_dict: A zstd dictionary trained on typical session data.
+    :param session_schema: A ``msgspec.Struct`` or ``TypedDict`` describing the session data.
+    :param retry_policy: How failed queries are retried, see :class:`~flask_session.retry.RetryPolicy`.
+    :param negative_cache_size: The maximum number of unknown session ids remembered in-process, 0 disables it.
+    :param negative_cache_ttl: The number of seconds an unknown session id is remembered.
+    :param owner_key: The session key holding the owner of a session, to look up the sessions of an owner.
 
     .. versionadded:: 0.7
         The `serialization_format` and `app` parameters were added.
@@ -51,6 +82,23 @@ class MongoDBSessionInterface(ServerSideSessionInterface):
         serialization_format: str = Defaults.SESSION_SERIALIZATION_FORMAT,
         db: str = Defaults.SESSION_MONGODB_DB,
         collection: str = Defaults.SESSION_MONGODB_COLLECT,
+        local_cache_size: int = Defaults.SESSION_LOCAL_CACHE_SIZE,
+        local_cache_ttl: float = Defaults.SESSION_LOCAL_CACHE_TTL,
+        detect_nested_changes: bool = Defaults.SESSION_DETECT_NESTED_CHANGES,
+        lazy_loading: bool = Defaults.SESSION_LAZY_LOADING,
+        delta_writes: bool = Defaults.SESSION_DELTA_WRITES,
+        refresh_threshold: Optional[float] = Defaults.SESSION_REFRESH_THRESHOLD,
+        write_behind: bool = Defaults.SESSION_WRITE_BEHIND,
+        write_behind_queue_size: int = Defaults.SESSION_WRITE_BEHIND_QUEUE_SIZE,
+        write_behind_workers: int = Defaults.SESSION_WRITE_BEHIND_WORKERS,
+        compression: Optional[str] = Defaults.SESSION_COMPRESSION,
+        compression_threshold: int = Defaults.SESSION_COMPRESSION_THRESHOLD,
+        compression_dict: Optional[bytes] = Defaults.SESSION_COMPRESSION_DICT,
+        session_schema: Optional[type] = Defaults.SESSION_SCHEMA,
+        retry_policy: Optional[RetryPolicy] = Defaults.SESSION_RETRY_POLICY,
+        negative_cache_size: int = Defaults.SESSION_NEGATIVE_CACHE_SIZE,
+        negative_cache_ttl: float = Defaults.SESSION_NEGATIVE_CACHE_TTL,
+        owner_key: Optional[str] = Defaults.SESSION_OWNER_KEY,
     ):
 
         if client is None or not isinstance(client, MongoClient):
@@ -64,22 +112,53 @@ class MongoDBSessionInterface(ServerSideSessionInterface):
         self.client = client
         self.store = client[db][collection]
         self.use_deprecated_method = int(version.split(".")[0]) < 4
+        self.delta_writes = delta_writes
 
         # Create a TTL index on the expiration time, so that mongo can automatically delete expired sessions
         self.store.create_index("expiration", expireAfterSeconds=0)
+        if owner_key is not None:
+            # Index the owner, to find the sessions of an owner
+            self.store.create_index("owner")
 
         super().__init__(
-            app, key_prefix, use_signer, permanent, sid_length, serialization_format
+            app=app,
+            key_prefix=key_prefix,
+            use_signer=use_signer,
+            permanent=permanent,
+            sid_length=sid_length,
+            serialization_format=serialization_format,
+            local_cache_size=local_cache_size,
+            local_cache_ttl=local_cache_ttl,
+            detect_nested_changes=detect_nested_changes,
+            lazy_loading=lazy_loading,
+            refresh_threshold=refresh_threshold,
+            write_behind=write_behind,
+            write_behind_queue_size=write_behind_queue_size,
+            write_behind_workers=write_behind_workers,
+            compression=compression,
+            compression_threshold=compression_threshold,
+            compression_dict=compression_dict,
+            session_schema=session_schema,
+            retry_policy=retry_policy,
+            negative_cache_size=negative_cache_size,
+            negative_cache_ttl=negative_cache_ttl,
+            owner_key=owner_key,
         )
 
     def _retrieve_session_data(self, store_id: str) -> Optional[dict]:
         # Get the saved session (document) from the database
         document = self.store.find_one({"id": store_id})
         if document:
-            serialized_session_data = want_bytes(document["val"])
-            return self.serializer.loads(serialized_session_data)
+            return _load_document(self.serializer, document)
         return None
 
+    def _retrieve_session_lifetime(self, store_id: str) -> Optional[TimeDelta]:
+        document = self.store.find_one({"id": store_id}, {"expiration": True})
+        if not document or document.get("expiration") is None:
+            return None
+        lifetime = document["expiration"] - datetime.utcnow()
+        return lifetime if lifetime > TimeDelta() else None
+
     def _delete_session(self, store_id: str) -> None:
         if self.use_deprecated_method:
             self.store.remove({"id": store_id})
@@ -90,30 +169,434 @@ class MongoDBSessionInterface(ServerSideSessionInterface):
         self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
     ) -> None:
         storage_expiration_datetime = datetime.utcnow() + session_lifetime
-
-        # Serialize the session data
-        serialized_session_data = self.serializer.dumps(dict(session))
+        update = _upsert_update(
+            self.serializer,
+            session,
+            store_id,
+            storage_expiration_datetime,
+            self.delta_writes,
+            self.owner_key,
+        )
 
         # Update existing or create new session in the database
         if self.use_deprecated_method:
-            self.store.update(
-                {"id": store_id},
-                {
-                    "id": store_id,
-                    "val": serialized_session_data,
-                    "expiration": storage_expiration_datetime,
-                },
-                True,
-            )
+            self.store.update({"id": store_id}, update, True)
         else:
-            self.store.update_one(
-                {"id": store_id},
-                {
-                    "$set": {
-                        "id": store_id,
-                        "val": serialized_session_data,
-                        "expiration": storage_expiration_datetime,
-                    }
-                },
-                True,
+            self.store.update_one({"id": store_id}, update, True)
+
+    def _touch_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        now = datetime.utcnow()
+
+        # Only extend the expiry, the session data is unchanged. An expired or
+        # deleted session is not brought back
+        query = {"id": store_id, "expiration": {"$gt": now}}
+        update = {"$set": {"expiration": now + session_lifetime}}
+        if self.use_deprecated_method:
+            self.store.update(query, update)
+        else:
+            self.store.update_one(query, update)
+
+    def _rename_session(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        old_store_id: str,
+        new_store_id: str,
+    ) -> None:
+        if self.use_deprecated_method:
+            super()._rename_session(
+                session_lifetime, session, old_store_id, new_store_id
+            )
+            return
+
+        storage_expiration_datetime = datetime.utcnow() + session_lifetime
+        update = _upsert_update(
+            self.serializer,
+            session,
+            new_store_id,
+            storage_expiration_datetime,
+            self.delta_writes,
+            self.owner_key,
+        )
+
+        # Move the document to the new id and write its data in one update
+        result = self.store.update_one({"id": old_store_id}, update)
+        if result.matched_count == 0:
+            # The session is no longer stored under the old id
+            self._upsert_session(session_lifetime, session, new_store_id)
+
+    def _update_session_fields(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        store_id: str,
+        changed: List[str],
+        deleted: List[str],
+    ) -> None:
+        if self.use_deprecated_method:
+            self._upsert_session(session_lifetime, session, store_id)
+            return
+
+        storage_expiration_datetime = datetime.utcnow() + session_lifetime
+        update = _fields_update(
+            self.serializer,
+            session,
+            changed,
+            deleted,
+            storage_expiration_datetime,
+            self.owner_key,
+        )
+
+        # Only update documents that already store their fields separately
+        result = self.store.update_one(
+            {"id": store_id, "fields": {"$exists": True}}, update
+        )
+        if result.matched_count == 0:
+            # The session is missing or stored as a single value
+            self._upsert_session(session_lifetime, session, store_id)
+
+    def _iter_serialized_sessions(self, batch_size: int) -> Iterator[Tuple[str, bytes]]:
+        # Sessions stored field by field by delta writes hold values serialized
+        # on their own, and are left out
+        documents = self.store.find(
+            {
+                "id": {"$regex": "^" + re.escape(self.key_prefix)},
+                "val": {"$exists": True},
+            },
+            {"_id": False, "id": True, "val": True},
+        ).batch_size(batch_size)
+        for document in documents:
+            yield document["id"], want_bytes(document["val"])
+
+    def _iter_session_data(self, batch_size: int) -> Iterator[Tuple[str, dict]]:
+        documents = self.store.find(
+            self._unexpired_sessions_query(), {"_id": False}
+        ).batch_size(batch_size)
+        for document in documents:
+            try:
+                session_data = _load_document(self.serializer, document)
+            except Exception:
+                self.app.logger.warning(
+                    "Skipped undecodable session %s", document["id"]
+                )
+                continue
+            yield document["id"], session_data
+
+    def _count_sessions(self, batch_size: int) -> int:
+        if self.use_deprecated_method:
+            return self.store.find(self._unexpired_sessions_query()).count()
+        return self.store.count_documents(self._unexpired_sessions_query())
+
+    def _owner_sessions(self, owner: str) -> List[Tuple[str, dict]]:
+        documents = self.store.find(
+            {"owner": owner, **self._unexpired_sessions_query()}, {"_id": False}
+        )
+        return [
+            (document["id"], _load_document(self.serializer, document))
+            for document in documents
+        ]
+
+    def _unexpired_sessions_query(self) -> dict:
+        # The TTL index only removes expired sessions once a minute
+        return {
+            "id": {"$regex": "^" + re.escape(self.key_prefix)},
+            "expiration": {"$gt": datetime.utcnow()},
+        }
+
+    def _replace_serialized_session(
+        self, store_id: str, old_data: bytes, new_data: bytes
+    ) -> bool:
+        query = {"id": store_id, "val": old_data}
+        update = {"$set": {"val": new_data}}
+        if self.use_deprecated_method:
+            return self.store.update(query, update).get("n", 0) > 0
+        return self.store.update_one(query, update).matched_count > 0
+
+
+class AsyncMongoDBSessionInterface(AsyncServerSideSessionInterface):
+    """Uses MongoDB as session storage, with the asyncio client of `pymongo`
+    (4.9 or newer). For frameworks that await the session interface, such as
+    Quart.
+
+    Sessions are stored the same way as by :class:`MongoDBSessionInterface`, so
+    both can share the same collection. The TTL index on the expiration time is
+    created when the first session is saved.
+
+    :param client: A ``pymongo.AsyncMongoClient`` instance.
+    :param key_prefix: A prefix that is added to all storage keys.
+    :param use_signer: Whether to sign the session id cookie or not.
+    :param permanent: Whether to use permanent session or not.
+    :param sid_length: The length of the generated session id in bytes.
+    :param serialization_format: The serialization format to use for the session data.
+    :param db: The database to use.
+    :param collection: The collection to use.
+    :param local_cache_size: The maximum number of sessions kept in the in-process cache, 0 disables it.
+    :param local_cache_ttl: The number of seconds a session is served from the in-process cache.
+    :param detect_nested_changes: Whether to detect changes to mutable values nested in the session.
+    :param lazy_loading: Not supported, must be ``False``.
+    :param write_behind: Not supported, must be ``False``.
+    :param delta_writes: Whether to store each top-level session key in its own
+        field of the document and only write the keys that changed.
+    :param refresh_threshold: The fraction of the session lifetime below which its remaining lifetime has to fall before its expiry is extended again.
+    :param compression: The codec used to compress serialized session data, ``"zlib"``, ``"zstd"`` or ``None``.
+    :param compression_threshold: The size in bytes from which serialized session data is compressed.
+    :param compression_dict: A zstd dictionary trained on typical session data.
+    :param session_schema: A ``msgspec.Struct`` or ``TypedDict`` describing the session data.
+    :param retry_policy: How failed queries are retried, see :class:`~flask_session.retry.RetryPolicy`.
+    :param negative_cache_size: The maximum number of unknown session ids remembered in-process, 0 disables it.
+    :param negative_cache_ttl: The number of seconds an unknown session id is remembered.
+    :param owner_key: The session key holding the owner of a session, to look up the sessions of an owner.
+
+    .. versionadded:: 0.9
+    """
+
+    session_class = MongoDBSession
+    ttl = True
+
+    def __init__(
+        self,
+        app: Flask,
+        client: Optional["AsyncMongoClient"] = Defaults.SESSION_MONGODB,
+        key_prefix: str = Defaults.SESSION_KEY_PREFIX,
+        use_signer: bool = Defaults.SESSION_USE_SIGNER,
+        permanent: bool = Defaults.SESSION_PERMANENT,
+        sid_length: int = Defaults.SESSION_ID_LENGTH,
+        serialization_format: str = Defaults.SESSION_SERIALIZATION_FORMAT,
+        db: str = Defaults.SESSION_MONGODB_DB,
+        collection: str = Defaults.SESSION_MONGODB_COLLECT,
+        local_cache_size: int = Defaults.SESSION_LOCAL_CACHE_SIZE,
+        local_cache_ttl: float = Defaults.SESSION_LOCAL_CACHE_TTL,
+        detect_nested_changes: bool = Defaults.SESSION_DETECT_NESTED_CHANGES,
+        lazy_loading: bool = Defaults.SESSION_LAZY_LOADING,
+        write_behind: bool = Defaults.SESSION_WRITE_BEHIND,
+        delta_writes: bool = Defaults.SESSION_DELTA_WRITES,
+        refresh_threshold: Optional[float] = Defaults.SESSION_REFRESH_THRESHOLD,
+        compression: Optional[str] = Defaults.SESSION_COMPRESSION,
+        compression_threshold: int = Defaults.SESSION_COMPRESSION_THRESHOLD,
+        compression_dict: Optional[bytes] = Defaults.SESSION_COMPRESSION_DICT,
+        session_schema: Optional[type] = Defaults.SESSION_SCHEMA,
+        retry_policy: Optional[RetryPolicy] = Defaults.SESSION_RETRY_POLICY,
+        negative_cache_size: int = Defaults.SESSION_NEGATIVE_CACHE_SIZE,
+        negative_cache_ttl: float = Defaults.SESSION_NEGATIVE_CACHE_TTL,
+        owner_key: Optional[str] = Defaults.SESSION_OWNER_KEY,
+    ):
+        if AsyncMongoClient is None:
+            raise ImportError(
+                "AsyncMongoDBSessionInterface requires pymongo 4.9 or newer"
             )
+
+        if client is None or not isinstance(client, AsyncMongoClient):
+            warnings.warn(
+                "No valid AsyncMongoClient instance provided, attempting to create a new instance on localhost with default settings.",
+                RuntimeWarning,
+                stacklevel=1,
+            )
+            client = AsyncMongoClient()
+
+        self.client = client
+        self.store = client[db][collection]
+        self.delta_writes = delta_writes
+        self._index_created = False
+
+        super().__init__(
+            app=app,
+            key_prefix=key_prefix,
+            use_signer=use_signer,
+            permanent=permanent,
+            sid_length=sid_length,
+            serialization_format=serialization_format,
+            local_cache_size=local_cache_size,
+            local_cache_ttl=local_cache_ttl,
+            detect_nested_changes=detect_nested_changes,
+            lazy_loading=lazy_loading,
+            write_behind=write_behind,
+            refresh_threshold=refresh_threshold,
+            compression=compression,
+            compression_threshold=compression_threshold,
+            compression_dict=compression_dict,
+            session_schema=session_schema,
+            retry_policy=retry_policy,
+            negative_cache_size=negative_cache_size,
+            negative_cache_ttl=negative_cache_ttl,
+            owner_key=owner_key,
+        )
+
+    async def _retrieve_session_data(self, store_id: str) -> Optional[dict]:
+        # Get the saved session (document) from the database
+        document = await self.store.find_one({"id": store_id})
+        if document:
+            return _load_document(self.serializer, document)
+        return None
+
+    async def _delete_session(self, store_id: str) -> None:
+        await self.store.delete_one({"id": store_id})
+
+    async def _upsert_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        if not self._index_created:
+            # Create a TTL index on the expiration time, so that mongo can automatically delete expired sessions
+            await self.store.create_index("expiration", expireAfterSeconds=0)
+            if self.owner_key is not None:
+                # Index the owner, to find the sessions of an owner
+                await self.store.create_index("owner")
+            self._index_created = True
+
+        storage_expiration_datetime = datetime.utcnow() + session_lifetime
+        update = _upsert_update(
+            self.serializer,
+            session,
+            store_id,
+            storage_expiration_datetime,
+            self.delta_writes,
+            self.owner_key,
+        )
+
+        # Update existing or create new session in the database
+        await self.store.update_one({"id": store_id}, update, True)
+
+    async def _touch_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        now = datetime.utcnow()
+
+        # Only extend the expiry, the session data is unchanged. An expired or
+        # deleted session is not brought back
+        await self.store.update_one(
+            {"id": store_id, "expiration": {"$gt": now}},
+            {"$set": {"expiration": now + session_lifetime}},
+        )
+
+    async def _rename_session(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        old_store_id: str,
+        new_store_id: str,
+    ) -> None:
+        storage_expiration_datetime = datetime.utcnow() + session_lifetime
+        update = _upsert_update(
+            self.serializer,
+            session,
+            new_store_id,
+            storage_expiration_datetime,
+            self.delta_writes,
+            self.owner_key,
+        )
+
+        # Move the document to the new id and write its data in one update
+        result = await self.store.update_one({"id": old_store_id}, update)
+        if result.matched_count == 0:
+            # The session is no longer stored under the old id
+            await self._upsert_session(session_lifetime, session, new_store_id)
+
+    async def _update_session_fields(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        store_id: str,
+        changed: List[str],
+        deleted: List[str],
+    ) -> None:
+        storage_expiration_datetime = datetime.utcnow() + session_lifetime
+        update = _fields_update(
+            self.serializer,
+            session,
+            changed,
+            deleted,
+            storage_expiration_datetime,
+            self.owner_key,
+        )
+
+        # Only update documents that already store their fields separately
+        result = await self.store.update_one(
+            {"id": store_id, "fields": {"$exists": True}}, update
+        )
+        if result.matched_count == 0:
+            # The session is missing or stored as a single value
+            await self._upsert_session(session_lifetime, session, store_id)
+
+
+def _load_document(serializer: Any, document: dict) -> dict:
+    """Deserialize the session data of a stored document."""
+    if "fields" in document:
+        return {
+            _unescape_field(field): serializer.loads_value(want_bytes(value))
+            for field, value in document["fields"].items()
+        }
+    return serializer.loads(want_bytes(document["val"]))
+
+
+def _upsert_update(
+    serializer: Any,
+    session: ServerSideSession,
+    store_id: str,
+    expiration: datetime,
+    delta_writes: bool,
+    owner_key: Optional[str] = None,
+) -> dict:
+    """Build the update that replaces the stored session data."""
+    if delta_writes:
+        # Store each top-level key in its own field, so it can be updated alone
+        fields = {
+            _escape_field(key): serializer.dumps_value(value)
+            for key, value in _stored_data(session).items()
+        }
+        update = {
+            "$set": {"id": store_id, "fields": fields, "expiration": expiration},
+            "$unset": {"val": ""},
+        }
+    else:
+        # Serialize the session data
+        serialized_session_data = serializer.dumps(_stored_data(session))
+        update = {
+            "$set": {
+                "id": store_id,
+                "val": serialized_session_data,
+                "expiration": expiration,
+            },
+            "$unset": {"fields": ""},
+        }
+    if owner_key is not None:
+        update["$set"]["owner"] = _owner_of(session, owner_key)
+    return update
+
+
+def _fields_update(
+    serializer: Any,
+    session: ServerSideSession,
+    changed: List[str],
+    deleted: List[str],
+    expiration: datetime,
+    owner_key: Optional[str] = None,
+) -> dict:
+    """Build the update that only writes the changed and deleted fields."""
+    session_data = _stored_data(session)
+    update = {
+        "$set": {
+            f"fields.{_escape_field(key)}": serializer.dumps_value(session_data[key])
+            for key in changed
+        }
+    }
+    update["$set"]["expiration"] = expiration
+    if owner_key is not None:
+        update["$set"]["owner"] = _owner_of(session, owner_key)
+    if deleted:
+        update["$unset"] = {f"fields.{_escape_field(key)}": "" for key in deleted}
+    return update
+
+
+def _escape_field(key: str) -> str:
+    """Escape a session key for use as a field name, which must not be empty,
+    start with ``$`` or contain ``.``."""
+    if not key:
+        return "%"
+    return key.replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def _unescape_field(field: str) -> str:
+    if field == "%":
+        return ""
+    return field.replace("%24", "$").replace("%2E", ".").replace("%25", "%")
@@ -2,18 +2,26 @@ from __future__ import annotations
 
 from contextlib import contextmanager
 from datetime import timedelta as TimeDelta
-from typing import Generator, Optional
+from typing import Generator, Iterator, Optional
 
+import psycopg2
+import psycopg2.sql
 from flask import Flask
 from itsdangerous import want_bytes
 from psycopg2.extensions import connection as PsycoPg2Connection
 from psycopg2.extensions import cursor as PsycoPg2Cursor
-from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 
+from .._postgresql_queries import Queries
 from .._utils import retry_query
-from ..base import ServerSideSession, ServerSideSessionInterface
+from ..base import (
+    ServerSideSession,
+    ServerSideSessionInterface,
+    _owner_of,
+    _stored_data,
+)
 from ..defaults import Defaults
-from ._queries import Queries
+from ..retry import RetryPolicy
 
 
 class PostgreSqlSession(ServerSideSession):
@@ -32,10 +40,31 @@ class PostgreSqlSessionInterface(ServerSideSessionInterface):
     :param table: The table name you want to use.
     :param schema: The db schema to use.
     :param cleanup_n_requests: Delete expired sessions on average every N requests.
+    :param local_cache_size: The maximum number of sessions kept in the in-process cache, 0 disables it.
+    :param local_cache_ttl: The number of seconds a session is served from the in-process cache.
+    :param detect_nested_changes: Whether to detect changes to mutable values nested in the session.
+    :param lazy_loading: Whether to defer loading the session from storage until it is first used.
+    :param refresh_threshold: The fraction of the session lifetime below which its remaining lifetime has to fall before its expiry is extended again.
+    :param write_behind: Whether to write sessions from background threads after the response is sent.
+    :param write_behind_queue_size: The maximum number of pending background writes, further writes are made synchronously.
+    :param write_behind_workers: The number of background threads writing sessions.
+    :param compression: The codec used to compress serialized session data, ``"zlib"``, ``"zstd"`` or ``None``.
+    :param compression_threshold: The size in bytes from which serialized session data is compressed.
+    :param compression_dict: A zstd dictionary trained on typical session data.
+    :param session_schema: A ``msgspec.Struct`` or ``TypedDict`` describing the session data.
+    :param retry_policy: How failed queries are retried, see :class:`~flask_session.retry.RetryPolicy`.
+    :param negative_cache_size: The maximum number of unknown session ids remembered in-process, 0 disables it.
+    :param negative_cache_ttl: The number of seconds an unknown session id is remembered.
+    :param owner_key: The session key holding the owner of a session, to look up the sessions of an owner.
+    :param cleanup_batch_size: The number of expired sessions deleted in one transaction by the cleanup.
+    :param cleanup_batch_pause: The number of seconds the cleanup pauses between batches.
+    :param cleanup_time_budget: The number of seconds after which the cleanup command stops, None for no limit.
+    :param cleanup_interval: The number of seconds between cleanups run by a background thread of one process, None to disable it.
     """
 
     session_class = PostgreSqlSession
     ttl = False
+    retry_exceptions = (psycopg2.InterfaceError, psycopg2.OperationalError, PoolError)
 
     def __init__(
         self,
@@ -49,6 +78,26 @@ class PostgreSqlSessionInterface(ServerSideSessionInterface):
         table: str = Defaults.SESSION_POSTGRESQL_TABLE,
         schema: str = Defaults.SESSION_POSTGRESQL_SCHEMA,
         cleanup_n_requests: Optional[int] = Defaults.SESSION_CLEANUP_N_REQUESTS,
+        local_cache_size: int = Defaults.SESSION_LOCAL_CACHE_SIZE,
+        local_cache_ttl: float = Defaults.SESSION_LOCAL_CACHE_TTL,
+        detect_nested_changes: bool = Defaults.SESSION_DETECT_NESTED_CHANGES,
+        lazy_loading: bool = Defaults.SESSION_LAZY_LOADING,
+        refresh_threshold: Optional[float] = Defaults.SESSION_REFRESH_THRESHOLD,
+        write_behind: bool = Defaults.SESSION_WRITE_BEHIND,
+        write_behind_queue_size: int = Defaults.SESSION_WRITE_BEHIND_QUEUE_SIZE,
+        write_behind_workers: int = Defaults.SESSION_WRITE_BEHIND_WORKERS,
+        compression: Optional[str] = Defaults.SESSION_COMPRESSION,
+        compression_threshold: int = Defaults.SESSION_COMPRESSION_THRESHOLD,
+        compression_dict: Optional[bytes] = Defaults.SESSION_COMPRESSION_DICT,
+        session_schema: Optional[type] = Defaults.SESSION_SCHEMA,
+        retry_policy: Optional[RetryPolicy] = Defaults.SESSION_RETRY_POLICY,
+        negative_cache_size: int = Defaults.SESSION_NEGATIVE_CACHE_SIZE,
+        negative_cache_ttl: float = Defaults.SESSION_NEGATIVE_CACHE_TTL,
+        owner_key: Optional[str] = Defaults.SESSION_OWNER_KEY,
+        cleanup_batch_size: int = Defaults.SESSION_CLEANUP_BATCH_SIZE,
+        cleanup_batch_pause: float = Defaults.SESSION_CLEANUP_BATCH_PAUSE,
+        cleanup_time_budget: Optional[float] = Defaults.SESSION_CLEANUP_TIME_BUDGET,
+        cleanup_interval: Optional[float] = Defaults.SESSION_CLEANUP_INTERVAL,
     ) -> None:
         if not isinstance(pool, ThreadedConnectionPool):
             raise TypeError("No valid ThreadedConnectionPool instance provided.")
@@ -57,19 +106,45 @@ class PostgreSqlSessionInterface(ServerSideSessionInterface):
 
         self._table = table
         self._schema = schema
+        self._cleanup_interval = cleanup_interval
 
-        self._queries = Queries(schema=self._schema, table=self._table)
+        self._queries = Queries(
+            schema=self._schema,
+            table=self._table,
+            sql=psycopg2.sql,
+            owner=owner_key is not None,
+        )
 
         self._create_schema_and_table()
 
         super().__init__(
-            app,
-            key_prefix,
-            use_signer,
-            permanent,
-            sid_length,
-            serialization_format,
-            cleanup_n_requests,
+            app=app,
+            key_prefix=key_prefix,
+            use_signer=use_signer,
+            permanent=permanent,
+            sid_length=sid_length,
+            serialization_format=serialization_format,
+            cleanup_n_requests=cleanup_n_requests,
+            local_cache_size=local_cache_size,
+            local_cache_ttl=local_cache_ttl,
+            detect_nested_changes=detect_nested_changes,
+            lazy_loading=lazy_loading,
+            refresh_threshold=refresh_threshold,
+            write_behind=write_behind,
+            write_behind_queue_size=write_behind_queue_size,
+            write_behind_workers=write_behind_workers,
+            compression=compression,
+            compression_threshold=compression_threshold,
+            compression_dict=compression_dict,
+            session_schema=session_schema,
+            retry_policy=retry_policy,
+            negative_cache_size=negative_cache_size,
+            negative_cache_ttl=negative_cache_ttl,
+            owner_key=owner_key,
+            cleanup_batch_size=cleanup_batch_size,
+            cleanup_batch_pause=cleanup_batch_pause,
+            cleanup_time_budget=cleanup_time_budget,
+            cleanup_interval=cleanup_interval,
         )
 
     @contextmanager
@@ -92,11 +167,26 @@ class PostgreSqlSessionInterface(ServerSideSessionInterface):
         with self._get_cursor() as cur:
             cur.execute(self._queries.create_schema)
             cur.execute(self._queries.create_table)
+            if self._queries.owner:
+                cur.execute(self._queries.add_owner_column)
+            if self._cleanup_interval:
+                cur.execute(self._queries.create_lease_table)
+            self._queries.compile(cur.connection)
+
+    @retry_query(max_attempts=3)
+    def _acquire_cleanup_lease(self, owner: str, duration: TimeDelta) -> bool:
+        with self._get_cursor() as cur:
+            cur.execute(
+                self._queries.acquire_cleanup_lease,
+                dict(owner=owner, duration=duration),
+            )
+            return cur.fetchone() is not None
 
-    def _delete_expired_sessions(self) -> None:
-        """Delete all expired sessions from the database."""
+    @retry_query(max_attempts=3)
+    def _delete_expired_batch(self, batch_size: int) -> int:
         with self._get_cursor() as cur:
-            cur.execute(self._queries.delete_expired_sessions)
+            cur.execute(self._queries.delete_expired_sessions, dict(limit=batch_size))
+            return cur.rowcount
 
     @retry_query(max_attempts=3)
     def _delete_session(self, store_id: str) -> None:
@@ -120,12 +210,22 @@ class PostgreSqlSessionInterface(ServerSideSessionInterface):
             return self.serializer.loads(serialized_session_data)
         return None
 
+    @retry_query(max_attempts=3)
+    def _retrieve_session_lifetime(self, store_id: str) -> Optional[TimeDelta]:
+        with self._get_cursor() as cur:
+            cur.execute(
+                self._queries.retrieve_session_lifetime,
+                dict(session_id=store_id),
+            )
+            row = cur.fetchone()
+        return row[0] if row is not None else None
+
     @retry_query(max_attempts=3)
     def _upsert_session(
         self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
     ) -> None:
 
-        serialized_session_data = self.serializer.dumps(session)
+        serialized_session_data = self.serializer.dumps(_stored_data(session))
 
         if session.sid is not None:
             assert session.sid == store_id.removeprefix(self.key_prefix)
@@ -137,9 +237,90 @@ class PostgreSqlSessionInterface(ServerSideSessionInterface):
                     session_id=store_id,
                     data=serialized_session_data,
                     ttl=session_lifetime,
+                    owner=_owner_of(session, self.owner_key),
+                ),
+            )
+
+    @retry_query(max_attempts=3)
+    def _touch_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        # An expired or deleted session is not brought back
+        with self._get_cursor() as cur:
+            cur.execute(
+                self._queries.touch_session,
+                dict(session_id=store_id, ttl=session_lifetime),
+            )
+
+    @retry_query(max_attempts=3)
+    def _rename_session(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        old_store_id: str,
+        new_store_id: str,
+    ) -> None:
+        serialized_session_data = self.serializer.dumps(_stored_data(session))
+
+        # Delete the old session and write the new one in one statement
+        with self._get_cursor() as cur:
+            cur.execute(
+                self._queries.rename_session,
+                dict(
+                    old_session_id=old_store_id,
+                    session_id=new_store_id,
+                    data=serialized_session_data,
+                    ttl=session_lifetime,
+                    owner=_owner_of(session, self.owner_key),
                 ),
             )
 
+    def _iter_serialized_sessions(self, batch_size: int) -> Iterator[tuple[str, bytes]]:
+        after = ""
+        while True:
+            # Page by session id, so that rewritten rows are not read again
+            with self._get_cursor() as cur:
+                cur.execute(
+                    self._queries.list_sessions,
+                    dict(after=after, prefix=self.key_prefix, limit=batch_size),
+                )
+                rows = cur.fetchall()
+            for store_id, serialized_session_data in rows:
+                yield store_id, want_bytes(serialized_session_data)
+            if len(rows) < batch_size:
+                break
+            after = rows[-1][0]
+
+    @retry_query(max_attempts=3)
+    def _count_sessions(self, batch_size: int) -> int:
+        with self._get_cursor() as cur:
+            cur.execute(self._queries.count_sessions, dict(prefix=self.key_prefix))
+            return cur.fetchone()[0]
+
+    @retry_query(max_attempts=3)
+    def _owner_sessions(self, owner: str) -> list[tuple[str, dict]]:
+        with self._get_cursor() as cur:
+            cur.execute(
+                self._queries.owner_sessions,
+                dict(owner=owner, prefix=self.key_prefix),
+            )
+            rows = cur.fetchall()
+        return [
+            (store_id, self.serializer.loads(want_bytes(serialized_session_data)))
+            for store_id, serialized_session_data in rows
+        ]
+
+    @retry_query(max_attempts=3)
+    def _replace_serialized_session(
+        self, store_id: str, old_data: bytes, new_data: bytes
+    ) -> bool:
+        with self._get_cursor() as cur:
+            cur.execute(
+                self._queries.replace_session_data,
+                dict(session_id=store_id, old_data=old_data, data=new_data),
+            )
+            return bool(cur.rowcount)
+
     def _drop_table(self) -> None:
         with self._get_cursor() as cur:
             cur.execute(self._queries.drop_sessions_table)
@@ -0,0 +1,5 @@
+from .psycopg import (  # noqa: F401
+    AsyncPsycopgSessionInterface,
+    PsycopgSession,
+    PsycopgSessionInterface,
+)
@@ -0,0 +1,669 @@
+from __future__ import annotations
+
+import asyncio
+import random
+from contextlib import asynccontextmanager, contextmanager
+from datetime import timedelta as TimeDelta
+from threading import Lock
+from typing import AsyncGenerator, Callable, Generator, Iterator, Optional, Tuple
+
+import psycopg
+import psycopg.sql
+from flask import Flask
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+from .._postgresql_queries import Queries
+from .._utils import retry_query
+from ..base import (
+    AsyncServerSideSessionInterface,
+    ServerSideSession,
+    ServerSideSessionInterface,
+    _owner_of,
+    _stored_data,
+)
+from ..defaults import Defaults
+from ..retry import RetryPolicy
+
+
+class PsycopgSession(ServerSideSession):
+    pass
+
+
+class _DeferredCleanupMixin:
+    """Defers the cleanup batch due by ``cleanup_n_requests`` to the next write
+    of any request, which sends it on the same connection."""
+
+    def _take_cleanup_due(self) -> bool:
+        with self._cleanup_due_lock:
+            cleanup_due, self._cleanup_due = self._cleanup_due, False
+        return cleanup_due
+
+    def _cleanup_n_requests(self) -> None:
+        """
+        Delete expired sessions on average every N requests.
+
+        The batch is sent after the next write of any request, on the same
+        connection.
+        """
+        if self.cleanup_n_requests and random.randint(0, self.cleanup_n_requests) == 0:
+            with self._cleanup_due_lock:
+                self._cleanup_due = True
+
+
+class PsycopgSessionInterface(_DeferredCleanupMixin, ServerSideSessionInterface):
+    """A Session interface that uses PostgreSQL as a session storage through psycopg 3. (`psycopg` and `psycopg_pool` required)
+
+    It uses the same table as :class:`~flask_session.postgresql.PostgreSqlSessionInterface`.
+    Queries are prepared on each connection and exchange binary data. A batch
+    of expired sessions due to be deleted by ``cleanup_n_requests`` is sent in
+    a pipeline right after the next write commits, on the same connection, and
+    in a transaction of its own so that it cannot roll the write back.
+
+    :param pool: A ``psycopg_pool.ConnectionPool`` instance.
+    :param key_prefix: A prefix that is added to all storage keys.
+    :param use_signer: Whether to sign the session id cookie or not.
+    :param permanent: Whether to use permanent session or not.
+    :param sid_length: The length of the generated session id in bytes.
+    :param serialization_format: The serialization format to use for the session data.
+    :param table: The table name you want to use.
+    :param schema: The db schema to use.
+    :param cleanup_n_requests: Delete expired sessions on average every N requests.
+    :param local_cache_size: The maximum number of sessions kept in the in-process cache, 0 disables it.
+    :param local_cache_ttl: The number of seconds a session is served from the in-process cache.
+    :param detect_nested_changes: Whether to detect changes to mutable values nested in the session.
+    :param lazy_loading: Whether to defer loading the session from storage until it is first used.
+    :param refresh_threshold: The fraction of the session lifetime below which its remaining lifetime has to fall before its expiry is extended again.
+    :param write_behind: Whether to write sessions from background threads after the response is sent.
+    :param write_behind_queue_size: The maximum number of pending background writes, further writes are made synchronously.
+    :param write_behind_workers: The number of background threads writing sessions.
+    :param compression: The codec used to compress serialized session data, ``"zlib"``, ``"zstd"`` or ``None``.
+    :param compression_threshold: The size in bytes from which serialized session data is compressed.
+    :param compression_dict: A zstd dictionary trained on typical session data.
+    :param session_schema: A ``msgspec.Struct`` or ``TypedDict`` describing the session data.
+    :param retry_policy: How failed queries are retried, see :class:`~flask_session.retry.RetryPolicy`.
+    :param negative_cache_size: The maximum number of unknown session ids remembered in-process, 0 disables it.
+    :param negative_cache_ttl: The number of seconds an unknown session id is remembered.
+    :param owner_key: The session key holding the owner of a session, to look up the sessions of an owner.
+    :param cleanup_batch_size: The number of expired sessions deleted in one transaction by the cleanup.
+    :param cleanup_batch_pause: The number of seconds the cleanup pauses between batches.
+    :param cleanup_time_budget: The number of seconds after which the cleanup command stops, None for no limit.
+    :param cleanup_interval: The number of seconds between cleanups run by a background thread of one process, None to disable it.
+    """
+
+    session_class = PsycopgSession
+    ttl = False
+    # psycopg_pool.PoolTimeout is an OperationalError
+    retry_exceptions = (psycopg.InterfaceError, psycopg.OperationalError)
+
+    def __init__(
+        self,
+        app: Flask,
+        pool: Optional[ConnectionPool] = Defaults.SESSION_POSTGRESQL,
+        key_prefix: str = Defaults.SESSION_KEY_PREFIX,
+        use_signer: bool = Defaults.SESSION_USE_SIGNER,
+        permanent: bool = Defaults.SESSION_PERMANENT,
+        sid_length: int = Defaults.SESSION_ID_LENGTH,
+        serialization_format: str = Defaults.SESSION_SERIALIZATION_FORMAT,
+        table: str = Defaults.SESSION_POSTGRESQL_TABLE,
+        schema: str = Defaults.SESSION_POSTGRESQL_SCHEMA,
+        cleanup_n_requests: Optional[int] = Defaults.SESSION_CLEANUP_N_REQUESTS,
+        local_cache_size: int = Defaults.SESSION_LOCAL_CACHE_SIZE,
+        local_cache_ttl: float = Defaults.SESSION_LOCAL_CACHE_TTL,
+        detect_nested_changes: bool = Defaults.SESSION_DETECT_NESTED_CHANGES,
+        lazy_loading: bool = Defaults.SESSION_LAZY_LOADING,
+        refresh_threshold: Optional[float] = Defaults.SESSION_REFRESH_THRESHOLD,
+        write_behind: bool = Defaults.SESSION_WRITE_BEHIND,
+        write_behind_queue_size: int = Defaults.SESSION_WRITE_BEHIND_QUEUE_SIZE,
+        write_behind_workers: int = Defaults.SESSION_WRITE_BEHIND_WORKERS,
+        compression: Optional[str] = Defaults.SESSION_COMPRESSION,
+        compression_threshold: int = Defaults.SESSION_COMPRESSION_THRESHOLD,
+        compression_dict: Optional[bytes] = Defaults.SESSION_COMPRESSION_DICT,
+        session_schema: Optional[type] = Defaults.SESSION_SCHEMA,
+        retry_policy: Optional[RetryPolicy] = Defaults.SESSION_RETRY_POLICY,
+        negative_cache_size: int = Defaults.SESSION_NEGATIVE_CACHE_SIZE,
+        negative_cache_ttl: float = Defaults.SESSION_NEGATIVE_CACHE_TTL,
+        owner_key: Optional[str] = Defaults.SESSION_OWNER_KEY,
+        cleanup_batch_size: int = Defaults.SESSION_CLEANUP_BATCH_SIZE,
+        cleanup_batch_pause: float = Defaults.SESSION_CLEANUP_BATCH_PAUSE,
+        cleanup_time_budget: Optional[float] = Defaults.SESSION_CLEANUP_TIME_BUDGET,
+        cleanup_interval: Optional[float] = Defaults.SESSION_CLEANUP_INTERVAL,
+    ) -> None:
+        if not isinstance(pool, ConnectionPool):
+            raise TypeError("No valid ConnectionPool instance provided.")
+
+        self.pool = pool
+
+        self._table = table
+        self._schema = schema
+        self._cleanup_interval = cleanup_interval
+        # Set by a request due to run the cleanup, and cleared by the next write
+        self._cleanup_due = False
+        self._cleanup_due_lock = Lock()
+
+        self._queries = Queries(
+            schema=self._schema,
+            table=self._table,
+            sql=psycopg.sql,
+            owner=owner_key is not None,
+        )
+
+        self._create_schema_and_table()
+
+        super().__init__(
+            app=app,
+            key_prefix=key_prefix,
+            use_signer=use_signer,
+            permanent=permanent,
+            sid_length=sid_length,
+            serialization_format=serialization_format,
+            cleanup_n_requests=cleanup_n_requests,
+            local_cache_size=local_cache_size,
+            local_cache_ttl=local_cache_ttl,
+            detect_nested_changes=detect_nested_changes,
+            lazy_loading=lazy_loading,
+            refresh_threshold=refresh_threshold,
+            write_behind=write_behind,
+            write_behind_queue_size=write_behind_queue_size,
+            write_behind_workers=write_behind_workers,
+            compression=compression,
+            compression_threshold=compression_threshold,
+            compression_dict=compression_dict,
+            session_schema=session_schema,
+            retry_policy=retry_policy,
+            negative_cache_size=negative_cache_size,
+            negative_cache_ttl=negative_cache_ttl,
+            owner_key=owner_key,
+            cleanup_batch_size=cleanup_batch_size,
+            cleanup_batch_pause=cleanup_batch_pause,
+            cleanup_time_budget=cleanup_time_budget,
+            cleanup_interval=cleanup_interval,
+        )
+
+    @contextmanager
+    def _get_connection(self) -> Generator[psycopg.Connection, None, None]:
+        with self.pool.connection() as conn:
+            autocommit = conn.autocommit
+            # Every query commits on its own, without BEGIN and COMMIT round trips
+            conn.autocommit = True
+            try:
+                yield conn
+            finally:
+                if not conn.broken:
+                    conn.autocommit = autocommit
+
+    def _execute(
+        self, conn: psycopg.Connection, query: str, params: dict
+    ) -> psycopg.Cursor:
+        # Prepare the query on first use, unless the connection has prepared
+        # statements disabled, for example behind PgBouncer
+        prepare = True if conn.prepare_threshold is not None else None
+        return conn.execute(query, params, prepare=prepare, binary=True)
+
+    @retry_query(max_attempts=3)
+    def _write(self, query: str, params: dict) -> int:
+        """Run a query writing a session, followed by a due batch of the
+        cleanup. Returns the number of rows written."""
+        cleanup_due = self._take_cleanup_due()
+        with self._get_connection() as conn:
+            if not cleanup_due:
+                return self._execute(conn, query, params).rowcount
+            with conn.pipeline() as pipeline:
+                cur = self._execute(conn, query, params)
+                # The Sync commits the write, the cleanup runs after it in a
+                # transaction of its own
+                pipeline.sync()
+                try:
+                    self._execute(
+                        conn,
+                        self._queries.delete_expired_sessions,
+                        dict(limit=self.cleanup_batch_size),
+                    )
+                    pipeline.sync()
+                except psycopg.Error:
+                    self.app.logger.exception("Failed to delete expired sessions")
+            return cur.rowcount
+
+    @retry_query(max_attempts=3)
+    def _create_schema_and_table(self) -> None:
+        with self.pool.connection() as conn:
+            conn.execute(self._queries.create_schema)
+            conn.execute(self._queries.create_table)
+            if self._queries.owner:
+                conn.execute(self._queries.add_owner_column)
+            if self._cleanup_interval:
+                conn.execute(self._queries.create_lease_table)
+            self._queries.compile(conn)
+
+    @retry_query(max_attempts=3)
+    def _acquire_cleanup_lease(self, owner: str, duration: TimeDelta) -> bool:
+        with self._get_connection() as conn:
+            cur = self._execute(
+                conn,
+                self._queries.acquire_cleanup_lease,
+                dict(owner=owner, duration=duration),
+            )
+            return cur.fetchone() is not None
+
+    @retry_query(max_attempts=3)
+    def _delete_expired_batch(self, batch_size: int) -> int:
+        with self._get_connection() as conn:
+            cur = self._execute(
+                conn, self._queries.delete_expired_sessions, dict(limit=batch_size)
+            )
+            return cur.rowcount
+
+    def _delete_session(self, store_id: str) -> None:
+        self._write(self._queries.delete_session, dict(session_id=store_id))
+
+    @retry_query(max_attempts=3)
+    def _retrieve_session_data(self, store_id: str) -> Optional[dict]:
+        with self._get_connection() as conn:
+            cur = self._execute(
+                conn,
+                self._queries.retrieve_session_data,
+                dict(session_id=store_id),
+            )
+            session_data = cur.fetchone()
+
+        if session_data is not None:
+            return self.serializer.loads(session_data[0])
+        return None
+
+    @retry_query(max_attempts=3)
+    def _retrieve_session_lifetime(self, store_id: str) -> Optional[TimeDelta]:
+        with self._get_connection() as conn:
+            row = self._execute(
+                conn,
+                self._queries.retrieve_session_lifetime,
+                dict(session_id=store_id),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def _upsert_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        serialized_session_data = self.serializer.dumps(_stored_data(session))
+
+        if session.sid is not None:
+            assert session.sid == store_id.removeprefix(self.key_prefix)
+
+        self._write(
+            self._queries.upsert_session,
+            dict(
+                session_id=store_id,
+                data=serialized_session_data,
+                ttl=session_lifetime,
+                owner=_owner_of(session, self.owner_key),
+            ),
+        )
+
+    def _touch_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        # An expired or deleted session is not brought back
+        self._write(
+            self._queries.touch_session,
+            dict(session_id=store_id, ttl=session_lifetime),
+        )
+
+    def _rename_session(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        old_store_id: str,
+        new_store_id: str,
+    ) -> None:
+        serialized_session_data = self.serializer.dumps(_stored_data(session))
+
+        # Delete the old session and write the new one in one statement
+        self._write(
+            self._queries.rename_session,
+            dict(
+                old_session_id=old_store_id,
+                session_id=new_store_id,
+                data=serialized_session_data,
+                ttl=session_lifetime,
+                owner=_owner_of(session, self.owner_key),
+            ),
+        )
+
+    def _iter_serialized_sessions(self, batch_size: int) -> Iterator[tuple[str, bytes]]:
+        after = ""
+        while True:
+            # Page by session id, so that rewritten rows are not read again
+            with self._get_connection() as conn:
+                rows = self._execute(
+                    conn,
+                    self._queries.list_sessions,
+                    dict(after=after, prefix=self.key_prefix, limit=batch_size),
+                ).fetchall()
+            yield from rows
+            if len(rows) < batch_size:
+                break
+            after = rows[-1][0]
+
+    @retry_query(max_attempts=3)
+    def _count_sessions(self, batch_size: int) -> int:
+        with self._get_connection() as conn:
+            cur = self._execute(
+                conn, self._queries.count_sessions, dict(prefix=self.key_prefix)
+            )
+            return cur.fetchone()[0]
+
+    @retry_query(max_attempts=3)
+    def _owner_sessions(self, owner: str) -> list[tuple[str, dict]]:
+        with self._get_connection() as conn:
+            rows = self._execute(
+                conn,
+                self._queries.owner_sessions,
+                dict(owner=owner, prefix=self.key_prefix),
+            ).fetchall()
+        return [
+            (store_id, self.serializer.loads(serialized_session_data))
+            for store_id, serialized_session_data in rows
+        ]
+
+    def _replace_serialized_session(
+        self, store_id: str, old_data: bytes, new_data: bytes
+    ) -> bool:
+        replaced = self._write(
+            self._queries.replace_session_data,
+            dict(session_id=store_id, old_data=old_data, data=new_data),
+        )
+        return bool(replaced)
+
+    def _drop_table(self) -> None:
+        with self.pool.connection() as conn:
+            conn.execute(self._queries.drop_sessions_table)
+
+
+class AsyncPsycopgSessionInterface(
+    _DeferredCleanupMixin, AsyncServerSideSessionInterface
+):
+    """Uses PostgreSQL as session storage, with the asyncio pool of psycopg 3.
+    For frameworks that await the session interface, such as Quart.
+    (`psycopg` and `psycopg_pool` required)
+
+    Sessions are stored the same way as by :class:`PsycopgSessionInterface`,
+    so both can share the same table. The schema and table are created when
+    the session storage is first used. Expired sessions are deleted by
+    ``cleanup_n_requests`` or the ``session_cleanup`` command, which opens the
+    pool on an event loop of its own, so the pool has to be created with
+    ``open=False`` and opened when the app starts serving. The scheduled
+    cleanup is run with :class:`PsycopgSessionInterface` on the same table.
+
+    :param pool: A ``psycopg_pool.AsyncConnectionPool`` instance.
+    :param key_prefix: A prefix that is added to all storage keys.
+    :param use_signer: Whether to sign the session id cookie or not.
+    :param permanent: Whether to use permanent session or not.
+    :param sid_length: The length of the generated session id in bytes.
+    :param serialization_format: The serialization format to use for the session data.
+    :param table: The table name you want to use.
+    :param schema: The db schema to use.
+    :param cleanup_n_requests: Delete expired sessions on average every N requests.
+    :param local_cache_size: The maximum number of sessions kept in the in-process cache, 0 disables it.
+    :param local_cache_ttl: The number of seconds a session is served from the in-process cache.
+    :param detect_nested_changes: Whether to detect changes to mutable values nested in the session.
+    :param lazy_loading: Not supported, must be ``False``.
+    :param write_behind: Not supported, must be ``False``.
+    :param refresh_threshold: The fraction of the session lifetime below which its remaining lifetime has to fall before its expiry is extended again.
+    :param compression: The codec used to compress serialized session data, ``"zlib"``, ``"zstd"`` or ``None``.
+    :param compression_threshold: The size in bytes from which serialized session data is compressed.
+    :param compression_dict: A zstd dictionary trained on typical session data.
+    :param session_schema: A ``msgspec.Struct`` or ``TypedDict`` describing the session data.
+    :param negative_cache_size: The maximum number of unknown session ids remembered in-process, 0 disables it.
+    :param negative_cache_ttl: The number of seconds an unknown session id is remembered.
+    :param owner_key: The session key holding the owner of a session, stored so that :class:`PsycopgSessionInterface` can look up the sessions of an owner.
+    :param cleanup_batch_size: The number of expired sessions deleted in one transaction by the cleanup.
+    :param cleanup_batch_pause: The number of seconds the cleanup pauses between batches.
+    :param cleanup_time_budget: The number of seconds after which the cleanup command stops, None for no limit.
+    :param retry_policy: Not supported, must be ``None``.
+    :param cleanup_interval: Not supported, must be ``None``.
+
+    .. versionadded:: 0.9
+    """
+
+    session_class = PsycopgSession
+    ttl = False
+
+    def __init__(
+        self,
+        app: Flask,
+        pool: Optional[AsyncConnectionPool] = Defaults.SESSION_POSTGRESQL,
+        key_prefix: str = Defaults.SESSION_KEY_PREFIX,
+        use_signer: bool = Defaults.SESSION_USE_SIGNER,
+        permanent: bool = Defaults.SESSION_PERMANENT,
+        sid_length: int = Defaults.SESSION_ID_LENGTH,
+        serialization_format: str = Defaults.SESSION_SERIALIZATION_FORMAT,
+        table: str = Defaults.SESSION_POSTGRESQL_TABLE,
+        schema: str = Defaults.SESSION_POSTGRESQL_SCHEMA,
+        cleanup_n_requests: Optional[int] = Defaults.SESSION_CLEANUP_N_REQUESTS,
+        local_cache_size: int = Defaults.SESSION_LOCAL_CACHE_SIZE,
+        local_cache_ttl: float = Defaults.SESSION_LOCAL_CACHE_TTL,
+        detect_nested_changes: bool = Defaults.SESSION_DETECT_NESTED_CHANGES,
+        lazy_loading: bool = Defaults.SESSION_LAZY_LOADING,
+        write_behind: bool = Defaults.SESSION_WRITE_BEHIND,
+        refresh_threshold: Optional[float] = Defaults.SESSION_REFRESH_THRESHOLD,
+        compression: Optional[str] = Defaults.SESSION_COMPRESSION,
+        compression_threshold: int = Defaults.SESSION_COMPRESSION_THRESHOLD,
+        compression_dict: Optional[bytes] = Defaults.SESSION_COMPRESSION_DICT,
+        session_schema: Optional[type] = Defaults.SESSION_SCHEMA,
+        negative_cache_size: int = Defaults.SESSION_NEGATIVE_CACHE_SIZE,
+        negative_cache_ttl: float = Defaults.SESSION_NEGATIVE_CACHE_TTL,
+        owner_key: Optional[str] = Defaults.SESSION_OWNER_KEY,
+        cleanup_batch_size: int = Defaults.SESSION_CLEANUP_BATCH_SIZE,
+        cleanup_batch_pause: float = Defaults.SESSION_CLEANUP_BATCH_PAUSE,
+        cleanup_time_budget: Optional[float] = Defaults.SESSION_CLEANUP_TIME_BUDGET,
+        retry_policy: Optional[RetryPolicy] = Defaults.SESSION_RETRY_POLICY,
+        cleanup_interval: Optional[float] = Defaults.SESSION_CLEANUP_INTERVAL,
+    ) -> None:
+        if not isinstance(pool, AsyncConnectionPool):
+            raise TypeError("No valid AsyncConnectionPool instance provided.")
+        if retry_policy is not None:
+            raise ValueError(
+                "SESSION_RETRY_POLICY is not supported by AsyncPsycopgSessionInterface"
+            )
+        if cleanup_interval:
+            raise ValueError(
+                "SESSION_CLEANUP_INTERVAL is not supported by "
+                "AsyncPsycopgSessionInterface, use cleanup_n_requests or the "
+                "session_cleanup command"
+            )
+
+        self.pool = pool
+        self._table_created = False
+        # Created on first use, in the event loop serving the requests
+        self._table_lock: Optional[asyncio.Lock] = None
+        # Event loop of the session_cleanup command, while it runs
+        self._cleanup_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Set by a request due to run the cleanup, and cleared by the next write
+        self._cleanup_due = False
+        self._cleanup_due_lock = Lock()
+
+        self._queries = Queries(
+            schema=schema,
+            table=table,
+            sql=psycopg.sql,
+            owner=owner_key is not None,
+        )
+
+        super().__init__(
+            app=app,
+            key_prefix=key_prefix,
+            use_signer=use_signer,
+            permanent=permanent,
+            sid_length=sid_length,
+            serialization_format=serialization_format,
+            cleanup_n_requests=cleanup_n_requests,
+            local_cache_size=local_cache_size,
+            local_cache_ttl=local_cache_ttl,
+            detect_nested_changes=detect_nested_changes,
+            lazy_loading=lazy_loading,
+            write_behind=write_behind,
+            refresh_threshold=refresh_threshold,
+            compression=compression,
+            compression_threshold=compression_threshold,
+            compression_dict=compression_dict,
+            session_schema=session_schema,
+            negative_cache_size=negative_cache_size,
+            negative_cache_ttl=negative_cache_ttl,
+            owner_key=owner_key,
+            cleanup_batch_size=cleanup_batch_size,
+            cleanup_batch_pause=cleanup_batch_pause,
+            cleanup_time_budget=cleanup_time_budget,
+        )
+
+    def _run_cleanup_command(
+        self,
+        batch_size: Optional[int] = None,
+        time_budget: Optional[float] = None,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> Tuple[int, bool]:
+        # The command runs outside of any event loop. The pool is opened on a
+        # loop of its own for the duration of the command
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.pool.open())
+            self._cleanup_loop = loop
+            try:
+                return super()._delete_expired_sessions(
+                    batch_size=batch_size, time_budget=time_budget, progress=progress
+                )
+            finally:
+                self._cleanup_loop = None
+                loop.run_until_complete(self.pool.close())
+        finally:
+            loop.close()
+
+    def _delete_expired_batch(self, batch_size: int) -> int:
+        async def delete_expired_batch() -> int:
+            async with self._get_connection() as conn:
+                cur = await self._execute(
+                    conn,
+                    self._queries.delete_expired_sessions,
+                    dict(limit=batch_size),
+                )
+                return cur.rowcount
+
+        return self._cleanup_loop.run_until_complete(delete_expired_batch())
+
+    async def _create_schema_and_table(self, conn: psycopg.AsyncConnection) -> None:
+        # Requests arriving before the table exists wait for the first one to
+        # create it
+        if self._table_lock is None:
+            self._table_lock = asyncio.Lock()
+        async with self._table_lock:
+            if self._table_created:
+                return
+            await conn.execute(self._queries.create_schema)
+            await conn.execute(self._queries.create_table)
+            if self._queries.owner:
+                await conn.execute(self._queries.add_owner_column)
+            self._queries.compile(conn)
+            self._table_created = True
+
+    @asynccontextmanager
+    async def _get_connection(self) -> AsyncGenerator[psycopg.AsyncConnection, None]:
+        async with self.pool.connection() as conn:
+            autocommit = conn.autocommit
+            # Every query commits on its own, without BEGIN and COMMIT round trips
+            await conn.set_autocommit(True)
+            try:
+                if not self._table_created:
+                    await self._create_schema_and_table(conn)
+                yield conn
+            finally:
+                if not conn.broken:
+                    await conn.set_autocommit(autocommit)
+
+    async def _execute(
+        self, conn: psycopg.AsyncConnection, query: str, params: dict
+    ) -> psycopg.AsyncCursor:
+        # Prepare the query on first use, unless the connection has prepared
+        # statements disabled, for example behind PgBouncer
+        prepare = True if conn.prepare_threshold is not None else None
+        return await conn.execute(query, params, prepare=prepare, binary=True)
+
+    async def _write(self, query: str, params: dict) -> int:
+        """Run a query writing a session, followed by a due batch of the
+        cleanup. Returns the number of rows written."""
+        cleanup_due = self._take_cleanup_due()
+        async with self._get_connection() as conn:
+            if not cleanup_due:
+                return (await self._execute(conn, query, params)).rowcount
+            async with conn.pipeline() as pipeline:
+                cur = await self._execute(conn, query, params)
+                # The Sync commits the write, the cleanup runs after it in a
+                # transaction of its own
+                await pipeline.sync()
+                try:
+                    await self._execute(
+                        conn,
+                        self._queries.delete_expired_sessions,
+                        dict(limit=self.cleanup_batch_size),
+                    )
+                    await pipeline.sync()
+                except psycopg.Error:
+                    self.app.logger.exception("Failed to delete expired sessions")
+            return cur.rowcount
+
+    async def _retrieve_session_data(self, store_id: str) -> Optional[dict]:
+        async with self._get_connection() as conn:
+            cur = await self._execute(
+                conn,
+                self._queries.retrieve_session_data,
+                dict(session_id=store_id),
+            )
+            session_data = await cur.fetchone()
+
+        if session_data is not None:
+            return self.serializer.loads(session_data[0])
+        return None
+
+    async def _delete_session(self, store_id: str) -> None:
+        await self._write(self._queries.delete_session, dict(session_id=store_id))
+
+    async def _upsert_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        serialized_session_data = self.serializer.dumps(_stored_data(session))
+
+        await self._write(
+            self._queries.upsert_session,
+            dict(
+                session_id=store_id,
+                data=serialized_session_data,
+                ttl=session_lifetime,
+                owner=_owner_of(session, self.owner_key),
+            ),
+        )
+
+    async def _touch_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        # An expired or deleted session is not brought back
+        await self._write(
+            self._queries.touch_session,
+            dict(session_id=store_id, ttl=session_lifetime),
+        )
+
+    async def _rename_session(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        old_store_id: str,
+        new_store_id: str,
+    ) -> None:
+        serialized_session_data = self.serializer.dumps(_stored_data(session))
+
+        # Delete the old session and write the new one in one statement
+        await self._write(
+            self._queries.rename_session,
+            dict(
+                old_session_id=old_store_id,
+                session_id=new_store_id,
+                data=serialized_session_data,
+                ttl=session_lifetime,
+                owner=_owner_of(session, self.owner_key),
+            ),
+        )
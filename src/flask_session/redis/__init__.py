@@ -1 +1 @@
-from .redis import RedisSession, RedisSessionInterface  # noqa: F401
+from .redis import AsyncRedisSessionInterface, RedisSession, RedisSessionInterface  # noqa: F401
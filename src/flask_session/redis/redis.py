@@ -1,28 +1,96 @@
 import warnings
 from datetime import timedelta as TimeDelta
-from typing import Optional
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 from flask import Flask
 from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import ResponseError
 
+from .._sharding import ShardedClientsMixin
 from .._utils import total_seconds
-from ..base import ServerSideSession, ServerSideSessionInterface
+from ..base import (
+    AsyncServerSideSessionInterface,
+    ServerSideSession,
+    ServerSideSessionInterface,
+    _owner_of,
+    _stored_data,
+)
 from ..defaults import Defaults
+from ..retry import RetryPolicy
+
+# Update the changed and deleted fields of a session stored as a hash in one
+# round trip. Returns 0 without writing anything if the session is missing or
+# not stored as a hash, in which case it has to be written in full.
+#
+# KEYS[1]: session key
+# ARGV[1]: time to live in seconds
+# ARGV[2]: number of changed fields, followed by the changed field and value
+#          pairs and then the deleted fields
+UPDATE_SESSION_FIELDS_SCRIPT = """
+if redis.call("TYPE", KEYS[1]).ok ~= "hash" then
+    return 0
+end
+local changed = tonumber(ARGV[2])
+if changed > 0 then
+    redis.call("HSET", KEYS[1], unpack(ARGV, 3, 2 + 2 * changed))
+end
+if #ARGV > 2 + 2 * changed then
+    redis.call("HDEL", KEYS[1], unpack(ARGV, 3 + 2 * changed))
+end
+redis.call("EXPIRE", KEYS[1], ARGV[1])
+return 1
+"""
+
+# Replace the data of a session stored as a string, keeping its expiry, only if
+# it was not written since it was read. Returns 0 if it was not replaced.
+#
+# KEYS[1]: session key
+# ARGV[1]: serialized data that was read
+# ARGV[2]: serialized data to store instead
+REPLACE_SESSION_SCRIPT = """
+if redis.call("GET", KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call("SET", KEYS[1], ARGV[2], "KEEPTTL")
+return 1
+"""
 
 
 class RedisSession(ServerSideSession):
     pass
 
 
-class RedisSessionInterface(ServerSideSessionInterface):
+class RedisSessionInterface(ShardedClientsMixin, ServerSideSessionInterface):
     """Uses the Redis key-value store as a session storage. (`redis-py` required)
 
-    :param client: A ``redis.Redis`` instance.
+    :param client: A ``redis.Redis`` instance, or a list of them to spread
+        sessions over several Redis servers.
     :param key_prefix: A prefix that is added to all storage keys.
     :param use_signer: Whether to sign the session id cookie or not.
     :param permanent: Whether to use permanent session or not.
     :param sid_length: The length of the generated session id in bytes.
     :param serialization_format: The serialization format to use for the session data.
+    :param local_cache_size: The maximum number of sessions kept in the in-process cache, 0 disables it.
+    :param local_cache_ttl: The number of seconds a session is served from the in-process cache.
+    :param detect_nested_changes: Whether to detect changes to mutable values nested in the session.
+    :param lazy_loading: Whether to defer loading the session from storage until it is first used.
+    :param delta_writes: Whether to store each top-level session key in its own
+        hash field and only write the keys that changed.
+    :param refresh_threshold: The fraction of the session lifetime below which its remaining lifetime has to fall before its expiry is extended again.
+    :param write_behind: Whether to write sessions from background threads after the response is sent.
+    :param write_behind_queue_size: The maximum number of pending background writes, further writes are made synchronously.
+    :param write_behind_workers: The number of background threads writing sessions.
+    :param compression: The codec used to compress serialized session data, ``"zlib"``, ``"zstd"`` or ``None``.
+    :param compression_threshold: The size in bytes from which serialized session data is compressed.
+    :param compression_dict: A zstd dictionary trained on typical session data.
+    :param session_schema: A ``msgspec.Struct`` or ``TypedDict`` describing the session data.
+    :param retry_policy: How failed queries are retried, see :class:`~flask_session.retry.RetryPolicy`.
+    :param shard_hints: Whether to start new session ids with the index of the
+        client they are stored on, so that adding clients does not move them.
+    :param negative_cache_size: The maximum number of unknown session ids remembered in-process, 0 disables it.
+    :param negative_cache_ttl: The number of seconds an unknown session id is remembered.
+    :param owner_key: The session key holding the owner of a session, to look up the sessions of an owner.
 
     .. versionadded:: 0.7
         The `serialization_format` and `app` parameters were added.
@@ -40,46 +108,686 @@ class RedisSessionInterface(ServerSideSessionInterface):
     def __init__(
         self,
         app: Flask,
-        client: Optional[Redis] = Defaults.SESSION_REDIS,
+        client: Union[Redis, Sequence[Redis], None] = Defaults.SESSION_REDIS,
         key_prefix: str = Defaults.SESSION_KEY_PREFIX,
         use_signer: bool = Defaults.SESSION_USE_SIGNER,
         permanent: bool = Defaults.SESSION_PERMANENT,
         sid_length: int = Defaults.SESSION_ID_LENGTH,
         serialization_format: str = Defaults.SESSION_SERIALIZATION_FORMAT,
+        local_cache_size: int = Defaults.SESSION_LOCAL_CACHE_SIZE,
+        local_cache_ttl: float = Defaults.SESSION_LOCAL_CACHE_TTL,
+        detect_nested_changes: bool = Defaults.SESSION_DETECT_NESTED_CHANGES,
+        lazy_loading: bool = Defaults.SESSION_LAZY_LOADING,
+        delta_writes: bool = Defaults.SESSION_DELTA_WRITES,
+        refresh_threshold: Optional[float] = Defaults.SESSION_REFRESH_THRESHOLD,
+        write_behind: bool = Defaults.SESSION_WRITE_BEHIND,
+        write_behind_queue_size: int = Defaults.SESSION_WRITE_BEHIND_QUEUE_SIZE,
+        write_behind_workers: int = Defaults.SESSION_WRITE_BEHIND_WORKERS,
+        compression: Optional[str] = Defaults.SESSION_COMPRESSION,
+        compression_threshold: int = Defaults.SESSION_COMPRESSION_THRESHOLD,
+        compression_dict: Optional[bytes] = Defaults.SESSION_COMPRESSION_DICT,
+        session_schema: Optional[type] = Defaults.SESSION_SCHEMA,
+        retry_policy: Optional[RetryPolicy] = Defaults.SESSION_RETRY_POLICY,
+        shard_hints: bool = Defaults.SESSION_SHARD_HINTS,
+        negative_cache_size: int = Defaults.SESSION_NEGATIVE_CACHE_SIZE,
+        negative_cache_ttl: float = Defaults.SESSION_NEGATIVE_CACHE_TTL,
+        owner_key: Optional[str] = Defaults.SESSION_OWNER_KEY,
     ):
-        if client is None or not isinstance(client, Redis):
+        clients = client if isinstance(client, (list, tuple)) else [client]
+        if not clients or not all(isinstance(c, Redis) for c in clients):
             warnings.warn(
                 "No valid Redis instance provided, attempting to create a new instance on localhost with default settings.",
                 RuntimeWarning,
                 stacklevel=1,
             )
-            client = Redis()
+            clients = [Redis()]
+        client = self._init_shards(clients, shard_hints)
         self.client = client
+        self.delta_writes = delta_writes
+        self._update_session_fields_script = client.register_script(
+            UPDATE_SESSION_FIELDS_SCRIPT
+        )
+        self._replace_session_script = client.register_script(REPLACE_SESSION_SCRIPT)
         super().__init__(
-            app, key_prefix, use_signer, permanent, sid_length, serialization_format
+            app=app,
+            key_prefix=key_prefix,
+            use_signer=use_signer,
+            permanent=permanent,
+            sid_length=sid_length,
+            serialization_format=serialization_format,
+            local_cache_size=local_cache_size,
+            local_cache_ttl=local_cache_ttl,
+            detect_nested_changes=detect_nested_changes,
+            lazy_loading=lazy_loading,
+            refresh_threshold=refresh_threshold,
+            write_behind=write_behind,
+            write_behind_queue_size=write_behind_queue_size,
+            write_behind_workers=write_behind_workers,
+            compression=compression,
+            compression_threshold=compression_threshold,
+            compression_dict=compression_dict,
+            session_schema=session_schema,
+            retry_policy=retry_policy,
+            negative_cache_size=negative_cache_size,
+            negative_cache_ttl=negative_cache_ttl,
+            owner_key=owner_key,
         )
+        if app is not None and len(self.clients) > 1:
+            self._register_rebalance_app_command()
 
     def _retrieve_session_data(self, store_id: str) -> Optional[dict]:
+        # Sessions are stored as a string or, with delta writes, as a hash. Try
+        # the layout in use first, then the other one for older sessions.
+        if self.delta_writes:
+            try:
+                return self._retrieve_session_fields(store_id)
+            except ResponseError:
+                return self._retrieve_session_value(store_id)
+        try:
+            return self._retrieve_session_value(store_id)
+        except ResponseError:
+            return self._retrieve_session_fields(store_id)
+
+    def _retrieve_session_value(self, store_id: str) -> Optional[dict]:
         # Get the saved session (value) from the database
-        serialized_session_data = self.client.get(store_id)
+        serialized_session_data = self._client_for(store_id).get(store_id)
         if serialized_session_data:
             return self.serializer.loads(serialized_session_data)
         return None
 
+    def _retrieve_session_fields(self, store_id: str) -> Optional[dict]:
+        # Get the saved session (hash) from the database
+        serialized_fields = self._client_for(store_id).hgetall(store_id)
+        if serialized_fields:
+            return {
+                key.decode(): self.serializer.loads_value(value)
+                for key, value in serialized_fields.items()
+            }
+        return None
+
+    def _retrieve_session_lifetime(self, store_id: str) -> Optional[TimeDelta]:
+        # Negative when the session is not stored or does not expire
+        time_to_live = self._client_for(store_id).pttl(store_id)
+        if time_to_live < 0:
+            return None
+        return TimeDelta(milliseconds=time_to_live)
+
     def _delete_session(self, store_id: str) -> None:
-        self.client.delete(store_id)
+        self._client_for(store_id).delete(store_id)
 
     def _upsert_session(
         self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
     ) -> None:
         storage_time_to_live = total_seconds(session_lifetime)
 
-        # Serialize the session data
-        serialized_session_data = self.serializer.dumps(dict(session))
+        if self.delta_writes:
+            # Replace the whole hash, whatever was stored under the key before
+            serialized_fields = {
+                key: self.serializer.dumps_value(value)
+                for key, value in _stored_data(session).items()
+            }
+            with self._client_for(store_id).pipeline() as pipe:
+                pipe.delete(store_id)
+                pipe.hset(store_id, mapping=serialized_fields)
+                pipe.expire(store_id, storage_time_to_live)
+                pipe.execute()
+        else:
+            # Serialize the session data
+            serialized_session_data = self.serializer.dumps(_stored_data(session))
+
+            # Update existing or create new session in the database
+            self._client_for(store_id).set(
+                name=store_id,
+                value=serialized_session_data,
+                ex=storage_time_to_live,
+            )
 
-        # Update existing or create new session in the database
-        self.client.set(
-            name=store_id,
-            value=serialized_session_data,
-            ex=storage_time_to_live,
+        self._index_owner(session, store_id, storage_time_to_live)
+
+    def _touch_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        storage_time_to_live = total_seconds(session_lifetime)
+
+        # Only extend the expiry, the session data is unchanged. An expired or
+        # deleted session is not brought back
+        client = self._client_for(store_id)
+        owner = _owner_of(session, self.owner_key)
+        index_key = None if owner is None else _owner_index_key(self.key_prefix, owner)
+        if index_key is None or self._client_for(index_key) is not client:
+            if client.expire(store_id, storage_time_to_live):
+                self._index_owner(session, store_id, storage_time_to_live)
+            return
+
+        # Extend the expiry of the session and of the index of its owner in one
+        # round trip
+        with client.pipeline() as pipe:
+            pipe.expire(store_id, storage_time_to_live)
+            pipe.sadd(index_key, store_id)
+            pipe.expire(index_key, storage_time_to_live)
+            touched = pipe.execute()[0]
+        if not touched:
+            client.srem(index_key, store_id)
+
+    def _update_session_fields(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        store_id: str,
+        changed: List[str],
+        deleted: List[str],
+    ) -> None:
+        storage_time_to_live = total_seconds(session_lifetime)
+
+        # Serialize only the changed values
+        session_data = _stored_data(session)
+        args = [storage_time_to_live, len(changed)]
+        for key in changed:
+            args += [key, self.serializer.dumps_value(session_data[key])]
+        args += deleted
+
+        updated = self._update_session_fields_script(
+            keys=[store_id], args=args, client=self._client_for(store_id)
+        )
+        if not updated:
+            # The session expired or is stored as a string, write it in full
+            self._upsert_session(session_lifetime, session, store_id)
+            return
+
+        self._index_owner(session, store_id, storage_time_to_live)
+
+    def _rename_session(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        old_store_id: str,
+        new_store_id: str,
+    ) -> None:
+        client = self._client_for(new_store_id)
+        if self._client_for(old_store_id) is not client:
+            # Stored by different servers
+            super()._rename_session(
+                session_lifetime, session, old_store_id, new_store_id
+            )
+            return
+
+        storage_time_to_live = total_seconds(session_lifetime)
+
+        # Write the new session and delete the old one in one transaction
+        with client.pipeline() as pipe:
+            pipe.delete(old_store_id)
+            if self.delta_writes:
+                serialized_fields = {
+                    key: self.serializer.dumps_value(value)
+                    for key, value in _stored_data(session).items()
+                }
+                pipe.hset(new_store_id, mapping=serialized_fields)
+                pipe.expire(new_store_id, storage_time_to_live)
+            else:
+                pipe.set(
+                    name=new_store_id,
+                    value=self.serializer.dumps(_stored_data(session)),
+                    ex=storage_time_to_live,
+                )
+            pipe.execute()
+
+        self._index_owner(
+            session, new_store_id, storage_time_to_live, old_store_id=old_store_id
         )
+
+    def _iter_serialized_sessions(self, batch_size: int) -> Iterator[Tuple[str, bytes]]:
+        # Sessions stored as a hash by delta writes hold values serialized on
+        # their own, and are left out
+        for client in self.clients:
+            keys = client.scan_iter(
+                match=_escape_pattern(self.key_prefix) + "*",
+                count=batch_size,
+                _type="string",
+            )
+            for batch in _batched(keys, batch_size):
+                for key, serialized_session_data in zip(batch, client.mget(batch)):
+                    if serialized_session_data:
+                        yield key.decode(), serialized_session_data
+
+    def _iter_session_data(self, batch_size: int) -> Iterator[Tuple[str, dict]]:
+        for client in self.clients:
+            keys = client.scan_iter(
+                match=_escape_pattern(self.key_prefix) + "*", count=batch_size
+            )
+            for batch in _batched(keys, batch_size):
+                # Read the sessions stored as a string at once, then those
+                # stored as a hash by delta writes in one more round trip
+                values = client.mget(batch)
+                with client.pipeline(transaction=False) as pipe:
+                    for key, value in zip(batch, values):
+                        if value is None:
+                            pipe.hgetall(key)
+                    hashes = iter(pipe.execute(raise_on_error=False))
+                for key, value in zip(batch, values):
+                    store_id = key.decode()
+                    try:
+                        if value is not None:
+                            session_data = self.serializer.loads(value)
+                        else:
+                            fields = next(hashes)
+                            if not isinstance(fields, dict) or not fields:
+                                # Expired since it was listed, or not a session
+                                continue
+                            session_data = {
+                                field.decode(): self.serializer.loads_value(data)
+                                for field, data in fields.items()
+                            }
+                    except Exception:
+                        self.app.logger.warning(
+                            "Skipped undecodable session %s", store_id
+                        )
+                        continue
+                    yield store_id, session_data
+
+    def _count_sessions(self, batch_size: int) -> int:
+        # Keys are only listed, not read
+        count = 0
+        for client in self.clients:
+            keys = client.scan_iter(
+                match=_escape_pattern(self.key_prefix) + "*", count=batch_size
+            )
+            count += sum(1 for _ in keys)
+        return count
+
+    def _replace_serialized_session(
+        self, store_id: str, old_data: bytes, new_data: bytes
+    ) -> bool:
+        return bool(
+            self._replace_session_script(
+                keys=[store_id],
+                args=[old_data, new_data],
+                client=self._client_for(store_id),
+            )
+        )
+
+    def _owner_sessions(self, owner: str) -> List[Tuple[str, dict]]:
+        index_key = _owner_index_key(self.key_prefix, owner)
+        index_client = self._client_for(index_key)
+        sessions = []
+        stale = []
+        for member in index_client.smembers(index_key):
+            store_id = member.decode()
+            session_data = self._retrieve_session_data(store_id)
+            if session_data is None or _owner_of(session_data, self.owner_key) != owner:
+                # Expired, deleted or owned by someone else since it was indexed
+                stale.append(store_id)
+                continue
+            sessions.append((store_id, session_data))
+        if stale:
+            index_client.srem(index_key, *stale)
+        return sessions
+
+    def _delete_owner_sessions(self, owner: str, store_ids: List[str]) -> None:
+        index_key = _owner_index_key(self.key_prefix, owner)
+        index_client = self._client_for(index_key)
+        # Delete the sessions and drop them from the index in one transaction,
+        # unless they are stored by another server than the index
+        with index_client.pipeline() as pipe:
+            for store_id in store_ids:
+                client = self._client_for(store_id)
+                if client is index_client:
+                    pipe.delete(store_id)
+                else:
+                    client.delete(store_id)
+            if store_ids:
+                pipe.srem(index_key, *store_ids)
+            pipe.execute()
+
+    def _index_owner(
+        self,
+        session: ServerSideSession,
+        store_id: str,
+        storage_time_to_live: int,
+        old_store_id: Optional[str] = None,
+    ) -> None:
+        """Add the session to the set of sessions of its owner. The set expires
+        with the last session written to it, as all share the same lifetime."""
+        owner = _owner_of(session, self.owner_key)
+        if owner is None:
+            return
+        index_key = _owner_index_key(self.key_prefix, owner)
+        with self._client_for(index_key).pipeline() as pipe:
+            if old_store_id is not None:
+                pipe.srem(index_key, old_store_id)
+            pipe.sadd(index_key, store_id)
+            pipe.expire(index_key, storage_time_to_live)
+            pipe.execute()
+
+    def _iter_shard_store_ids(self, shard: int, batch_size: int) -> Iterator[str]:
+        patterns = [_escape_pattern(self.key_prefix) + "*"]
+        if self.owner_key is not None:
+            # The owner indexes move with the sessions
+            patterns.append(
+                _escape_pattern(_owner_index_key(self.key_prefix, "")) + "*"
+            )
+        for pattern in patterns:
+            keys = self.clients[shard].scan_iter(match=pattern, count=batch_size)
+            for key in keys:
+                yield key.decode()
+
+    def _move_session(self, store_id: str, source: int, target: int) -> bool:
+        if store_id.startswith(_owner_index_key(self.key_prefix, "")):
+            return self._move_owner_index(store_id, source, target)
+
+        # Copy the session with its expiry, unless it was written to its new
+        # client since that was added
+        serialized_session = self.clients[source].dump(store_id)
+        time_to_live = self.clients[source].pttl(store_id)
+        if serialized_session is None or time_to_live == -2:
+            return False
+        try:
+            self.clients[target].restore(
+                store_id, max(time_to_live, 0), serialized_session
+            )
+        except ResponseError as e:
+            if "BUSYKEY" not in str(e):
+                raise
+        self.clients[source].delete(store_id)
+        return True
+
+    def _move_owner_index(self, index_key: str, source: int, target: int) -> bool:
+        """Merge the index of an owner into the one written to its new client
+        since that was added, keeping the longer expiry of both."""
+        members = self.clients[source].smembers(index_key)
+        time_to_live = self.clients[source].pttl(index_key)
+        if not members or time_to_live == -2:
+            return False
+        target_client = self.clients[target]
+        target_time_to_live = target_client.pttl(index_key)
+        with target_client.pipeline() as pipe:
+            pipe.sadd(index_key, *members)
+            # -2 when the index is not stored there, -1 when it does not expire
+            if (
+                time_to_live > 0
+                and target_time_to_live != -1
+                and target_time_to_live < time_to_live
+            ):
+                pipe.pexpire(index_key, time_to_live)
+            pipe.execute()
+        self.clients[source].delete(index_key)
+        return True
+
+
+def _owner_index_key(key_prefix: str, owner: str) -> str:
+    # Outside of the key prefix, so that listing the sessions leaves it out
+    return f"owner:{key_prefix}{owner}"
+
+
+def _escape_pattern(prefix: str) -> str:
+    # Match the key prefix literally in SCAN patterns
+    return "".join(f"\\{char}" if char in "*?[]\\" else char for char in prefix)
+
+
+def _batched(iterable: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class AsyncRedisSessionInterface(AsyncServerSideSessionInterface):
+    """Uses the Redis key-value store as a session storage, with the asyncio
+    client of `redis-py`. For frameworks that await the session interface, such
+    as Quart.
+
+    Sessions are stored the same way as by :class:`RedisSessionInterface`, so
+    both can share the same Redis database.
+
+    :param client: A ``redis.asyncio.Redis`` instance.
+    :param key_prefix: A prefix that is added to all storage keys.
+    :param use_signer: Whether to sign the session id cookie or not.
+    :param permanent: Whether to use permanent session or not.
+    :param sid_length: The length of the generated session id in bytes.
+    :param serialization_format: The serialization format to use for the session data.
+    :param local_cache_size: The maximum number of sessions kept in the in-process cache, 0 disables it.
+    :param local_cache_ttl: The number of seconds a session is served from the in-process cache.
+    :param detect_nested_changes: Whether to detect changes to mutable values nested in the session.
+    :param lazy_loading: Not supported, must be ``False``.
+    :param write_behind: Not supported, must be ``False``.
+    :param delta_writes: Whether to store each top-level session key in its own
+        hash field and only write the keys that changed.
+    :param refresh_threshold: The fraction of the session lifetime below which its remaining lifetime has to fall before its expiry is extended again.
+    :param compression: The codec used to compress serialized session data, ``"zlib"``, ``"zstd"`` or ``None``.
+    :param compression_threshold: The size in bytes from which serialized session data is compressed.
+    :param compression_dict: A zstd dictionary trained on typical session data.
+    :param session_schema: A ``msgspec.Struct`` or ``TypedDict`` describing the session data.
+    :param retry_policy: How failed queries are retried, see :class:`~flask_session.retry.RetryPolicy`.
+    :param negative_cache_size: The maximum number of unknown session ids remembered in-process, 0 disables it.
+    :param negative_cache_ttl: The number of seconds an unknown session id is remembered.
+    :param owner_key: The session key holding the owner of a session, to look up the sessions of an owner.
+
+    .. versionadded:: 0.9
+    """
+
+    session_class = RedisSession
+    ttl = True
+
+    def __init__(
+        self,
+        app: Flask,
+        client: Optional[AsyncRedis] = Defaults.SESSION_REDIS,
+        key_prefix: str = Defaults.SESSION_KEY_PREFIX,
+        use_signer: bool = Defaults.SESSION_USE_SIGNER,
+        permanent: bool = Defaults.SESSION_PERMANENT,
+        sid_length: int = Defaults.SESSION_ID_LENGTH,
+        serialization_format: str = Defaults.SESSION_SERIALIZATION_FORMAT,
+        local_cache_size: int = Defaults.SESSION_LOCAL_CACHE_SIZE,
+        local_cache_ttl: float = Defaults.SESSION_LOCAL_CACHE_TTL,
+        detect_nested_changes: bool = Defaults.SESSION_DETECT_NESTED_CHANGES,
+        lazy_loading: bool = Defaults.SESSION_LAZY_LOADING,
+        write_behind: bool = Defaults.SESSION_WRITE_BEHIND,
+        delta_writes: bool = Defaults.SESSION_DELTA_WRITES,
+        refresh_threshold: Optional[float] = Defaults.SESSION_REFRESH_THRESHOLD,
+        compression: Optional[str] = Defaults.SESSION_COMPRESSION,
+        compression_threshold: int = Defaults.SESSION_COMPRESSION_THRESHOLD,
+        compression_dict: Optional[bytes] = Defaults.SESSION_COMPRESSION_DICT,
+        session_schema: Optional[type] = Defaults.SESSION_SCHEMA,
+        retry_policy: Optional[RetryPolicy] = Defaults.SESSION_RETRY_POLICY,
+        negative_cache_size: int = Defaults.SESSION_NEGATIVE_CACHE_SIZE,
+        negative_cache_ttl: float = Defaults.SESSION_NEGATIVE_CACHE_TTL,
+        owner_key: Optional[str] = Defaults.SESSION_OWNER_KEY,
+    ):
+        if client is None or not isinstance(client, AsyncRedis):
+            warnings.warn(
+                "No valid asyncio Redis instance provided, attempting to create a new instance on localhost with default settings.",
+                RuntimeWarning,
+                stacklevel=1,
+            )
+            client = AsyncRedis()
+        self.client = client
+        self.delta_writes = delta_writes
+        self._update_session_fields_script = client.register_script(
+            UPDATE_SESSION_FIELDS_SCRIPT
+        )
+        super().__init__(
+            app=app,
+            key_prefix=key_prefix,
+            use_signer=use_signer,
+            permanent=permanent,
+            sid_length=sid_length,
+            serialization_format=serialization_format,
+            local_cache_size=local_cache_size,
+            local_cache_ttl=local_cache_ttl,
+            detect_nested_changes=detect_nested_changes,
+            lazy_loading=lazy_loading,
+            write_behind=write_behind,
+            refresh_threshold=refresh_threshold,
+            compression=compression,
+            compression_threshold=compression_threshold,
+            compression_dict=compression_dict,
+            session_schema=session_schema,
+            retry_policy=retry_policy,
+            negative_cache_size=negative_cache_size,
+            negative_cache_ttl=negative_cache_ttl,
+            owner_key=owner_key,
+        )
+
+    async def _retrieve_session_data(self, store_id: str) -> Optional[dict]:
+        # Sessions are stored as a string or, with delta writes, as a hash. Try
+        # the layout in use first, then the other one for older sessions.
+        if self.delta_writes:
+            try:
+                return await self._retrieve_session_fields(store_id)
+            except ResponseError:
+                return await self._retrieve_session_value(store_id)
+        try:
+            return await self._retrieve_session_value(store_id)
+        except ResponseError:
+            return await self._retrieve_session_fields(store_id)
+
+    async def _retrieve_session_value(self, store_id: str) -> Optional[dict]:
+        # Get the saved session (value) from the database
+        serialized_session_data = await self.client.get(store_id)
+        if serialized_session_data:
+            return self.serializer.loads(serialized_session_data)
+        return None
+
+    async def _retrieve_session_fields(self, store_id: str) -> Optional[dict]:
+        # Get the saved session (hash) from the database
+        serialized_fields = await self.client.hgetall(store_id)
+        if serialized_fields:
+            return {
+                key.decode(): self.serializer.loads_value(value)
+                for key, value in serialized_fields.items()
+            }
+        return None
+
+    async def _delete_session(self, store_id: str) -> None:
+        await self.client.delete(store_id)
+
+    async def _upsert_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        storage_time_to_live = total_seconds(session_lifetime)
+
+        if self.delta_writes:
+            # Replace the whole hash, whatever was stored under the key before
+            serialized_fields = {
+                key: self.serializer.dumps_value(value)
+                for key, value in _stored_data(session).items()
+            }
+            async with self.client.pipeline() as pipe:
+                pipe.delete(store_id)
+                pipe.hset(store_id, mapping=serialized_fields)
+                pipe.expire(store_id, storage_time_to_live)
+                await pipe.execute()
+        else:
+            # Serialize the session data
+            serialized_session_data = self.serializer.dumps(_stored_data(session))
+
+            # Update existing or create new session in the database
+            await self.client.set(
+                name=store_id,
+                value=serialized_session_data,
+                ex=storage_time_to_live,
+            )
+
+        await self._index_owner(session, store_id, storage_time_to_live)
+
+    async def _touch_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        storage_time_to_live = total_seconds(session_lifetime)
+
+        # Only extend the expiry, the session data is unchanged. An expired or
+        # deleted session is not brought back
+        owner = _owner_of(session, self.owner_key)
+        if owner is None:
+            await self.client.expire(store_id, storage_time_to_live)
+            return
+
+        # Extend the expiry of the session and of the index of its owner in one
+        # round trip
+        index_key = _owner_index_key(self.key_prefix, owner)
+        async with self.client.pipeline() as pipe:
+            pipe.expire(store_id, storage_time_to_live)
+            pipe.sadd(index_key, store_id)
+            pipe.expire(index_key, storage_time_to_live)
+            touched = (await pipe.execute())[0]
+        if not touched:
+            await self.client.srem(index_key, store_id)
+
+    async def _update_session_fields(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        store_id: str,
+        changed: List[str],
+        deleted: List[str],
+    ) -> None:
+        storage_time_to_live = total_seconds(session_lifetime)
+
+        # Serialize only the changed values
+        session_data = _stored_data(session)
+        args = [storage_time_to_live, len(changed)]
+        for key in changed:
+            args += [key, self.serializer.dumps_value(session_data[key])]
+        args += deleted
+
+        updated = await self._update_session_fields_script(keys=[store_id], args=args)
+        if not updated:
+            # The session expired or is stored as a string, write it in full
+            await self._upsert_session(session_lifetime, session, store_id)
+            return
+
+        await self._index_owner(session, store_id, storage_time_to_live)
+
+    async def _rename_session(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        old_store_id: str,
+        new_store_id: str,
+    ) -> None:
+        storage_time_to_live = total_seconds(session_lifetime)
+
+        # Write the new session and delete the old one in one transaction
+        async with self.client.pipeline() as pipe:
+            pipe.delete(old_store_id)
+            if self.delta_writes:
+                serialized_fields = {
+                    key: self.serializer.dumps_value(value)
+                    for key, value in _stored_data(session).items()
+                }
+                pipe.hset(new_store_id, mapping=serialized_fields)
+                pipe.expire(new_store_id, storage_time_to_live)
+            else:
+                pipe.set(
+                    name=new_store_id,
+                    value=self.serializer.dumps(_stored_data(session)),
+                    ex=storage_time_to_live,
+                )
+            await pipe.execute()
+
+        await self._index_owner(
+            session, new_store_id, storage_time_to_live, old_store_id=old_store_id
+        )
+
+    async def _index_owner(
+        self,
+        session: ServerSideSession,
+        store_id: str,
+        storage_time_to_live: int,
+        old_store_id: Optional[str] = None,
+    ) -> None:
+        # Keep the set of sessions of the owner, read by the synchronous
+        # interface, in step
+        owner = _owner_of(session, self.owner_key)
+        if owner is None:
+            return
+        index_key = _owner_index_key(self.key_prefix, owner)
+        async with self.client.pipeline() as pipe:
+            if old_store_id is not None:
+                pipe.srem(index_key, old_store_id)
+            pipe.sadd(index_key, store_id)
+            pipe.expire(index_key, storage_time_to_live)
+            await pipe.execute()
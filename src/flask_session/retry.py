@@ -0,0 +1,181 @@
+import random
+import time
+from threading import Lock, get_ident
+from typing import Any, Callable, Optional, Tuple, Type
+
+from flask import current_app
+
+from ._metrics import record_retry
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the session storage while the circuit breaker
+    of a :class:`RetryPolicy` is open."""
+
+
+class CircuitBreaker:
+    """Fails fast after consecutive failures of the session storage.
+
+    After ``failure_threshold`` consecutive failures the circuit opens, and
+    calls raise :class:`CircuitOpenError` without reaching the storage. Once
+    ``reset_timeout`` seconds have passed, a single call is let through to
+    probe the storage. The circuit closes again if it succeeds, and stays open
+    for another ``reset_timeout`` otherwise.
+
+    :param failure_threshold: The number of consecutive failures that open the
+        circuit.
+    :param reset_timeout: The number of seconds the circuit stays open before
+        the storage is probed.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_thread: Optional[int] = None
+        self._lock = Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """Whether calls are currently refused."""
+        return self.opened_at is not None
+
+    def before_call(self) -> None:
+        """Raise :class:`CircuitOpenError` if the call is refused."""
+        if self.opened_at is None:
+            return
+        with self._lock:
+            if self.opened_at is None or self._probe_thread == get_ident():
+                return
+            if (
+                self._probe_thread is None
+                and time.monotonic() - self.opened_at >= self.reset_timeout
+            ):
+                # Let this call probe whether the storage recovered
+                self._probe_thread = get_ident()
+                return
+        raise CircuitOpenError("The session storage is unavailable")
+
+    def record_success(self) -> None:
+        """Close the circuit after a call reached the storage."""
+        if self.failures == 0 and self.opened_at is None:
+            return
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe_thread = None
+
+    def record_failure(self) -> None:
+        """Count a failed call, and open the circuit when there were too many in
+        a row or the probe failed."""
+        with self._lock:
+            self.failures += 1
+            if self._probe_thread is not None or (
+                self.failures >= self.failure_threshold
+            ):
+                self.opened_at = time.monotonic()
+                self._probe_thread = None
+
+
+class RetryPolicy:
+    """How operations on the session storage are retried. Used by the session
+    interfaces that do not rely on their client to retry, such as the
+    SQLAlchemy and PostgreSQL ones.
+
+    Only the exceptions listed in the ``retry_exceptions`` attribute of the
+    session interface are retried, such as connection errors. Each retry waits
+    for an exponentially growing delay, picked at random between 0 and that
+    delay with ``jitter``, so that clients do not retry all at once.
+
+    :param max_attempts: The maximum number of attempts of an operation.
+    :param delay: The delay before the first retry, in seconds.
+    :param backoff: The factor the delay grows by after each retry.
+    :param max_delay: The longest delay between two attempts, in seconds.
+    :param jitter: Whether to wait for a random part of the delay.
+    :param deadline: The longest time an operation may take including its
+        retries, in seconds. No retry is made that would end after it.
+    :param failure_threshold: The number of consecutive failures after which
+        the :class:`CircuitBreaker` opens, or ``None`` for no circuit breaker.
+    :param reset_timeout: The number of seconds the circuit stays open before
+        the storage is probed again.
+
+    .. versionadded:: 0.9
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        delay: float = 0.1,
+        backoff: float = 2,
+        max_delay: float = 1.0,
+        jitter: bool = True,
+        deadline: Optional[float] = None,
+        failure_threshold: Optional[int] = 5,
+        reset_timeout: float = 30.0,
+    ):
+        self.max_attempts = max_attempts
+        self.delay = delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.deadline = deadline
+        # Shared by every operation using the policy
+        self.circuit_breaker = (
+            CircuitBreaker(failure_threshold, reset_timeout)
+            if failure_threshold
+            else None
+        )
+
+    def sleep_time(self, attempt: int) -> float:
+        """The delay before the retry following the failed ``attempt``, counted
+        from 0."""
+        sleep_time = min(self.max_delay, self.delay * self.backoff**attempt)
+        if self.jitter:
+            sleep_time = random.uniform(0, sleep_time)
+        return sleep_time
+
+    def call(
+        self,
+        func: Callable[..., Any],
+        args: tuple,
+        kwargs: dict,
+        retry_exceptions: Tuple[Type[BaseException], ...] = (Exception,),
+    ) -> Any:
+        """Call ``func`` with ``args`` and ``kwargs``, retrying it according to
+        the policy when it raises one of ``retry_exceptions``."""
+        breaker = self.circuit_breaker
+        if breaker is not None:
+            breaker.before_call()
+        started = time.monotonic()
+        for attempt in range(self.max_attempts):
+            try:
+                result = func(*args, **kwargs)
+            except retry_exceptions as e:
+                if breaker is not None:
+                    breaker.record_failure()
+                sleep_time = self.sleep_time(attempt)
+                if (
+                    attempt == self.max_attempts - 1
+                    or (breaker is not None and breaker.is_open)
+                    or (
+                        self.deadline is not None
+                        and time.monotonic() + sleep_time - started > self.deadline
+                    )
+                ):
+                    raise e
+                current_app.logger.exception(
+                    f"Exception when querying database ({e})."
+                    f"Retrying ({attempt + 1}/{self.max_attempts}) in {sleep_time:.2f}s."
+                )
+                time.sleep(sleep_time)
+                record_retry()
+            except Exception:
+                # The storage answered, the operation itself failed
+                if breaker is not None:
+                    breaker.record_success()
+                raise
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                return result
@@ -0,0 +1,33 @@
+"""Signals sent by Flask-Session, to collect metrics about session storage.
+
+Receivers are connected with `blinker`, the same way as the signals of Flask::
+
+    from flask_session.signals import session_operation
+
+    @session_operation.connect
+    def record(sender, operation, backend, duration, size, outcome, attempts):
+        ...
+
+When no receiver is connected, operations are not measured at all.
+"""
+
+from blinker import Namespace
+
+_signals = Namespace()
+
+session_operation = _signals.signal("session-operation")
+"""Sent after a session interface performed an operation on its storage. The
+sender is the session interface, and the keyword arguments are:
+
+- ``operation``: ``"retrieve"``, ``"upsert"``, ``"touch"``,
+  ``"update_fields"``, ``"delete"``, ``"delete_expired"`` or
+  ``"local_cache"`` for lookups in the in-process cache.
+- ``backend``: The name of the storage backend, such as ``"redis"``.
+- ``duration``: The time the operation took, in seconds.
+- ``size``: The number of serialized bytes read or written.
+- ``outcome``: ``"hit"`` or ``"miss"`` for ``retrieve`` and ``local_cache``,
+  whether a session was found, ``"ok"`` for the others, or ``"error"`` if an
+  exception was raised.
+- ``attempts``: The number of attempts, more than 1 if the operation was
+  retried.
+"""
@@ -1,23 +1,50 @@
 import warnings
 from datetime import datetime
 from datetime import timedelta as TimeDelta
-from typing import Any, Optional
+from typing import Any, Iterator, List, Optional, Tuple
 
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from itsdangerous import want_bytes
-from sqlalchemy import Column, DateTime, Integer, LargeBinary, Sequence, String
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    LargeBinary,
+    Sequence,
+    String,
+    func,
+    inspect,
+    or_,
+    text,
+)
+from sqlalchemy.exc import (
+    DBAPIError,
+    DisconnectionError,
+    IntegrityError,
+    InterfaceError,
+    OperationalError,
+)
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
 from .._utils import retry_query
-from ..base import ServerSideSession, ServerSideSessionInterface
+from ..base import (
+    ServerSideSession,
+    ServerSideSessionInterface,
+    _owner_of,
+    _stored_data,
+)
 from ..defaults import Defaults
+from ..retry import RetryPolicy
 
 
 class SqlAlchemySession(ServerSideSession):
     pass
 
 
-def create_session_model(db, table_name, schema=None, bind_key=None, sequence=None):
+def create_session_model(
+    db, table_name, schema=None, bind_key=None, sequence=None, with_owner=False
+):
     class Session(db.Model):
         __tablename__ = table_name
         __table_args__ = {"schema": schema} if schema else {}
@@ -31,6 +58,9 @@ def create_session_model(db, table_name, schema=None, bind_key=None, sequence=No
         session_id = Column(String(255), unique=True)
         data = Column(LargeBinary)
         expiry = Column(DateTime)
+        if with_owner:
+            # Indexed to find the sessions of an owner, see SESSION_OWNER_KEY
+            owner = Column(String(255), index=True)
 
         def __init__(self, session_id: str, data: Any, expiry: datetime):
             self.session_id = session_id
@@ -43,6 +73,60 @@ def create_session_model(db, table_name, schema=None, bind_key=None, sequence=No
     return Session
 
 
+def _add_owner_column(engine, session_model):
+    """Add the indexed owner column to a sessions table created before
+    SESSION_OWNER_KEY was set. Processes starting together may both find them
+    missing, so the table is inspected again when adding one fails."""
+    table = session_model.__table__
+    column = table.c.owner
+    index = next(index for index in table.indexes if column in index.columns.values())
+
+    def has_column():
+        columns = inspect(engine).get_columns(table.name, schema=table.schema)
+        return any(reflected["name"] == column.name for reflected in columns)
+
+    def has_index():
+        indexes = inspect(engine).get_indexes(table.name, schema=table.schema)
+        return any(reflected["name"] == index.name for reflected in indexes)
+
+    if not has_column():
+        preparer = engine.dialect.identifier_preparer
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {preparer.format_table(table)} "
+                        f"ADD COLUMN {preparer.format_column(column)} "
+                        f"{column.type.compile(dialect=engine.dialect)}"
+                    )
+                )
+        except DBAPIError:
+            # Added by another process in the meantime
+            if not has_column():
+                raise
+    if not has_index():
+        try:
+            index.create(bind=engine)
+        except DBAPIError:
+            if not has_index():
+                raise
+
+
+def create_lease_model(db, table_name, schema=None, bind_key=None):
+    class SessionLease(db.Model):
+        """The lease of the process running the scheduled cleanup."""
+
+        __tablename__ = table_name
+        __table_args__ = {"schema": schema} if schema else {}
+        __bind_key__ = bind_key
+
+        name = Column(String(64), primary_key=True)
+        owner = Column(String(255))
+        expiry = Column(DateTime)
+
+    return SessionLease
+
+
 class SqlAlchemySessionInterface(ServerSideSessionInterface):
     """Uses the Flask-SQLAlchemy from a flask app as session storage.
 
@@ -58,6 +142,26 @@ class SqlAlchemySessionInterface(ServerSideSessionInterface):
     :param schema: The db schema to use.
     :param bind_key: The db bind key to use.
     :param cleanup_n_requests: Delete expired sessions on average every N requests.
+    :param local_cache_size: The maximum number of sessions kept in the in-process cache, 0 disables it.
+    :param local_cache_ttl: The number of seconds a session is served from the in-process cache.
+    :param detect_nested_changes: Whether to detect changes to mutable values nested in the session.
+    :param lazy_loading: Whether to defer loading the session from storage until it is first used.
+    :param refresh_threshold: The fraction of the session lifetime below which its remaining lifetime has to fall before its expiry is extended again.
+    :param write_behind: Whether to write sessions from background threads after the response is sent.
+    :param write_behind_queue_size: The maximum number of pending background writes, further writes are made synchronously.
+    :param write_behind_workers: The number of background threads writing sessions.
+    :param compression: The codec used to compress serialized session data, ``"zlib"``, ``"zstd"`` or ``None``.
+    :param compression_threshold: The size in bytes from which serialized session data is compressed.
+    :param compression_dict: A zstd dictionary trained on typical session data.
+    :param session_schema: A ``msgspec.Struct`` or ``TypedDict`` describing the session data.
+    :param retry_policy: How failed queries are retried, see :class:`~flask_session.retry.RetryPolicy`.
+    :param negative_cache_size: The maximum number of unknown session ids remembered in-process, 0 disables it.
+    :param negative_cache_ttl: The number of seconds an unknown session id is remembered.
+    :param owner_key: The session key holding the owner of a session, to look up the sessions of an owner.
+    :param cleanup_batch_size: The number of expired sessions deleted in one transaction by the cleanup.
+    :param cleanup_batch_pause: The number of seconds the cleanup pauses between batches.
+    :param cleanup_time_budget: The number of seconds after which the cleanup command stops, None for no limit.
+    :param cleanup_interval: The number of seconds between cleanups run by a background thread of one process, None to disable it.
 
     .. versionadded:: 0.7
         db changed to client to be standard on all session interfaces.
@@ -72,6 +176,12 @@ class SqlAlchemySessionInterface(ServerSideSessionInterface):
 
     session_class = SqlAlchemySession
     ttl = False
+    retry_exceptions = (
+        DisconnectionError,
+        InterfaceError,
+        OperationalError,
+        PoolTimeoutError,
+    )
 
     def __init__(
         self,
@@ -87,6 +197,26 @@ class SqlAlchemySessionInterface(ServerSideSessionInterface):
         schema: Optional[str] = Defaults.SESSION_SQLALCHEMY_SCHEMA,
         bind_key: Optional[str] = Defaults.SESSION_SQLALCHEMY_BIND_KEY,
         cleanup_n_requests: Optional[int] = Defaults.SESSION_CLEANUP_N_REQUESTS,
+        local_cache_size: int = Defaults.SESSION_LOCAL_CACHE_SIZE,
+        local_cache_ttl: float = Defaults.SESSION_LOCAL_CACHE_TTL,
+        detect_nested_changes: bool = Defaults.SESSION_DETECT_NESTED_CHANGES,
+        lazy_loading: bool = Defaults.SESSION_LAZY_LOADING,
+        refresh_threshold: Optional[float] = Defaults.SESSION_REFRESH_THRESHOLD,
+        write_behind: bool = Defaults.SESSION_WRITE_BEHIND,
+        write_behind_queue_size: int = Defaults.SESSION_WRITE_BEHIND_QUEUE_SIZE,
+        write_behind_workers: int = Defaults.SESSION_WRITE_BEHIND_WORKERS,
+        compression: Optional[str] = Defaults.SESSION_COMPRESSION,
+        compression_threshold: int = Defaults.SESSION_COMPRESSION_THRESHOLD,
+        compression_dict: Optional[bytes] = Defaults.SESSION_COMPRESSION_DICT,
+        session_schema: Optional[type] = Defaults.SESSION_SCHEMA,
+        retry_policy: Optional[RetryPolicy] = Defaults.SESSION_RETRY_POLICY,
+        negative_cache_size: int = Defaults.SESSION_NEGATIVE_CACHE_SIZE,
+        negative_cache_ttl: float = Defaults.SESSION_NEGATIVE_CACHE_TTL,
+        owner_key: Optional[str] = Defaults.SESSION_OWNER_KEY,
+        cleanup_batch_size: int = Defaults.SESSION_CLEANUP_BATCH_SIZE,
+        cleanup_batch_pause: float = Defaults.SESSION_CLEANUP_BATCH_PAUSE,
+        cleanup_time_budget: Optional[float] = Defaults.SESSION_CLEANUP_TIME_BUDGET,
+        cleanup_interval: Optional[float] = Defaults.SESSION_CLEANUP_INTERVAL,
     ):
         self.app = app
 
@@ -101,7 +231,7 @@ class SqlAlchemySessionInterface(ServerSideSessionInterface):
 
         # Create the session model
         self.sql_session_model = create_session_model(
-            client, table, schema, bind_key, sequence
+            client, table, schema, bind_key, sequence, with_owner=owner_key is not None
         )
         # Create the table if it does not exist
         with app.app_context():
@@ -110,27 +240,96 @@ class SqlAlchemySessionInterface(ServerSideSessionInterface):
             else:
                 engine = self.client.engine
             self.sql_session_model.__table__.create(bind=engine, checkfirst=True)
+            if owner_key is not None:
+                _add_owner_column(engine, self.sql_session_model)
+            if cleanup_interval:
+                self.sql_lease_model = create_lease_model(
+                    client, f"{table}_lease", schema, bind_key
+                )
+                self.sql_lease_model.__table__.create(bind=engine, checkfirst=True)
 
         super().__init__(
-            app,
-            key_prefix,
-            use_signer,
-            permanent,
-            sid_length,
-            serialization_format,
-            cleanup_n_requests,
+            app=app,
+            key_prefix=key_prefix,
+            use_signer=use_signer,
+            permanent=permanent,
+            sid_length=sid_length,
+            serialization_format=serialization_format,
+            cleanup_n_requests=cleanup_n_requests,
+            local_cache_size=local_cache_size,
+            local_cache_ttl=local_cache_ttl,
+            detect_nested_changes=detect_nested_changes,
+            lazy_loading=lazy_loading,
+            refresh_threshold=refresh_threshold,
+            write_behind=write_behind,
+            write_behind_queue_size=write_behind_queue_size,
+            write_behind_workers=write_behind_workers,
+            compression=compression,
+            compression_threshold=compression_threshold,
+            compression_dict=compression_dict,
+            session_schema=session_schema,
+            retry_policy=retry_policy,
+            negative_cache_size=negative_cache_size,
+            negative_cache_ttl=negative_cache_ttl,
+            owner_key=owner_key,
+            cleanup_batch_size=cleanup_batch_size,
+            cleanup_batch_pause=cleanup_batch_pause,
+            cleanup_time_budget=cleanup_time_budget,
+            cleanup_interval=cleanup_interval,
         )
 
     @retry_query()
-    def _delete_expired_sessions(self) -> None:
+    def _delete_expired_batch(self, batch_size: int) -> int:
+        model = self.sql_session_model
+        try:
+            # Select the ids first, as not every database supports LIMIT in a
+            # subquery of a DELETE
+            expired_ids = [
+                row.id
+                for row in self.client.session.query(model.id)
+                .filter(model.expiry <= datetime.utcnow())
+                .limit(batch_size)
+            ]
+            deleted = 0
+            if expired_ids:
+                deleted = (
+                    self.client.session.query(model)
+                    .filter(model.id.in_(expired_ids))
+                    .delete(synchronize_session=False)
+                )
+            self.client.session.commit()
+        except Exception:
+            self.client.session.rollback()
+            raise
+        return deleted
+
+    @retry_query()
+    def _acquire_cleanup_lease(self, owner: str, duration: TimeDelta) -> bool:
+        model = self.sql_lease_model
+        now = datetime.utcnow()
         try:
-            self.client.session.query(self.sql_session_model).filter(
-                self.sql_session_model.expiry <= datetime.utcnow()
-            ).delete(synchronize_session=False)
+            # Renew the lease, or take it over once it expired
+            acquired = (
+                model.query.filter(
+                    model.name == "cleanup",
+                    or_(model.owner == owner, model.expiry <= now),
+                ).update({"owner": owner, "expiry": now + duration})
+                > 0
+            )
+            if not acquired and self.client.session.get(model, "cleanup") is None:
+                self.client.session.add(
+                    model(name="cleanup", owner=owner, expiry=now + duration)
+                )
+                acquired = True
             self.client.session.commit()
+        except IntegrityError:
+            # Another process created the lease first
+            self.client.session.rollback()
+            return False
         except Exception:
             self.client.session.rollback()
             raise
+        return acquired
 
     @retry_query()
     def _retrieve_session_data(self, store_id: str) -> Optional[dict]:
@@ -152,6 +351,19 @@ class SqlAlchemySessionInterface(ServerSideSessionInterface):
             return self.serializer.loads(serialized_session_data)
         return None
 
+    @retry_query()
+    def _retrieve_session_lifetime(self, store_id: str) -> Optional[TimeDelta]:
+        model = self.sql_session_model
+        expiry = (
+            self.client.session.query(model.expiry)
+            .filter(model.session_id == store_id)
+            .scalar()
+        )
+        if expiry is None:
+            return None
+        lifetime = expiry - datetime.utcnow()
+        return lifetime if lifetime > TimeDelta() else None
+
     @retry_query()
     def _delete_session(self, store_id: str) -> None:
         try:
@@ -168,7 +380,7 @@ class SqlAlchemySessionInterface(ServerSideSessionInterface):
         storage_expiration_datetime = datetime.utcnow() + session_lifetime
 
         # Serialize session data
-        serialized_session_data = self.serializer.dumps(dict(session))
+        serialized_session_data = self.serializer.dumps(_stored_data(session))
 
         # Update existing or create new session in the database
         try:
@@ -183,7 +395,143 @@ class SqlAlchemySessionInterface(ServerSideSessionInterface):
                     expiry=storage_expiration_datetime,
                 )
                 self.client.session.add(record)
+            if self.owner_key is not None:
+                record.owner = _owner_of(session, self.owner_key)
+            self.client.session.commit()
+        except Exception:
+            self.client.session.rollback()
+            raise
+
+    @retry_query()
+    def _touch_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        storage_expiration_datetime = datetime.utcnow() + session_lifetime
+
+        # Only update the expiry, the session data is unchanged. An expired or
+        # deleted session is not brought back
+        model = self.sql_session_model
+        try:
+            model.query.filter(
+                model.session_id == store_id, model.expiry > datetime.utcnow()
+            ).update({"expiry": storage_expiration_datetime})
+            self.client.session.commit()
+        except Exception:
+            self.client.session.rollback()
+            raise
+
+    @retry_query()
+    def _rename_session(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        old_store_id: str,
+        new_store_id: str,
+    ) -> None:
+        storage_expiration_datetime = datetime.utcnow() + session_lifetime
+
+        # Serialize session data
+        serialized_session_data = self.serializer.dumps(_stored_data(session))
+
+        # Move the session to its new id and write its data in one statement,
+        # or create it if it is no longer stored
+        values = {
+            "session_id": new_store_id,
+            "data": serialized_session_data,
+            "expiry": storage_expiration_datetime,
+        }
+        if self.owner_key is not None:
+            values["owner"] = _owner_of(session, self.owner_key)
+        try:
+            renamed = self.sql_session_model.query.filter_by(
+                session_id=old_store_id
+            ).update(values)
+            if not renamed:
+                record = self.sql_session_model(
+                    session_id=new_store_id,
+                    data=serialized_session_data,
+                    expiry=storage_expiration_datetime,
+                )
+                if self.owner_key is not None:
+                    record.owner = values["owner"]
+                self.client.session.add(record)
+            self.client.session.commit()
+        except Exception:
+            self.client.session.rollback()
+            raise
+
+    def _iter_serialized_sessions(self, batch_size: int) -> Iterator[Tuple[str, bytes]]:
+        model = self.sql_session_model
+        last_id = None
+        while True:
+            # Page by primary key, so that rewritten rows are not read again
+            query = self.client.session.query(
+                model.id, model.session_id, model.data
+            ).filter(
+                model.session_id.startswith(self.key_prefix, autoescape=True),
+                model.expiry > datetime.utcnow(),
+            )
+            if last_id is not None:
+                query = query.filter(model.id > last_id)
+            rows = query.order_by(model.id).limit(batch_size).all()
+            # End the read transaction before the rows are replaced
+            self.client.session.commit()
+            for row in rows:
+                yield row.session_id, want_bytes(row.data)
+            if len(rows) < batch_size:
+                break
+            last_id = rows[-1].id
+
+    @retry_query()
+    def _count_sessions(self, batch_size: int) -> int:
+        model = self.sql_session_model
+        try:
+            count = (
+                self.client.session.query(func.count(model.id))
+                .filter(
+                    model.session_id.startswith(self.key_prefix, autoescape=True),
+                    model.expiry > datetime.utcnow(),
+                )
+                .scalar()
+            )
+            self.client.session.commit()
+        except Exception:
+            self.client.session.rollback()
+            raise
+        return count
+
+    @retry_query()
+    def _owner_sessions(self, owner: str) -> List[Tuple[str, dict]]:
+        model = self.sql_session_model
+        try:
+            rows = (
+                self.client.session.query(model.session_id, model.data)
+                .filter(
+                    model.owner == owner,
+                    model.session_id.startswith(self.key_prefix, autoescape=True),
+                    model.expiry > datetime.utcnow(),
+                )
+                .all()
+            )
+            self.client.session.commit()
+        except Exception:
+            self.client.session.rollback()
+            raise
+        return [
+            (row.session_id, self.serializer.loads(want_bytes(row.data)))
+            for row in rows
+        ]
+
+    @retry_query()
+    def _replace_serialized_session(
+        self, store_id: str, old_data: bytes, new_data: bytes
+    ) -> bool:
+        try:
+            replaced = self.sql_session_model.query.filter_by(
+                session_id=store_id, data=old_data
+            ).update({"data": new_data}, synchronize_session=False)
             self.client.session.commit()
         except Exception:
             self.client.session.rollback()
             raise
+        return bool(replaced)
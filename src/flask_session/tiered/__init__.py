@@ -0,0 +1 @@
+from .tiered import TieredSession, TieredSessionInterface  # noqa: F401
@@ -0,0 +1,328 @@
+import time
+from datetime import timedelta as TimeDelta
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from flask import Flask
+
+from .._write_behind import WriteBehindQueue
+from ..base import ServerSideSession, ServerSideSessionInterface
+from ..defaults import Defaults
+from ..retry import RetryPolicy
+
+WRITE_MODES = ("write_through", "write_behind")
+
+
+class TieredSession(ServerSideSession):
+    pass
+
+
+class TieredSessionInterface(ServerSideSessionInterface):
+    """Stores sessions in a fast storage, such as Redis, in front of a durable
+    one, such as PostgreSQL.
+
+    Sessions are read from the fast tier, and sessions it misses are read from
+    the durable tier and stored in the fast tier again, until they expire in
+    the durable tier. With
+    ``write_mode="write_through"``, sessions are written to both tiers before
+    the response is sent. With ``write_mode="write_behind"``, they are written
+    to the fast tier, and to the durable tier by background threads. The fast
+    tier can then be restarted or flushed without losing sessions.
+
+    Both tiers are session interfaces, only their storage methods are used.
+    Options such as the local cache and lazy loading are set on the tiered
+    interface.
+
+    :param fast: The session interface of the fast tier.
+    :param durable: The session interface of the durable tier.
+    :param write_mode: ``"write_through"`` or ``"write_behind"``.
+    :param key_prefix: A prefix that is added to all storage keys.
+    :param use_signer: Whether to sign the session id cookie or not.
+    :param permanent: Whether to use permanent session or not.
+    :param sid_length: The length of the generated session id in bytes.
+    :param serialization_format: The serialization format to use for the session data.
+    :param local_cache_size: The maximum number of sessions kept in the in-process cache, 0 disables it.
+    :param local_cache_ttl: The number of seconds a session is served from the in-process cache.
+    :param detect_nested_changes: Whether to detect changes to mutable values nested in the session.
+    :param lazy_loading: Whether to defer loading the session from storage until it is first used.
+    :param refresh_threshold: The fraction of the session lifetime below which its remaining lifetime has to fall before its expiry is extended again.
+    :param write_behind: Whether to write sessions from background threads after the response is sent.
+    :param write_behind_queue_size: The maximum number of pending background writes, further writes are made synchronously. Also used for the writes to the durable tier with ``write_mode="write_behind"``.
+    :param write_behind_workers: The number of background threads writing sessions. Also used for the writes to the durable tier with ``write_mode="write_behind"``.
+    :param compression: The codec used to compress serialized session data, ``"zlib"``, ``"zstd"`` or ``None``.
+    :param compression_threshold: The size in bytes from which serialized session data is compressed.
+    :param compression_dict: A zstd dictionary trained on typical session data.
+    :param session_schema: A ``msgspec.Struct`` or ``TypedDict`` describing the session data.
+    :param retry_policy: How failed queries are retried, see :class:`~flask_session.retry.RetryPolicy`.
+    :param negative_cache_size: The maximum number of unknown session ids remembered in-process, 0 disables it.
+    :param negative_cache_ttl: The number of seconds an unknown session id is remembered.
+    :param owner_key: The session key holding the owner of a session, to look up the sessions of an owner.
+
+    .. versionadded:: 0.9
+    """
+
+    session_class = TieredSession
+    # Each tier takes care of the expiry of its sessions. The cleanup command
+    # is registered below for the tiers that need one
+    ttl = True
+
+    def __init__(
+        self,
+        app: Flask,
+        fast: ServerSideSessionInterface,
+        durable: ServerSideSessionInterface,
+        write_mode: str = Defaults.SESSION_TIERED_WRITE_MODE,
+        key_prefix: str = Defaults.SESSION_KEY_PREFIX,
+        use_signer: bool = Defaults.SESSION_USE_SIGNER,
+        permanent: bool = Defaults.SESSION_PERMANENT,
+        sid_length: int = Defaults.SESSION_ID_LENGTH,
+        serialization_format: str = Defaults.SESSION_SERIALIZATION_FORMAT,
+        local_cache_size: int = Defaults.SESSION_LOCAL_CACHE_SIZE,
+        local_cache_ttl: float = Defaults.SESSION_LOCAL_CACHE_TTL,
+        detect_nested_changes: bool = Defaults.SESSION_DETECT_NESTED_CHANGES,
+        lazy_loading: bool = Defaults.SESSION_LAZY_LOADING,
+        refresh_threshold: Optional[float] = Defaults.SESSION_REFRESH_THRESHOLD,
+        write_behind: bool = Defaults.SESSION_WRITE_BEHIND,
+        write_behind_queue_size: int = Defaults.SESSION_WRITE_BEHIND_QUEUE_SIZE,
+        write_behind_workers: int = Defaults.SESSION_WRITE_BEHIND_WORKERS,
+        compression: Optional[str] = Defaults.SESSION_COMPRESSION,
+        compression_threshold: int = Defaults.SESSION_COMPRESSION_THRESHOLD,
+        compression_dict: Optional[bytes] = Defaults.SESSION_COMPRESSION_DICT,
+        session_schema: Optional[type] = Defaults.SESSION_SCHEMA,
+        retry_policy: Optional[RetryPolicy] = Defaults.SESSION_RETRY_POLICY,
+        negative_cache_size: int = Defaults.SESSION_NEGATIVE_CACHE_SIZE,
+        negative_cache_ttl: float = Defaults.SESSION_NEGATIVE_CACHE_TTL,
+        owner_key: Optional[str] = Defaults.SESSION_OWNER_KEY,
+    ):
+        if write_mode not in WRITE_MODES:
+            raise ValueError(f"Unsupported SESSION_TIERED_WRITE_MODE: {write_mode}")
+        self.fast = fast
+        self.durable = durable
+        self.write_mode = write_mode
+        # Writes to the durable tier, in the order they were made for each session
+        self.durable_queue = (
+            WriteBehindQueue(
+                maxsize=write_behind_queue_size, workers=write_behind_workers
+            )
+            if write_mode == "write_behind"
+            else None
+        )
+
+        super().__init__(
+            app=app,
+            key_prefix=key_prefix,
+            use_signer=use_signer,
+            permanent=permanent,
+            sid_length=sid_length,
+            serialization_format=serialization_format,
+            local_cache_size=local_cache_size,
+            local_cache_ttl=local_cache_ttl,
+            detect_nested_changes=detect_nested_changes,
+            lazy_loading=lazy_loading,
+            refresh_threshold=refresh_threshold,
+            write_behind=write_behind,
+            write_behind_queue_size=write_behind_queue_size,
+            write_behind_workers=write_behind_workers,
+            compression=compression,
+            compression_threshold=compression_threshold,
+            compression_dict=compression_dict,
+            session_schema=session_schema,
+            retry_policy=retry_policy,
+            negative_cache_size=negative_cache_size,
+            negative_cache_ttl=negative_cache_ttl,
+            owner_key=owner_key,
+        )
+
+        # The tiers registered their commands on the same app, each replacing
+        # the one registered before. Register them again to run on every tier
+        if any(map(_can_migrate_format, self._tiers)):
+            self._register_migrate_format_app_command()
+        if any(map(_needs_cleanup, self._tiers)):
+            self._register_cleanup_app_command()
+
+    @property
+    def _tiers(self) -> Tuple[ServerSideSessionInterface, ServerSideSessionInterface]:
+        return self.fast, self.durable
+
+    def _write_durable(self, store_id: str, write: Callable[[], None]) -> None:
+        """Write to the durable tier now, or in the background with
+        ``write_mode="write_behind"`` unless the queue is full."""
+        if self.durable_queue is None:
+            write()
+            return
+
+        def job() -> None:
+            with self.app.app_context():
+                try:
+                    write()
+                except Exception:
+                    self.app.logger.exception(
+                        "Failed to write session to the durable tier"
+                    )
+                    raise
+
+        if not self.durable_queue.submit(store_id, job):
+            # Keep the writes for this session in order
+            self.durable_queue.wait(store_id)
+            write()
+
+    def _write_fast(
+        self,
+        store_id: str,
+        write: Callable[[], None],
+        old_store_id: Optional[str] = None,
+    ) -> None:
+        """Write to the fast tier. If it fails, the session is removed from it,
+        also under its old store id when it is renamed, so that it is read from
+        the durable tier next time."""
+        try:
+            write()
+        except Exception:
+            if self.durable_queue is not None:
+                # The fast tier holds the only up to date copy for now
+                raise
+            self.app.logger.exception("Failed to write session to the fast tier")
+            try:
+                self.fast._delete_session(store_id)
+                if old_store_id is not None:
+                    self.fast._delete_session(old_store_id)
+            except Exception:
+                self.app.logger.exception("Failed to remove session from the fast tier")
+
+    def _retrieve_session_data(self, store_id: str) -> Optional[dict]:
+        try:
+            session_data = self.fast._retrieve_session_data(store_id)
+        except Exception:
+            self.app.logger.exception("Failed to read session from the fast tier")
+            session_data = None
+        if session_data is not None:
+            return session_data
+
+        if self.durable_queue is not None:
+            # Read the background writes made by this process
+            self.durable_queue.wait(store_id)
+        session_data = self.durable._retrieve_session_data(store_id)
+        if session_data is None:
+            return None
+
+        # Store the session in the fast tier again, until it expires in the
+        # durable tier. Durable tiers that can not tell when that is get the
+        # whole session lifetime.
+        session = self.session_class(session_data, sid=store_id[len(self.key_prefix) :])
+        try:
+            session_lifetime = self.durable._retrieve_session_lifetime(store_id)
+            if session_lifetime is None:
+                session_lifetime = self.app.permanent_session_lifetime
+            self.fast._upsert_session(session_lifetime, session, store_id)
+        except Exception:
+            self.app.logger.exception("Failed to write session to the fast tier")
+        return session_data
+
+    def _delete_session(self, store_id: str) -> None:
+        self._write_durable(store_id, lambda: self.durable._delete_session(store_id))
+        self._write_fast(store_id, lambda: self.fast._delete_session(store_id))
+
+    def _upsert_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        self._write_durable(
+            store_id,
+            lambda: self.durable._upsert_session(session_lifetime, session, store_id),
+        )
+        self._write_fast(
+            store_id,
+            lambda: self.fast._upsert_session(session_lifetime, session, store_id),
+        )
+
+    def _touch_session(
+        self, session_lifetime: TimeDelta, session: ServerSideSession, store_id: str
+    ) -> None:
+        self._write_durable(
+            store_id,
+            lambda: self.durable._touch_session(session_lifetime, session, store_id),
+        )
+        self._write_fast(
+            store_id,
+            lambda: self.fast._touch_session(session_lifetime, session, store_id),
+        )
+
+    def _rename_session(
+        self,
+        session_lifetime: TimeDelta,
+        session: ServerSideSession,
+        old_store_id: str,
+        new_store_id: str,
+    ) -> None:
+        if self.durable_queue is not None:
+            # Keep the writes for the old session in order
+            self.durable_queue.wait(old_store_id)
+        self._write_durable(
+            new_store_id,
+            lambda: self.durable._rename_session(
+                session_lifetime, session, old_store_id, new_store_id
+            ),
+        )
+        self._write_fast(
+            new_store_id,
+            lambda: self.fast._rename_session(
+                session_lifetime, session, old_store_id, new_store_id
+            ),
+            old_store_id,
+        )
+
+    def _iter_session_data(self, batch_size: int) -> Iterator[Tuple[str, dict]]:
+        # The durable tier holds every session
+        return self.durable._iter_session_data(batch_size)
+
+    def _count_sessions(self, batch_size: int) -> int:
+        return self.durable._count_sessions(batch_size)
+
+    def _owner_sessions(self, owner: str) -> List[Tuple[str, dict]]:
+        return self.durable._owner_sessions(owner)
+
+    def _migrate_format(self, batch_size: int = 100) -> Tuple[int, int, int]:
+        scanned = migrated = failed = 0
+        for tier in filter(_can_migrate_format, self._tiers):
+            tier_scanned, tier_migrated, tier_failed = tier._migrate_format(batch_size)
+            scanned += tier_scanned
+            migrated += tier_migrated
+            failed += tier_failed
+        return scanned, migrated, failed
+
+    def _delete_expired_sessions(
+        self,
+        batch_size: Optional[int] = None,
+        time_budget: Optional[float] = None,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> Tuple[int, bool]:
+        # The tiers share the time budget, each uses its own cleanup settings
+        deadline = None if time_budget is None else time.monotonic() + time_budget
+        deleted = 0
+
+        def report(tier_deleted: int) -> None:
+            # Include the sessions deleted from the tiers cleaned up before
+            progress(deleted + tier_deleted)
+
+        for tier in filter(_needs_cleanup, self._tiers):
+            remaining = None if deadline is None else deadline - time.monotonic()
+            tier_deleted, finished = tier._delete_expired_sessions(
+                batch_size=batch_size,
+                time_budget=None if remaining is None else max(remaining, 0),
+                progress=None if progress is None else report,
+            )
+            deleted += tier_deleted
+            if not finished:
+                return deleted, False
+        return deleted, True
+
+
+def _can_migrate_format(tier: ServerSideSessionInterface) -> bool:
+    # Only tiers that can list their sessions migrate them
+    return (
+        type(tier)._iter_serialized_sessions
+        is not ServerSideSessionInterface._iter_serialized_sessions
+    )
+
+
+def _needs_cleanup(tier: ServerSideSessionInterface) -> bool:
+    # Only tiers that do not expire sessions on their own delete expired ones
+    return getattr(tier, "ttl", None) is False
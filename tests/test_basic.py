@@ -1,6 +1,18 @@
+import pickle
+import threading
+import time
+from typing import List, Union
+from unittest import mock
+
 import flask
 import flask_session
+import msgspec
 import pytest
+from cachelib import SimpleCache
+from flask_session._sharding import HashRing
+from flask_session.base import MsgSpecSerializer
+from flask_session.retry import CircuitOpenError, RetryPolicy
+from flask_session.signals import session_operation
 
 
 def test_null_session():
@@ -9,3 +21,555 @@ def test_null_session():
         app = flask.Flask(__name__)
         app.secret_key = "alsdkfjaldkjsf"
         flask_session.Session(app)
+
+
+def test_local_cache(app_utils):
+    """Sessions are served from the in-process cache until they expire"""
+    app = app_utils.create_app(
+        {
+            "SESSION_TYPE": "cachelib",
+            "SESSION_CACHELIB": SimpleCache(),
+            "SESSION_LOCAL_CACHE_SIZE": 1,
+            "SESSION_LOCAL_CACHE_TTL": 60,
+        }
+    )
+    local_cache = app.session_interface.local_cache
+    client = app.test_client()
+
+    client.post("/set", data={"value": "42"})
+    assert client.get("/get").data == b"42"
+    assert local_cache.hits == 1
+
+    # Changes made behind the back of this process are not seen
+    sid = client.get_cookie("session").value
+    app.session_interface.cache.set(f"session:{sid}", {"value": "43"})
+    assert client.get("/get").data == b"42"
+
+    # Writes and deletes in this process keep the cache up to date
+    client.post("/modify", data={"value": "44"})
+    assert client.get("/get").data == b"44"
+    client.post("/delete")
+    assert client.get("/get").data == b"no value set"
+
+    # The least recently used session is evicted
+    client.post("/set", data={"value": "45"})
+    app.test_client().post("/set", data={"value": "46"})
+    assert local_cache.evictions == 1
+    assert len(local_cache) == 1
+
+
+def test_negative_cache(app_utils):
+    """Unknown session ids are not looked up again until they expire"""
+    app = app_utils.create_app(
+        {
+            "SESSION_TYPE": "cachelib",
+            "SESSION_CACHELIB": SimpleCache(),
+            "SESSION_NEGATIVE_CACHE_SIZE": 10,
+            "SESSION_NEGATIVE_CACHE_TTL": 60,
+        }
+    )
+    interface = app.session_interface
+    client = app.test_client()
+    client.set_cookie("session", "unknown")
+
+    with mock.patch.object(
+        interface, "_retrieve_session_data", wraps=interface._retrieve_session_data
+    ) as retrieve:
+        assert client.get("/get").data == b"no value set"
+        assert client.get("/get").data == b"no value set"
+        assert retrieve.call_count == 1
+
+        # Saving the session id in this process forgets that it was missing
+        session = interface.session_class({"value": "42"}, sid="unknown")
+        interface._save_session_data(
+            app.permanent_session_lifetime, session, "session:unknown"
+        )
+        assert client.get("/get").data == b"42"
+        assert retrieve.call_count == 2
+
+        # Deleted sessions are remembered as missing
+        client.post("/delete")
+        assert retrieve.call_count == 3
+        assert client.get("/get").data == b"no value set"
+        assert retrieve.call_count == 3
+
+
+def test_regenerate(app_utils):
+    """The session is moved to the regenerated session id when it is saved"""
+    app = app_utils.create_app(
+        {"SESSION_TYPE": "cachelib", "SESSION_CACHELIB": SimpleCache()}
+    )
+
+    @app.route("/regenerate", methods=["POST"])
+    def app_regenerate():
+        app.session_interface.regenerate(flask.session)
+        flask.session["value"] = "43"
+        app.session_interface.regenerate(flask.session)
+        return "regenerated"
+
+    interface = app.session_interface
+    client = app.test_client()
+    client.post("/set", data={"value": "42"})
+    old_sid = client.get_cookie("session").value
+
+    with mock.patch.object(
+        interface, "_rename_session", wraps=interface._rename_session
+    ) as rename:
+        client.post("/regenerate")
+        new_sid = client.get_cookie("session").value
+        rename.assert_called_once()
+        assert rename.call_args.args[2:] == (f"session:{old_sid}", f"session:{new_sid}")
+
+    assert new_sid != old_sid
+    assert interface.cache.get(f"session:{old_sid}") is None
+    assert client.get("/get").data == b"43"
+
+
+def test_bulk_operations(app_utils):
+    """Stored sessions can be listed, counted and deleted without a request"""
+    app = app_utils.create_app(
+        {"SESSION_TYPE": "cachelib", "SESSION_CACHELIB": SimpleCache()}
+    )
+    interface = app.session_interface
+    for value in ("41", "42", "42"):
+        client = app.test_client()
+        client.post("/set", data={"value": value})
+
+    with app.app_context():
+        sessions = dict(interface.iter_sessions(batch_size=2))
+        assert sorted(data["value"] for data in sessions.values()) == [
+            "41",
+            "42",
+            "42",
+        ]
+        assert interface.count_sessions() == 3
+
+        deleted = interface.delete_sessions(lambda sid, data: data["value"] == "42")
+        assert deleted == 2
+        assert [data["value"] for _, data in interface.iter_sessions()] == ["41"]
+        assert interface.count_sessions() == 1
+
+
+def test_sessions_by_owner(app_utils):
+    """The sessions of an owner can be listed and revoked"""
+    app = app_utils.create_app(
+        {
+            "SESSION_TYPE": "cachelib",
+            "SESSION_CACHELIB": SimpleCache(),
+            "SESSION_OWNER_KEY": "value",
+        }
+    )
+    interface = app.session_interface
+    clients = [app.test_client() for _ in range(3)]
+    for client, value in zip(clients, ("41", "42", "42")):
+        client.post("/set", data={"value": value})
+
+    with app.app_context():
+        assert len(interface.sessions_for("42")) == 2
+        assert interface.sessions_for(41) == [
+            (clients[0].get_cookie("session").value, {"value": "41"})
+        ]
+        assert interface.revoke_all("42") == 2
+        assert interface.sessions_for("42") == []
+    assert clients[1].get("/get").data == b"no value set"
+    assert clients[0].get("/get").data == b"41"
+
+
+def test_unchanged_session_is_not_rewritten(app_utils):
+    """Reassigning an equal value only extends the expiry of the stored session"""
+    app = app_utils.create_app(
+        {"SESSION_TYPE": "cachelib", "SESSION_CACHELIB": SimpleCache()}
+    )
+    interface = app.session_interface
+    with mock.patch.object(
+        interface, "_upsert_session", wraps=interface._upsert_session
+    ) as upsert, mock.patch.object(
+        interface, "_touch_session", wraps=interface._touch_session
+    ) as touch:
+        client = app.test_client()
+        client.post("/set", data={"value": "42"})
+        assert upsert.call_count == 1
+
+        client.post("/set", data={"value": "42"})
+        assert upsert.call_count == 2  # the default touch rewrites the session
+        assert touch.call_count == 1
+
+        client.post("/set", data={"value": "43"})
+        assert upsert.call_count == 3
+        assert touch.call_count == 1
+        assert client.get("/get").data == b"43"
+
+
+@pytest.mark.filterwarnings("ignore:No valid SQLAlchemy instance provided")
+def test_loaded_session_is_compared_as_stored(app_utils):
+    """The session is only encoded again to tell whether it changed when it is
+    saved, not when it is loaded"""
+    app = app_utils.create_app(
+        {
+            "SESSION_TYPE": "sqlalchemy",
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///",
+            "SESSION_REFRESH_EACH_REQUEST": False,
+        }
+    )
+    interface = app.session_interface
+    client = app.test_client()
+    with app.app_context():
+        client.post("/set", data={"value": "42"})
+        with mock.patch.object(
+            interface.serializer, "encode", wraps=interface.serializer.encode
+        ) as encode, mock.patch.object(
+            interface, "_upsert_session", wraps=interface._upsert_session
+        ) as upsert:
+            assert client.get("/get").data == b"42"
+            assert encode.call_count == 0
+
+            client.post("/set", data={"value": "42"})
+            assert encode.call_count == 1
+            assert upsert.call_count == 0
+
+            client.post("/set", data={"value": "43"})
+            assert upsert.call_count == 1
+            assert client.get("/get").data == b"43"
+
+
+@pytest.mark.parametrize("detect_nested_changes", [True, False])
+def test_detect_nested_changes(app_utils, detect_nested_changes):
+    """Changes to nested values are saved without setting modified manually"""
+    app = app_utils.create_app(
+        {
+            "SESSION_TYPE": "cachelib",
+            "SESSION_CACHELIB": SimpleCache(),
+            "SESSION_DETECT_NESTED_CHANGES": detect_nested_changes,
+            "SESSION_REFRESH_EACH_REQUEST": False,
+        }
+    )
+
+    @app.route("/append", methods=["POST"])
+    def app_append():
+        flask.session.setdefault("items", [])
+        flask.session["items"].append(flask.request.form["value"])
+        return "value appended"
+
+    @app.route("/items")
+    def app_items():
+        return ",".join(flask.session.get("items", []))
+
+    client = app.test_client()
+    client.post("/append", data={"value": "a"})
+    client.post("/append", data={"value": "b"})
+    expected = b"a,b" if detect_nested_changes else b"a"
+    assert client.get("/items").data == expected
+
+
+def test_lazy_loading(app_utils):
+    """Sessions are only loaded from storage when they are used"""
+    app = app_utils.create_app(
+        {
+            "SESSION_TYPE": "cachelib",
+            "SESSION_CACHELIB": SimpleCache(),
+            "SESSION_LAZY_LOADING": True,
+        }
+    )
+    interface = app.session_interface
+    with mock.patch.object(
+        interface, "_retrieve_session_data", wraps=interface._retrieve_session_data
+    ) as retrieve, mock.patch.object(
+        interface, "_touch_session", wraps=interface._touch_session
+    ) as touch:
+        client = app.test_client()
+        client.post("/set", data={"value": "42"})
+
+        # The session is not used, so it is neither loaded nor saved
+        rv = client.get("/")
+        assert "Vary" not in rv.headers
+        assert retrieve.call_count == 0
+        assert touch.call_count == 0
+
+        assert client.get("/get").data == b"42"
+        assert retrieve.call_count == 1
+        assert touch.call_count == 1
+
+        # A missing session is replaced by a new one with a different id
+        sid = client.get_cookie("session").value
+        interface.cache.delete(f"session:{sid}")
+        client.post("/set", data={"value": "43"})
+        assert client.get_cookie("session").value != sid
+        assert client.get("/get").data == b"43"
+
+
+def test_refresh_threshold(app_utils):
+    """The expiry is only extended once the remaining lifetime falls below the
+    threshold"""
+    app = app_utils.create_app(
+        {
+            "SESSION_TYPE": "cachelib",
+            "SESSION_CACHELIB": SimpleCache(),
+            "SESSION_REFRESH_THRESHOLD": 0.1,
+            "PERMANENT_SESSION_LIFETIME": 100,
+        }
+    )
+
+    @app.route("/keys")
+    def app_keys():
+        return ",".join(sorted(flask.session))
+
+    interface = app.session_interface
+    interface.permanent = True
+    client = app.test_client()
+    with mock.patch(
+        "flask_session.base.time.time", return_value=1000
+    ), mock.patch.object(
+        interface, "_upsert_session", wraps=interface._upsert_session
+    ) as upsert, mock.patch.object(
+        interface, "_touch_session_data", wraps=interface._touch_session_data
+    ) as touch:
+        rv = client.post("/set", data={"value": "42"})
+        assert "Set-Cookie" in rv.headers
+        assert upsert.call_count == 1
+        store_id = f"session:{client.get_cookie('session').value}"
+        assert interface.cache.get(store_id)["_refreshed"] == 1000
+
+        # The refresh time is not part of the session data
+        assert client.get("/keys").data == b"_permanent,value"
+
+        # Before the threshold neither the storage nor the cookie are written
+        with mock.patch("flask_session.base.time.time", return_value=1090):
+            rv = client.get("/get")
+        assert rv.data == b"42"
+        assert "Set-Cookie" not in rv.headers
+        assert upsert.call_count == 1
+
+        # Once it has passed, the unchanged session is touched and the cookie set
+        with mock.patch("flask_session.base.time.time", return_value=1091):
+            rv = client.get("/get")
+        assert "Set-Cookie" in rv.headers
+        assert touch.call_count == 1
+        assert interface.cache.get(store_id)["_refreshed"] == 1091
+
+        # The refresh time does not keep an otherwise empty session alive
+        rv = client.post("/delete")
+        assert interface.cache.get(store_id) is None
+
+
+@pytest.mark.parametrize("queue_size", [10, 0])
+def test_write_behind(app_utils, queue_size):
+    """Sessions are written by a background thread unless the queue is full"""
+    app = app_utils.create_app(
+        {
+            "SESSION_TYPE": "cachelib",
+            "SESSION_CACHELIB": SimpleCache(),
+            "SESSION_WRITE_BEHIND": True,
+            "SESSION_WRITE_BEHIND_QUEUE_SIZE": queue_size,
+        }
+    )
+    interface = app.session_interface
+    writers = []
+
+    def upsert(*args):
+        writers.append(threading.current_thread())
+        interface.__class__._upsert_session(interface, *args)
+
+    with mock.patch.object(interface, "_upsert_session", side_effect=upsert):
+        client = app.test_client()
+        for value in ["42", "43"]:
+            client.post("/set", data={"value": value})
+            # Reads wait for the pending write of the same session
+            assert client.get("/get").data == value.encode()
+
+    assert interface.write_behind.flush(timeout=5)
+    if queue_size:
+        assert threading.main_thread() not in writers
+        assert interface.write_behind.completed >= 2
+        assert interface.write_behind.rejected == 0
+    else:
+        assert writers == [threading.main_thread()] * len(writers)
+        assert interface.write_behind.submitted == 0
+        assert interface.write_behind.rejected >= 2
+
+
+@pytest.mark.parametrize("compression", ["zlib", "zstd"])
+@pytest.mark.parametrize("format", ["msgpack", "json"])
+def test_compression(compression, format):
+    """Large session data is compressed, and compressed and uncompressed data can
+    be read with any settings"""
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    app = flask.Flask(__name__)
+    serializer = MsgSpecSerializer(
+        app, format, compression=compression, compression_threshold=100
+    )
+    plain_serializer = MsgSpecSerializer(app, format)
+
+    small = {"value": "42"}
+    assert serializer.dumps(small) == plain_serializer.dumps(small)
+
+    large = {"value": "42" * 1000, "items": list(range(100))}
+    compressed = serializer.dumps(large)
+    assert compressed[0] == 0xC1
+    assert len(compressed) < len(plain_serializer.dumps(large))
+    assert serializer.loads(compressed) == large
+    assert plain_serializer.loads(compressed) == large
+    assert serializer.loads(plain_serializer.dumps(large)) == large
+
+
+class SessionSchema(msgspec.Struct):
+    user_id: Union[int, msgspec.UnsetType] = msgspec.UNSET
+    roles: Union[List[str], msgspec.UnsetType] = msgspec.UNSET
+
+
+@pytest.mark.parametrize("format", ["msgpack", "json"])
+def test_session_schema(app_utils, format):
+    """Keys of the schema are validated, other keys are kept as they are, and
+    sessions stored with or without a schema can be read either way"""
+    app = flask.Flask(__name__)
+    serializer = MsgSpecSerializer(app, format, schema=SessionSchema)
+    plain_serializer = MsgSpecSerializer(app, format)
+
+    data = {"user_id": 1, "roles": ["admin"], "_permanent": True}
+    assert serializer.loads(serializer.dumps(data)) == data
+    assert plain_serializer.loads(serializer.dumps(data)) == data
+    assert serializer.loads(plain_serializer.dumps(data)) == data
+    assert serializer.loads(serializer.dumps({"value": "42"})) == {"value": "42"}
+
+    with pytest.raises(msgspec.ValidationError):
+        serializer.loads(serializer.dumps({"user_id": "1"}))
+
+    app = app_utils.create_app(
+        {
+            "SESSION_TYPE": "cachelib",
+            "SESSION_CACHELIB": SimpleCache(),
+            "SESSION_SCHEMA": SessionSchema,
+        }
+    )
+    app_utils.test_session(app)
+
+
+@pytest.mark.parametrize("format", ["msgpack", "json"])
+def test_loads_sniffs_format(format):
+    """Session data is decoded in the format it was written in, including
+    legacy pickle data"""
+    app = flask.Flask(__name__)
+    serializer = MsgSpecSerializer(app, format)
+    data = {"value": "42"}
+    for serialized_data, data_format in [
+        (msgspec.msgpack.encode(data), "msgpack"),
+        (msgspec.msgpack.encode({}), "msgpack"),
+        (msgspec.json.encode(data), "json"),
+        (pickle.dumps(data), "pickle"),
+        (pickle.dumps(data, protocol=0), "pickle"),
+    ]:
+        assert serializer.format_of(serialized_data) == data_format
+        assert serializer.loads(serialized_data) in (data, {})
+        # As returned by drivers that read binary columns as a memoryview
+        assert serializer.format_of(memoryview(serialized_data)) == data_format
+        assert serializer.loads(memoryview(serialized_data)) in (data, {})
+        # Other data is not copied
+        assert serializer._maybe_decompress(serialized_data) is serialized_data
+
+
+@pytest.mark.filterwarnings("ignore:No valid SQLAlchemy instance provided")
+def test_session_operation_signal(app_utils):
+    """Storage operations are reported with their backend, size and outcome"""
+    app = app_utils.create_app(
+        {
+            "SESSION_TYPE": "sqlalchemy",
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///",
+            "SESSION_LOCAL_CACHE_SIZE": 10,
+        }
+    )
+    interface = app.session_interface
+    operations = []
+
+    def record(sender, **kwargs):
+        assert sender is interface
+        operations.append(kwargs)
+
+    client = app.test_client()
+    with app.app_context(), session_operation.connected_to(record):
+        client.post("/set", data={"value": "42"})
+        interface.local_cache.clear()
+        assert client.get("/get").data == b"42"
+        assert client.get("/get").data == b"42"
+
+    assert [(op["operation"], op["outcome"]) for op in operations] == [
+        ("upsert", "ok"),
+        ("local_cache", "miss"),
+        ("retrieve", "hit"),
+        ("touch", "ok"),
+        ("local_cache", "hit"),
+        ("touch", "ok"),
+    ]
+    upsert, _, retrieve, *_ = operations
+    assert upsert["backend"] == "sqlalchemy"
+    assert upsert["size"] == retrieve["size"] > 0
+    assert all(op["duration"] >= 0 and op["attempts"] == 1 for op in operations)
+
+    # Nothing is measured without receivers
+    assert not session_operation.receivers
+    with app.app_context():
+        client.get("/get")
+    assert len(operations) == 6
+
+
+def test_retry_policy():
+    """Only retryable exceptions are retried, within the deadline, and the
+    circuit breaker fails fast until the storage recovers"""
+    app = flask.Flask(__name__)
+    calls = []
+
+    def query(*errors):
+        calls.append(None)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return "ok"
+
+    def call(policy, *errors):
+        calls.clear()
+        return policy.call(query, errors, {}, (ConnectionError,))
+
+    with app.app_context():
+        policy = RetryPolicy(delay=0, jitter=False, failure_threshold=None)
+        assert call(policy, ConnectionError(), ConnectionError()) == "ok"
+        assert len(calls) == 3
+        with pytest.raises(ConnectionError):
+            call(policy, *[ConnectionError()] * 3)
+        with pytest.raises(ValueError):
+            call(policy, ValueError())
+        assert len(calls) == 1
+
+        # No retry is made past the deadline
+        policy = RetryPolicy(delay=10, jitter=False, deadline=1)
+        with pytest.raises(ConnectionError):
+            call(policy, ConnectionError())
+        assert len(calls) == 1
+
+        policy = RetryPolicy(max_attempts=1, failure_threshold=2, reset_timeout=0.05)
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                call(policy, ConnectionError())
+        with pytest.raises(CircuitOpenError):
+            call(policy)
+        assert not calls
+
+        # A single call probes the storage after the reset timeout
+        time.sleep(0.05)
+        with pytest.raises(ConnectionError):
+            call(policy, ConnectionError())
+        with pytest.raises(CircuitOpenError):
+            call(policy)
+        time.sleep(0.05)
+        assert call(policy) == "ok"
+        assert call(policy) == "ok"
+
+
+def test_hash_ring():
+    keys = [f"session:{i}" for i in range(10000)]
+    ring = HashRing(4)
+    nodes = [ring.get_node(key) for key in keys]
+    assert all(1500 < nodes.count(node) < 3500 for node in range(4))
+
+    # Adding a node only moves keys to it
+    grown = HashRing(5)
+    moved = [key for key, node in zip(keys, nodes) if grown.get_node(key) != node]
+    assert all(grown.get_node(key) == 4 for key in moved)
+    assert 1000 < len(moved) < 3000
@@ -3,7 +3,9 @@ import shutil
 from contextlib import contextmanager
 
 import flask
+import pytest
 from cachelib.file import FileSystemCache
+from cachelib.simple import SimpleCache
 from flask_session.cachelib import CacheLibSession
 
 
@@ -46,3 +48,27 @@ class TestCachelibSession:
             session_id = cookie.split(";")[0].split("=")[1]
             stored_session = self.retrieve_stored_session(f"session:{session_id}", app)
             assert stored_session.get("value") == "44"
+
+    def test_iter_sessions(self, app_utils):
+        app = app_utils.create_app(
+            {"SESSION_TYPE": "cachelib", "SESSION_CACHELIB": SimpleCache()}
+        )
+        with app.app_context():
+            interface = app.session_interface
+            session = CacheLibSession({"value": "42"}, sid="a")
+            interface._upsert_session(
+                app.permanent_session_lifetime, session, "session:a"
+            )
+            assert list(interface.iter_sessions()) == [("a", {"value": "42"})]
+
+        # Other caches can not list the sessions they store
+        app = app_utils.create_app(
+            {
+                "SESSION_TYPE": "cachelib",
+                "SESSION_CACHELIB": FileSystemCache(cache_dir=self.session_dir),
+            }
+        )
+        with self.setup_filesystem(), app.app_context(), pytest.raises(
+            NotImplementedError, match="SimpleCache"
+        ):
+            list(app.session_interface.iter_sessions())
@@ -1,5 +1,6 @@
 import json
 from contextlib import contextmanager
+from datetime import timedelta
 
 import flask
 from itsdangerous import want_bytes
@@ -48,3 +49,19 @@ class TestPostgreSql:
                 json.loads(byte_string.decode("utf-8")) if byte_string else {}
             )
             assert stored_session.get("value") == "44"
+
+    def test_postgresql_expired_read(self, app_utils):
+        with self.setup_postgresql(app_utils), self.app.app_context():
+            interface = self.app.session_interface
+            # Queries are rendered once
+            assert isinstance(interface._queries.retrieve_session_data, str)
+
+            session = PostgreSqlSession({"value": "42"}, sid="expired")
+            interface._upsert_session(timedelta(seconds=-1), session, "session:expired")
+            # Expired sessions are not read, but left to the cleanup
+            assert interface._retrieve_session_data("session:expired") is None
+            # Nor brought back by extending their expiry
+            interface._touch_session(timedelta(hours=1), session, "session:expired")
+            assert interface._retrieve_session_data("session:expired") is None
+            assert interface._retrieve_session_lifetime("session:expired") is None
+            assert interface._delete_expired_batch(10) == 1
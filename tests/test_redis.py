@@ -1,9 +1,12 @@
+import asyncio
 import json
 from contextlib import contextmanager
 
 import flask
-from flask_session.redis import RedisSession
+import pytest
+from flask_session.redis import AsyncRedisSessionInterface, RedisSession
 from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 
 
 class TestRedisSession:
@@ -40,3 +43,185 @@ class TestRedisSession:
                     json.loads(byte_string.decode("utf-8")) if byte_string else {}
                 )
                 assert stored_session.get("value") == "44"
+
+    def test_redis_touch_keeps_deleted_session_gone(self, app_utils):
+        with self.setup_redis():
+            app = app_utils.create_app(
+                {"SESSION_TYPE": "redis", "SESSION_REDIS": self.r}
+            )
+
+            @app.route("/logout_elsewhere")
+            def logout_elsewhere():
+                value = flask.session.get("value")
+                # Another request logs the session out before this one is saved
+                self.r.delete(f"session:{flask.session.sid}")
+                return value
+
+            client = app.test_client()
+            client.post("/set", data={"value": "42"})
+            assert client.get("/logout_elsewhere").data == b"42"
+            assert self.r.keys("session:*") == []
+            assert client.get("/get").data == b"no value set"
+
+    def test_redis_delta_writes(self, app_utils):
+        with self.setup_redis():
+            app = app_utils.create_app(
+                {
+                    "SESSION_TYPE": "redis",
+                    "SESSION_REDIS": self.r,
+                    "SESSION_DELTA_WRITES": True,
+                }
+            )
+
+            with app.test_request_context():
+                app_utils.test_session(app)
+
+            client = app.test_client()
+            client.post("/set", data={"value": "42"})
+            session_id = client.get_cookie("session").value
+            key = f"session:{session_id}"
+            assert self.r.type(key) == b"hash"
+            assert self.r.hgetall(key) == {b"value": b'"42"'}
+
+            client.post("/set", data={"value": "44"})
+            assert client.get("/get").data == b"44"
+            client.post("/delete")
+            assert not self.r.exists(key)
+
+    def test_redis_sharding(self, app_utils):
+        with self.setup_redis():
+            shards = [Redis(db=0), Redis(db=1)]
+            app = app_utils.create_app(
+                {
+                    "SESSION_TYPE": "redis",
+                    "SESSION_REDIS": shards[:1],
+                    "SESSION_SHARD_HINTS": True,
+                }
+            )
+            client = app.test_client()
+            client.post("/set", data={"value": "42"})
+            hinted_sid = client.get_cookie("session").value
+            assert hinted_sid.startswith("0.")
+
+            # A session created without a shard hint
+            self.r.set("session:unhinted", json.dumps({"value": "43"}), ex=60)
+
+            app = app_utils.create_app(
+                {
+                    "SESSION_TYPE": "redis",
+                    "SESSION_REDIS": shards,
+                    "SESSION_SHARD_HINTS": True,
+                }
+            )
+            interface = app.session_interface
+            client = app.test_client()
+            client.set_cookie("session", hinted_sid)
+            assert client.get("/get").data == b"42"
+
+            target = interface._shard_index("session:unhinted")
+            assert interface._rebalance() == (2, 1 if target else 0)
+            assert shards[target].get("session:unhinted") is not None
+            assert 0 < shards[target].ttl("session:unhinted") <= 60
+            client.set_cookie("session", "unhinted")
+            assert client.get("/get").data == b"43"
+            shards[1].flushdb()
+
+    def test_redis_sharding_merges_owner_index(self, app_utils):
+        with self.setup_redis():
+            shards = [Redis(db=0), Redis(db=1)]
+            app = app_utils.create_app(
+                {
+                    "SESSION_TYPE": "redis",
+                    "SESSION_REDIS": shards,
+                    "SESSION_OWNER_KEY": "value",
+                }
+            )
+            interface = app.session_interface
+            index_key = "owner:session:42"
+            target = interface._shard_index(index_key)
+            source = 1 - target
+
+            # Written to both clients, before and after the target was added
+            shards[source].sadd(index_key, "session:a")
+            shards[source].expire(index_key, 600)
+            shards[target].sadd(index_key, "session:b")
+            shards[target].expire(index_key, 60)
+
+            assert interface._rebalance() == (1, 1)
+            assert not shards[source].exists(index_key)
+            assert shards[target].smembers(index_key) == {b"session:a", b"session:b"}
+            assert 60 < shards[target].ttl(index_key) <= 600
+            shards[1].flushdb()
+
+    def test_redis_owner_index(self, app_utils):
+        with self.setup_redis():
+            app = app_utils.create_app(
+                {
+                    "SESSION_TYPE": "redis",
+                    "SESSION_REDIS": self.r,
+                    "SESSION_OWNER_KEY": "value",
+                }
+            )
+            interface = app.session_interface
+
+            @app.route("/logout_elsewhere")
+            def logout_elsewhere():
+                self.r.delete(f"session:{flask.session.sid}")
+                return flask.session.get("value")
+
+            client = app.test_client()
+            client.post("/set", data={"value": "42"})
+            sid = client.get_cookie("session").value
+            assert self.r.smembers("owner:session:42") == {f"session:{sid}".encode()}
+            assert 0 < self.r.ttl("owner:session:42") <= 31 * 24 * 3600
+
+            # A session deleted before it is touched is dropped from the index
+            assert client.get("/logout_elsewhere").data == b"42"
+            assert self.r.smembers("owner:session:42") == set()
+
+            # Sessions whose owner changed are dropped from the index when read
+            client.post("/set", data={"value": "42"})
+            client.post("/set", data={"value": "43"})
+            with app.app_context():
+                assert interface.sessions_for("42") == []
+                assert self.r.smembers("owner:session:42") == set()
+                assert interface.revoke_all("43") == 1
+            assert not self.r.exists("owner:session:43")
+            assert client.get("/get").data == b"no value set"
+
+    def test_redis_async(self):
+        quart = pytest.importorskip("quart")
+
+        async def run():
+            client = AsyncRedis()
+            await client.flushall()
+            app = quart.Quart(__name__)
+            app.session_interface = AsyncRedisSessionInterface(app, client=client)
+
+            @app.route("/set", methods=["POST"])
+            async def app_set():
+                quart.session["value"] = (await quart.request.form)["value"]
+                return "value set"
+
+            @app.route("/get")
+            async def app_get():
+                return quart.session.get("value", "no value set")
+
+            @app.route("/delete", methods=["POST"])
+            async def app_del():
+                del quart.session["value"]
+                return "value deleted"
+
+            try:
+                test_client = app.test_client()
+                await test_client.post("/set", form={"value": "42"})
+                assert await (await test_client.get("/get")).get_data() == b"42"
+                assert len(await client.keys("session:*")) == 1
+
+                await test_client.post("/delete")
+                assert await client.keys("session:*") == []
+            finally:
+                await client.flushall()
+                await client.aclose()
+
+        asyncio.run(run())
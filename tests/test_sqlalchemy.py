@@ -1,15 +1,31 @@
 import json
+import pickle
 from contextlib import contextmanager
+from datetime import datetime, timedelta
 
 import flask
 import pytest
 from flask_session.sqlalchemy import SqlAlchemySession
-from sqlalchemy import text
+from sqlalchemy import inspect, text
 
 
+@pytest.mark.filterwarnings("ignore:No valid SQLAlchemy instance provided")
 class TestSQLAlchemy:
     """This requires package: sqlalchemy"""
 
+    @pytest.fixture
+    def create_app(self, app_utils):
+        def create_app(**config):
+            return app_utils.create_app(
+                {
+                    "SESSION_TYPE": "sqlalchemy",
+                    "SQLALCHEMY_DATABASE_URI": "sqlite:///",
+                    **config,
+                }
+            )
+
+        return create_app
+
     @contextmanager
     def setup_sqlalchemy(self, app):
         try:
@@ -32,14 +48,8 @@ class TestSQLAlchemy:
             return session_model.data
         return None
 
-    @pytest.mark.filterwarnings("ignore:No valid SQLAlchemy instance provided")
-    def test_use_signer(self, app_utils):
-        app = app_utils.create_app(
-            {
-                "SESSION_TYPE": "sqlalchemy",
-                "SQLALCHEMY_DATABASE_URI": "sqlite:///",
-            }
-        )
+    def test_use_signer(self, app_utils, create_app):
+        app = create_app()
         with app.app_context() and self.setup_sqlalchemy(
             app
         ) and app.test_request_context():
@@ -57,3 +67,258 @@ class TestSQLAlchemy:
                 json.loads(byte_string.decode("utf-8")) if byte_string else {}
             )
             assert stored_session.get("value") == "44"
+
+    def test_touch_session(self, create_app):
+        app = create_app(
+            SESSION_PERMANENT=True,
+            SESSION_LOCAL_CACHE_SIZE=10,
+            SESSION_LOCAL_CACHE_TTL=60,
+        )
+        with app.app_context(), self.setup_sqlalchemy(app):
+            interface = app.session_interface
+            client = app.test_client()
+            client.post("/set", data={"value": "42"})
+            store_id = f"session:{client.get_cookie('session').value}"
+
+            def stored_record():
+                return (
+                    interface.client.session.query(interface.sql_session_model)
+                    .filter_by(session_id=store_id)
+                    .first()
+                )
+
+            record = stored_record()
+            data, expiry = record.data, record.expiry
+
+            # An unchanged session only has its expiry extended
+            assert client.get("/get").data == b"42"
+            interface.client.session.expire_all()
+            record = stored_record()
+            assert record.data == data
+            assert record.expiry > expiry
+            lifetime = interface._retrieve_session_lifetime(store_id)
+            assert timedelta() < lifetime <= app.permanent_session_lifetime
+
+            # An expired session is not brought back, nor a deleted one served
+            # from the local cache
+            record.expiry = datetime.utcnow() - timedelta(seconds=1)
+            interface.client.session.commit()
+            assert client.get("/get").data == b"42"
+            interface.client.session.expire_all()
+            assert stored_record().expiry < datetime.utcnow()
+            assert interface._retrieve_session_lifetime(store_id) is None
+
+            interface.client.session.delete(stored_record())
+            interface.client.session.commit()
+            assert client.get("/get").data == b"42"
+            assert stored_record() is None
+
+    def test_cleanup(self, create_app):
+        app = create_app(SESSION_CLEANUP_BATCH_SIZE=2)
+        with app.app_context(), self.setup_sqlalchemy(app):
+            interface = app.session_interface
+            expired = datetime.utcnow() - timedelta(seconds=1)
+            for i in range(5):
+                interface.client.session.add(
+                    interface.sql_session_model(f"session:{i}", b"{}", expired)
+                )
+            interface.client.session.add(
+                interface.sql_session_model(
+                    "session:5", b"{}", datetime.utcnow() + timedelta(days=1)
+                )
+            )
+            interface.client.session.commit()
+
+            # Stops after the first full batch, the next run continues
+            result = app.test_cli_runner().invoke(
+                args=["session_cleanup", "--time-budget", "0"]
+            )
+            assert "Deleted 2 expired sessions before running out of time" in (
+                result.output
+            )
+            result = app.test_cli_runner().invoke(args=["session_cleanup"])
+            assert "Deleted 2 expired sessions so far." in result.output
+            assert "Deleted 3 expired sessions." in result.output
+            assert interface.sql_session_model.query.count() == 1
+
+            result = app.test_cli_runner().invoke(
+                args=["session_cleanup", "--batch-size", "0"]
+            )
+            assert result.exit_code != 0
+
+    def test_cleanup_batch_size_must_be_positive(self, create_app):
+        with pytest.raises(ValueError, match="SESSION_CLEANUP_BATCH_SIZE"):
+            create_app(SESSION_CLEANUP_BATCH_SIZE=0)
+
+    def test_scheduled_cleanup(self, create_app):
+        app = create_app(SESSION_CLEANUP_INTERVAL=60)
+        with app.app_context(), self.setup_sqlalchemy(app):
+            interface = app.session_interface
+            expired = datetime.utcnow() - timedelta(seconds=1)
+            interface.client.session.add(
+                interface.sql_session_model("session:expired", b"{}", expired)
+            )
+            interface.client.session.commit()
+
+            # The first request starts the scheduler
+            assert not interface.cleanup_scheduler.running
+            app.test_client().get("/get")
+            assert interface.cleanup_scheduler.running
+            interface.cleanup_scheduler.stop()
+
+            interface._run_scheduled_cleanup()
+            assert self.retrieve_stored_session("session:expired", app) is None
+
+            # Only one process holds the lease until it expires
+            lease = timedelta(seconds=120)
+            assert not interface._acquire_cleanup_lease("other", lease)
+            interface.sql_lease_model.query.update({"expiry": expired})
+            assert interface._acquire_cleanup_lease("other", lease)
+            assert interface._acquire_cleanup_lease("other", lease)
+            interface.client.session.add(
+                interface.sql_session_model("session:expired", b"{}", expired)
+            )
+            interface.client.session.commit()
+            interface._run_scheduled_cleanup()
+            assert self.retrieve_stored_session("session:expired", app) is not None
+
+    def test_migrate_format(self, create_app):
+        app = create_app()
+        with app.app_context(), self.setup_sqlalchemy(app):
+            interface = app.session_interface
+            expiry = datetime.utcnow() + timedelta(days=1)
+            for i in range(5):
+                interface.client.session.add(
+                    interface.sql_session_model(
+                        f"session:{i}", pickle.dumps({"value": i}), expiry
+                    )
+                )
+            interface.client.session.add(
+                interface.sql_session_model("session:5", b'{"value":5}', expiry)
+            )
+            interface.client.session.commit()
+
+            result = app.test_cli_runner().invoke(
+                args=["session_migrate_format", "--batch-size", "2"]
+            )
+            assert "Scanned 6 sessions, migrated 5, failed 0." in result.output
+            for i in range(6):
+                data = self.retrieve_stored_session(f"session:{i}", app)
+                assert json.loads(data) == {"value": i}
+
+    def test_rename_session(self, create_app):
+        app = create_app()
+        with app.app_context(), self.setup_sqlalchemy(app):
+            interface = app.session_interface
+            lifetime = app.permanent_session_lifetime
+            session = SqlAlchemySession({"value": "42"}, sid="old")
+            interface._upsert_session(lifetime, session, "session:old")
+
+            session = SqlAlchemySession({"value": "43"}, sid="new")
+            interface._rename_session(lifetime, session, "session:old", "session:new")
+            assert self.retrieve_stored_session("session:old", app) is None
+            data = self.retrieve_stored_session("session:new", app)
+            assert json.loads(data) == {"value": "43"}
+
+            # A session that is no longer stored is created
+            interface._rename_session(lifetime, session, "session:gone", "session:2")
+            assert self.retrieve_stored_session("session:2", app) is not None
+
+    def test_bulk_operations(self, create_app):
+        app = create_app()
+        with app.app_context(), self.setup_sqlalchemy(app):
+            interface = app.session_interface
+            lifetime = app.permanent_session_lifetime
+            for sid in ("a", "b", "c"):
+                session = SqlAlchemySession({"value": sid}, sid=sid)
+                interface._upsert_session(lifetime, session, f"session:{sid}")
+            # Expired sessions are neither listed nor counted
+            expired = SqlAlchemySession({"value": "d"}, sid="d")
+            interface._upsert_session(timedelta(seconds=-1), expired, "session:d")
+
+            assert sorted(interface.iter_sessions(batch_size=2)) == [
+                ("a", {"value": "a"}),
+                ("b", {"value": "b"}),
+                ("c", {"value": "c"}),
+            ]
+            assert interface.count_sessions() == 3
+            assert interface.delete_sessions(lambda sid, data: sid != "b") == 2
+            assert interface.count_sessions() == 1
+
+    def test_sessions_by_owner(self, create_app):
+        app = create_app(SESSION_OWNER_KEY="user_id")
+        with app.app_context(), self.setup_sqlalchemy(app):
+            interface = app.session_interface
+            lifetime = app.permanent_session_lifetime
+            for sid, user_id in (("a", 1), ("b", 1), ("c", 2)):
+                session = SqlAlchemySession({"user_id": user_id}, sid=sid)
+                interface._upsert_session(lifetime, session, f"session:{sid}")
+            # Changing the owner moves the session to the new owner
+            session = SqlAlchemySession({"user_id": 2}, sid="b")
+            interface._upsert_session(lifetime, session, "session:b")
+
+            assert interface.sessions_for(1) == [("a", {"user_id": 1})]
+            assert interface.revoke_all(2) == 2
+            assert self.retrieve_stored_session("session:c", app) is None
+            assert self.retrieve_stored_session("session:a", app) is not None
+
+    def test_owner_column_added_to_existing_table(self, create_app, tmp_path):
+        database_uri = f"sqlite:///{tmp_path / 'sessions.db'}"
+        app = create_app(SQLALCHEMY_DATABASE_URI=database_uri)
+        with app.app_context():
+            interface = app.session_interface
+            session = SqlAlchemySession({"value": "42"}, sid="old")
+            interface._upsert_session(
+                app.permanent_session_lifetime, session, "session:old"
+            )
+            interface.client.session.close()
+
+        # The table created without an owner column gets one, and keeps the
+        # sessions stored before
+        app = create_app(
+            SQLALCHEMY_DATABASE_URI=database_uri, SESSION_OWNER_KEY="user_id"
+        )
+        with app.app_context():
+            interface = app.session_interface
+            engine = interface.client.engine
+            columns = inspect(engine).get_columns("sessions")
+            assert any(column["name"] == "owner" for column in columns)
+            indexes = inspect(engine).get_indexes("sessions")
+            assert any(index["column_names"] == ["owner"] for index in indexes)
+            assert interface._retrieve_session_data("session:old") == {"value": "42"}
+            session = SqlAlchemySession({"user_id": 1}, sid="a")
+            interface._upsert_session(
+                app.permanent_session_lifetime, session, "session:a"
+            )
+            assert interface.sessions_for(1) == [("a", {"user_id": 1})]
+            interface.client.session.close()
+
+    def test_owner_column_added_by_another_process(
+        self, create_app, tmp_path, monkeypatch
+    ):
+        database_uri = f"sqlite:///{tmp_path / 'sessions.db'}"
+        config = dict(SQLALCHEMY_DATABASE_URI=database_uri, SESSION_OWNER_KEY="user_id")
+        app = create_app(**config)
+        with app.app_context():
+            app.session_interface.client.session.close()
+
+        # Another process adds the column and the index after this one found
+        # them missing
+        inspections = []
+
+        def stale_inspect(engine):
+            inspector = inspect(engine)
+            inspections.append(inspector)
+            if len(inspections) == 1:
+                inspector.get_columns = lambda *args, **kwargs: []
+            elif len(inspections) == 3:
+                inspector.get_indexes = lambda *args, **kwargs: []
+            return inspector
+
+        monkeypatch.setattr(
+            "flask_session.sqlalchemy.sqlalchemy.inspect", stale_inspect
+        )
+        app = create_app(**config)
+        assert len(inspections) == 4
+        with app.app_context():
+            app.session_interface.client.session.close()